@@ -2,6 +2,8 @@ import os
 
 from st_pages import show_pages, Page, add_page_title
 
+from service.ResourceRegistry import warm_up_embedding, embedding_ready, registry
+
 
 def main():
     show_pages(
@@ -24,6 +26,10 @@ def main():
 
     add_page_title()
 
+    # 后台预加载嵌入模型，进入智能问答页面时无需等待
+    if os.getenv("EMBEDDING_MODEL_PATH") and not embedding_ready() and not registry.health():
+        warm_up_embedding()
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,66 @@
+"""
+基准测试用的合成数据：带红色印章的合同扫描页、由这些页面组成的PDF
+"""
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# 直接运行benchmarks下的脚本时，把仓库根目录加入导入路径
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def seal_page(seed=0, width=1240, height=1754, seals=None):
+    """
+    白底黑字的合同页面，随机位置盖1-3个红色圆章（BGR数组）
+    :param seals: 印章个数，默认随机1-3个
+    """
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 255, np.uint8)
+    for y in range(80, height - 80, 40):
+        cv2.putText(image, f"Contract clause {y} lorem ipsum dolor", (60, y), cv2.FONT_HERSHEY_SIMPLEX, 0.9,
+                    (20, 20, 20), 2)
+    count = int(rng.integers(1, 4)) if seals is None else seals
+    for _ in range(count):
+        cx, cy = int(rng.integers(200, width - 200)), int(rng.integers(200, height - 200))
+        radius = int(rng.integers(70, 130))
+        cv2.circle(image, (cx, cy), radius, (40, 40, 210), 6)
+        cv2.putText(image, "SEAL", (cx - 50, cy + 10), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (40, 40, 210), 3)
+    return image
+
+
+def encode_png(image):
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+def seal_pages(count, **kwargs):
+    """count张印章页面的PNG字节"""
+    return [encode_png(seal_page(seed, **kwargs)) for seed in range(count)]
+
+
+def scanned_pdf(count):
+    """count页A4扫描件PDF（每页一张印章页面图片）"""
+    import fitz
+
+    doc = fitz.open()
+    for data in seal_pages(count):
+        page = doc.new_page(width=595, height=842)
+        page.insert_image(page.rect, stream=data)
+    pdf = doc.tobytes()
+    doc.close()
+    return pdf
+
+
+def best_of(func, repeat=3):
+    """多次运行取最短耗时（秒）"""
+    import time
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
@@ -0,0 +1,88 @@
+"""
+公司名批量匹配：search_many在当前进程串行、自动选择（按实测单条查询耗时决定是否交给共享进程池）与共享进程池的吞吐量，
+以及子进程首次运行匹配任务导入service包的开销（COMPANY_MATCH_STARTUP_SECONDS）
+运行：python benchmarks/bench_company_batch.py [公司数 ...]
+"""
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bench_company_match import company_names, queries
+
+from workers import pdf_render
+
+
+def spawn_seconds(func, *args):
+    """新建spawn进程池并取回第一个结果的耗时，即子进程启动并导入任务函数所在模块的开销"""
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pool.submit(func, *args).result()
+    return time.perf_counter() - start
+
+
+def throughput(func, count):
+    start = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - start)
+
+
+def counting_pool(match_module, pooled):
+    """记录自动选择时交给进程池的查询数"""
+    from service.WorkerPool import imap_ordered
+
+    def imap(func, args_list, workers, kind):
+        args_list = list(args_list)
+        pooled.append(sum(len(chunk) for _, chunk, _ in args_list))
+        return imap_ordered(func, args_list, workers, kind)
+
+    match_module.imap_ordered = imap
+
+
+def reset_pool():
+    from service import WorkerPool
+
+    WorkerPool.get_worker_pool().shutdown()
+    WorkerPool.registry.release(WorkerPool._POOL_KEY)
+    WorkerPool._warm_kinds.clear()
+
+
+def main():
+    # service只在main中导入：spawn子进程会重新导入本脚本（作为__mp_main__），顶层导入会计入子进程启动耗时
+    import importlib
+
+    from service import WorkerPool
+
+    match_module = importlib.import_module("service.CompanyMatchService")
+    sizes = [int(arg) for arg in sys.argv[1:]] or [2000, 100000]
+    workers = WorkerPool.WORKER_POOL_SIZE
+    print(f"CPU {os.cpu_count()}，进程池大小 {workers}")
+    light = spawn_seconds(pdf_render.init_worker)
+    heavy = spawn_seconds(match_module.CompanyMatchService, False)
+    print(f"子进程冷启动：轻量入口 {light:.2f}s，导入匹配模块 {heavy:.2f}s，差值 {heavy - light:.2f}s")
+
+    print(f"{'names':>8} {'queries':>8} {'serial':>10} {'auto':>10} {'pooled':>7} {'pool first':>11} {'pool warm':>10}")
+    for size in sizes:
+        service = match_module.CompanyMatchService(normalize=True)
+        service.add_companies(company_names(size))
+        for count in (300, 3000):
+            batch = queries(company_names(size), count, seed=count)
+            run = lambda **kw: list(service.search_many(batch, limit=10, **kw))  # noqa: E731
+            serial = throughput(lambda: run(workers=1), count)
+            pooled = []
+            counting_pool(match_module, pooled)
+            auto = throughput(run, count)
+            match_module.imap_ordered = WorkerPool.imap_ordered
+            reset_pool()
+            # 强制使用进程池：本轮首次（含进程池启动与子进程导入）与已启动
+            match_module.parallel_worthwhile = lambda *args: True
+            first = throughput(lambda: run(workers=workers), count)
+            warm = throughput(lambda: run(workers=workers), count)
+            match_module.parallel_worthwhile = WorkerPool.parallel_worthwhile
+            print(f"{size:>8} {count:>8} {serial:7.0f}q/s {auto:7.0f}q/s {sum(pooled):7d} {first:8.0f}q/s {warm:7.0f}q/s")
+            reset_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+公司名模糊检索：字符/二元组索引过滤 + 精确校验与逐个计算编辑距离的全量匹配（改动前的实现）的耗时与一致性
+合成“<城市>市<字号><行业><组织形式>”公司名，一半查询是已登记名称的1-2处改动，一半是未登记的名称
+运行：python benchmarks/bench_company_match.py [公司数 ...]
+"""
+import sys
+import time
+
+import numpy as np
+
+import _fixtures  # noqa: F401  把仓库根目录加入导入路径
+
+CITIES = ["北京", "上海", "广州", "深圳", "杭州", "南京", "成都", "武汉", "西安", "苏州", "天津", "重庆"]
+INDUSTRIES = ["科技", "贸易", "实业", "建设", "信息技术", "医药", "物流", "文化传媒", "电子", "新材料"]
+FORMS = ["有限公司", "有限责任公司", "股份有限公司", "集团有限公司"]
+# 常用汉字，组合成2-4字的字号
+CHARS = "华瑞恒信达通宏泰鑫源盛兴联创新远安康德利嘉和永正明光天成中海金银星辰博景润丰佳美诚东方"
+
+
+def company_names(count, seed=0):
+    rng = np.random.default_rng(seed)
+    names = []
+    for _ in range(count):
+        core = "".join(CHARS[i] for i in rng.integers(len(CHARS), size=int(rng.integers(2, 5))))
+        names.append(f"{CITIES[rng.integers(len(CITIES))]}市{core}"
+                     f"{INDUSTRIES[rng.integers(len(INDUSTRIES))]}{FORMS[rng.integers(len(FORMS))]}")
+    return names
+
+
+def queries(names, count, seed=1):
+    """一半为已登记名称的1-2处替换/删除，一半为新生成的名称"""
+    rng = np.random.default_rng(seed)
+    result = []
+    for name in (names[i] for i in rng.integers(len(names), size=count // 2)):
+        chars = list(name)
+        for _ in range(int(rng.integers(1, 3))):
+            pos = int(rng.integers(len(chars)))
+            if rng.random() < 0.5:
+                chars[pos] = CHARS[rng.integers(len(CHARS))]
+            else:
+                del chars[pos]
+        result.append("".join(chars))
+    return result + company_names(count - count // 2, seed + 1)
+
+
+def linear_search(service, query, limit):
+    """全量匹配：对每个公司名计算编辑距离后取前limit个"""
+    import Levenshtein
+
+    return service._top_k(query, ((company, Levenshtein.distance(query, company))
+                                  for company in service.companies), limit)
+
+
+def main():
+    from service.CompanyMatchService import CompanyMatchService
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    limit = 10
+    print(f"{'names':>8} {'build':>8} {'indexed':>12} {'linear':>12} {'speedup':>8} {'equal':>6}")
+    for size in sizes:
+        names = company_names(size)
+        service = CompanyMatchService(normalize=False)
+        start = time.perf_counter()
+        service.add_companies(names)
+        build = time.perf_counter() - start
+
+        # 全量匹配耗时与公司数成正比，大规模时少测几条
+        sample = queries(names, 200 if size <= 100000 else 20)
+        start = time.perf_counter()
+        indexed_results = [service.search_companies(query, limit) for query in sample]
+        indexed = (time.perf_counter() - start) / len(sample)
+        start = time.perf_counter()
+        linear_results = [linear_search(service, query, limit) for query in sample]
+        linear = (time.perf_counter() - start) / len(sample)
+        print(f"{size:>8} {build:7.2f}s {indexed * 1000:10.2f}ms {linear * 1000:10.2f}ms "
+              f"{linear / indexed:7.1f}x {str(indexed_results == linear_results):>6}")
+
+
+if __name__ == "__main__":
+    main()
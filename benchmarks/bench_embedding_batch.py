@@ -0,0 +1,68 @@
+"""
+分块批量编码：不同EMBEDDING_BATCH_SIZE下每秒编码的分块数，以及逐块编码（改动前的做法）作对照
+需要EMBEDDING_MODEL_PATH指向嵌入模型目录，推理后端取EMBEDDING_BACKEND（torch / onnx）；不连接Qdrant，也不经过嵌入缓存
+运行：python benchmarks/bench_embedding_batch.py [分块数] [batch_size ...]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+import _fixtures  # noqa: F401  把仓库根目录加入导入路径
+
+CLAUSES = ["甲方应于合同签订后十五个工作日内支付首期款项", "乙方保证所交付的货物符合国家标准及双方约定的技术要求",
+           "任何一方违反本合同约定的，应向守约方支付违约金", "本合同自双方签字盖章之日起生效，有效期为三年",
+           "因不可抗力导致合同无法履行的，双方互不承担违约责任", "争议由合同签订地人民法院管辖"]
+
+
+def chunks(count, seed=0):
+    """合同条款拼成的文本分块，长度在100-1000字之间（StreamingChunker默认chunk_size为1000）"""
+    rng = np.random.default_rng(seed)
+    result = []
+    for _ in range(count):
+        length = int(rng.integers(100, 1001))
+        text = ""
+        while len(text) < length:
+            text += CLAUSES[int(rng.integers(len(CLAUSES)))] + "。"
+        result.append(text[:length])
+    return result
+
+
+def main():
+    from service.EmbeddingBackend import create_embedding_backend
+    from service.VectorDBService import VectorDBService
+
+    model_path = os.getenv("EMBEDDING_MODEL_PATH")
+    if not model_path or not os.path.isdir(model_path):
+        print("未设置EMBEDDING_MODEL_PATH或目录不存在，跳过")
+        return
+    try:
+        backend = create_embedding_backend(model_path)
+    except ImportError as e:
+        print(f"推理后端依赖缺失（{e}），跳过")
+        return
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    batch_sizes = [int(arg) for arg in sys.argv[2:]] or [1, 4, 8, 16, 32, 64]
+    texts = chunks(count)
+    # 只用到_encode_uncached，跳过__init__中的Qdrant连接与嵌入缓存
+    service = VectorDBService.__new__(VectorDBService)
+    service.embedding_backend = backend
+    service._encode_uncached(texts[:8], 8)  # 预热
+
+    print(f"backend={backend.name} chunks={count} threads={os.getenv('EMBEDDING_NUM_THREADS', 'default')}")
+    start = time.perf_counter()
+    for text in texts:
+        backend.encode_batch([text])
+    single = time.perf_counter() - start
+    print(f"{'per-chunk':>10} {count / single:10.1f} chunks/s")
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        service._encode_uncached(texts, batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"{batch_size:>10} {count / elapsed:10.1f} chunks/s  {single / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
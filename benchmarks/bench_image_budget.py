@@ -0,0 +1,76 @@
+"""
+发给视觉大模型前的图像预算：不同长边上限与JPEG质量下的编码耗时、载荷大小、估算token数与字段识别准确率
+场景为手机拍摄的4000x3000证件照（8个字段，字高44px与30px两种），准确率用本地RapidOCR识别实际发送的载荷估计
+（视觉大模型无法在此调用）；token数按每28x28像素一个估算
+运行：python benchmarks/bench_image_budget.py
+"""
+import time
+
+import cv2
+import numpy as np
+
+import _fixtures  # noqa: F401  将仓库根目录加入sys.path
+
+from service import ImageCodec
+
+FIELDS = ["NAME ZHANG SAN", "SEX MALE", "NATION HAN", "BORN 1990 03 07", "ADDRESS 18 CHAOYANG ROAD",
+          "ID 110101199003071234", "AUTHORITY BEIJING PSB", "VALID 2020 2040"]
+BUDGETS = [("原PNG整图", ImageCodec.ImageBudget(formats=(), encode_format="PNG")),
+           ("2048 q90", ImageCodec.ImageBudget(formats=(), encode_format="JPEG", quality=90, max_side=2048)),
+           ("1600 q85", ImageCodec.ImageBudget(formats=(), encode_format="JPEG", quality=85, max_side=1600)),
+           ("1280 q85", ImageCodec.ImageBudget(formats=(), encode_format="JPEG", quality=85, max_side=1280)),
+           ("1024 q80", ImageCodec.ImageBudget(formats=(), encode_format="JPEG", quality=80, max_side=1024)),
+           ("768 q75", ImageCodec.ImageBudget(formats=(), encode_format="JPEG", quality=75, max_side=768))]
+
+
+def card_photo(text_height, seed=0):
+    """桌面背景上略微倾斜的证件，字段为深色文字；返回手机相机保存的JPEG"""
+    rng = np.random.default_rng(seed)
+    image = np.clip(rng.normal(120, 25, (3000, 4000, 3)), 0, 255).astype(np.uint8)
+    image = cv2.GaussianBlur(image, (0, 0), 3)
+    card = np.full((1500, 2400, 3), (235, 240, 245), np.uint8)
+    scale = text_height / 22
+    for i, field in enumerate(FIELDS):
+        cv2.putText(card, field, (120, 180 + i * 160), cv2.FONT_HERSHEY_SIMPLEX, scale, (40, 35, 30),
+                    max(2, int(scale * 2)), cv2.LINE_AA)
+    matrix = cv2.getRotationMatrix2D((1200, 750), 2.0, 1.0)
+    matrix[:, 2] += (800, 750)
+    cv2.warpAffine(card, matrix, (4000, 3000), dst=image, borderMode=cv2.BORDER_TRANSPARENT)
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes()
+
+
+def field_accuracy(engine, payload):
+    """每个字段与最接近的识别行的字符相似度（1 - 编辑距离/字段长度）的平均值"""
+    import Levenshtein
+
+    image = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+    result, _ = engine(image)
+    lines = [text.upper().replace(" ", "") for _, text, _ in result or []]
+    scores = []
+    for field in FIELDS:
+        target = field.replace(" ", "")
+        distance = min((Levenshtein.distance(target, line) for line in lines), default=len(target))
+        scores.append(max(0.0, 1 - distance / len(target)))
+    return sum(scores) / len(scores)
+
+
+def main():
+    from rapidocr_onnxruntime import RapidOCR
+
+    engine = RapidOCR()
+    photos = {height: card_photo(height) for height in (44, 30)}
+    print(f"{'budget':>10} {'encode':>8} {'payload':>9} {'~tokens':>8} {'acc 44px':>9} {'acc 30px':>9}")
+    for name, budget in BUDGETS:
+        row = []
+        for height, photo in photos.items():
+            start = time.perf_counter()
+            encoded = ImageCodec._encode_bytes(photo, budget, None)
+            row.append((time.perf_counter() - start, encoded, field_accuracy(engine, encoded.data)))
+        (seconds, encoded, acc44), (_, _, acc30) = row
+        tokens = encoded.size[0] * encoded.size[1] // (28 * 28)
+        print(f"{name:>10} {seconds:7.2f}s {len(encoded.data) / 1024 / 1024:7.2f}MB {tokens:8d} "
+              f"{acc44:9.3f} {acc30:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
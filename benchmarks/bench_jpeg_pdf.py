@@ -0,0 +1,46 @@
+"""
+图片组装PDF：改动前逐页经fitz转换再插入与JpegPdfWriter直接嵌入JPEG的吞吐量、结果大小
+运行：python benchmarks/bench_jpeg_pdf.py [页数]
+"""
+import sys
+
+import cv2
+import fitz
+
+from _fixtures import best_of, seal_page
+
+from service.PdfService import pic_to_pdf
+
+
+def reference_pic_to_pdf(images):
+    """改动前的实现：每张图片经fitz转换为单页PDF后插入"""
+    doc = fitz.open()
+    for img in images:
+        img_doc = fitz.open("jpg", img)
+        doc.insert_pdf(fitz.open("pdf", img_doc.convert_to_pdf()))
+    return doc.write()
+
+
+def a4_jpegs(count, quality=40):
+    """pdf_to_pic产出的A4页面：宽1024、JPEG质量40，8张不同页面循环使用"""
+    distinct = []
+    for seed in range(8):
+        image = cv2.resize(seal_page(seed), (1024, 1448), interpolation=cv2.INTER_AREA)
+        distinct.append(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    return [distinct[i % len(distinct)] for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    images = a4_jpegs(count)
+    print(f"{count}页，JPEG合计 {sum(map(len, images)) / 1024 / 1024:.1f}MB")
+    for name, func in (("fitz逐页转换", reference_pic_to_pdf), ("JpegPdfWriter", pic_to_pdf)):
+        seconds = best_of(lambda: func(images))
+        size = len(func(images))
+        with fitz.open("pdf", func(images)) as doc:
+            assert doc.page_count == count
+        print(f"{name:>14} {count / seconds:9.0f}页/s {size / 1024 / 1024:8.2f}MB")
+
+
+if __name__ == "__main__":
+    main()
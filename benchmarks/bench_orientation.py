@@ -0,0 +1,52 @@
+"""
+方向分类的单次调用耗时：原实现（每次新建RapidOrientation并对3个相同裁剪投票）与orientation()（共享引擎、单个裁剪）
+的对比，以及预检直接确定方向的空白页与已知文字层方向的页面；同时统计两者对4个方向的判定是否一致
+运行：python benchmarks/bench_orientation.py
+"""
+import importlib
+
+import numpy as np
+
+from _fixtures import best_of, seal_page
+
+ocr_module = importlib.import_module("service.OcrService")
+
+ROTATIONS = 4
+PAGES = 4
+
+
+def old_orientation(image_cv):
+    """原实现（不含打印）"""
+    from rapid_orientation import RapidOrientation
+
+    angle = int(RapidOrientation()(image_cv)[0])
+    return ocr_module.rotate_bound(image_cv, angle) if angle > 0 else image_cv, angle
+
+
+def per_call(func, images):
+    return best_of(lambda: [func(image) for image in images]) / len(images) * 1000
+
+
+def main():
+    pages = [seal_page(seed) for seed in range(PAGES)]
+    images = [np.ascontiguousarray(np.rot90(page, k)) for page in pages for k in range(ROTATIONS)]
+    ocr_module.orientation(images[0])  # 预先创建共享引擎，只计单次调用
+
+    old = per_call(old_orientation, images)
+    new = per_call(ocr_module.orientation, images)
+    blank = per_call(ocr_module.orientation, [np.full_like(pages[0], 255)])
+    known = per_call(lambda image: ocr_module.orientation(image, 0), images)
+    old_angles = [old_orientation(image)[1] for image in images]
+    new_angles = ocr_module.classify_orientations(images)
+    agree = sum(a == b for a, b in zip(old_angles, new_angles))
+
+    print(f"{len(images)} 张页面（{PAGES} 页 × {ROTATIONS} 个方向，{pages[0].shape[1]}x{pages[0].shape[0]}）")
+    print(f"原实现（每次新建引擎）：{old:.1f} ms/次")
+    print(f"orientation（共享引擎）：{new:.1f} ms/次")
+    print(f"空白页预检：{blank:.2f} ms/次")
+    print(f"已知文字层方向：{known:.2f} ms/次")
+    print(f"判定一致 {agree}/{len(images)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+目标大小压缩：CompressPdf页面原来的整文档循环（质量40、30、20各渲染一遍）与compress_pdf的耗时、结果大小
+原循环使用当前的pdf_to_pic/pic_to_pdf，渲染与组装的提速两边都有，差异只来自质量搜索
+运行：python benchmarks/bench_pdf_compress.py [页数]
+"""
+import sys
+import time
+
+import fitz
+
+from _fixtures import scanned_pdf
+
+
+def reference_compress(pdf, target_size):
+    """改动前CompressPdf页面的循环，无法达到目标时返回None"""
+    from service.PdfService import pdf_to_pic, pic_to_pdf
+
+    ret_size = len(pdf)
+    ratio = 40
+    pdf_bits = None
+    while target_size < ret_size:
+        if ratio == 10:
+            return None
+        pdf_bits = pic_to_pdf(pdf_to_pic(pdf, ratio))
+        ret_size = len(pdf_bits)
+        ratio = ratio - 10
+    return pdf_bits
+
+
+def mixed_pdf(count):
+    """扫描页与纯文字页交替"""
+    with fitz.open("pdf", scanned_pdf(count // 2)) as doc:
+        for i in range(count - count // 2):
+            page = doc.new_page(pno=i * 2 + 1, width=595, height=842)
+            for line in range(40):
+                page.insert_text((50, 40 + line * 19), f"Clause {i}.{line}: the parties agree to the terms below.",
+                                 fontsize=10)
+        return doc.tobytes(garbage=3, deflate=True)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    # service只在函数中导入：渲染进程池的spawn子进程会重新导入本脚本
+    from service.PdfService import compress_pdf
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    mb = 1024 * 1024
+    print(f"{'corpus':>8} {'input':>8} {'target':>7} {'loop':>16} {'compress_pdf':>18}")
+    for name, pdf in (("scan", scanned_pdf(count)), ("mixed", mixed_pdf(count))):
+        for target in (2.0, 1.4, 1.2, 0.6):
+            target_size = int(target * mb)
+            old, old_time = timed(lambda: reference_compress(pdf, target_size))
+            new, new_time = timed(lambda: compress_pdf(pdf, target_size))
+            old_size = "fails" if old is None else f"{len(old) / mb:.2f}MB"
+            new_size = f"{len(new) / mb:.2f}MB" + ("" if len(new) <= target_size else " fails")
+            print(f"{name:>8} {len(pdf) / mb:6.1f}MB {target:5.1f}MB {old_time:6.2f}s {old_size:>8} "
+                  f"{new_time:6.2f}s {new_size:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+PDF渲染：当前进程串行渲染、自动选择（按实测单页耗时决定是否交给进程池）与共享进程池的耗时，
+以及子进程冷启动的开销（轻量入口模块workers.pdf_render与导入service包的对比）
+运行：python benchmarks/bench_pdf_render.py [页数 ...]
+"""
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from _fixtures import best_of, scanned_pdf
+
+from workers import pdf_render
+
+
+def spawn_seconds(func):
+    """新建spawn进程池并取回第一个结果的耗时，即子进程启动并导入任务函数所在模块的开销"""
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pool.submit(func).result()
+    return time.perf_counter() - start
+
+
+def pooled(pdf, pages, workers):
+    from service import WorkerPool
+
+    with WorkerPool.shared_file(pdf, ".pdf") as path:
+        return list(WorkerPool.imap_ordered(pdf_render.render_page_task, [(path, pg, 1.33333333, None, None)
+                                                               for pg in range(pages)], workers, "pdf_render"))
+
+
+def main():
+    # service只在main中导入：spawn子进程会重新导入本脚本（作为__mp_main__），顶层导入会计入子进程启动耗时
+    import service.PdfService
+    from service import WorkerPool
+    from service.PdfService import iter_pdf_pages
+
+    counts = [int(arg) for arg in sys.argv[1:]] or [8, 40]
+    workers = WorkerPool.WORKER_POOL_SIZE
+    print(f"CPU {os.cpu_count()}，进程池大小 {workers}")
+    print(f"子进程冷启动：轻量入口 {spawn_seconds(pdf_render.init_worker):.2f}s，"
+          f"导入service包 {spawn_seconds(service.PdfService.text_layer_enabled):.2f}s")
+
+    for count in counts:
+        pdf = scanned_pdf(count)
+        serial = best_of(lambda: list(iter_pdf_pages(pdf, workers=1)))
+        auto = best_of(lambda: list(iter_pdf_pages(pdf)))
+        start = time.perf_counter()
+        pooled(pdf, count, workers)
+        first = time.perf_counter() - start
+        warm = best_of(lambda: pooled(pdf, count, workers))
+        print(f"{count:3d}页  串行 {serial:.2f}s  自动 {auto:.2f}s  "
+              f"进程池（本轮首次） {first:.2f}s  进程池（已启动） {warm:.2f}s")
+        WorkerPool.get_worker_pool().shutdown()
+        WorkerPool.registry.release(WorkerPool._POOL_KEY)
+        WorkerPool._warm_kinds.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+批量印章提取：当前进程串行、自动选择（按实测单项耗时决定是否交给共享进程池）与共享进程池的耗时，
+以及子进程首次运行印章任务导入service包的开销（SEAL_WORKER_STARTUP_SECONDS）
+运行：python benchmarks/bench_seal_batch.py [张数 ...]
+"""
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from _fixtures import best_of, scanned_pdf, seal_pages
+
+from workers import pdf_render
+
+
+def spawn_seconds(func, *args):
+    """新建spawn进程池并取回第一个结果的耗时，即子进程启动并导入任务函数所在模块的开销"""
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pool.submit(func, *args).result()
+    return time.perf_counter() - start
+
+
+def reset_pool():
+    from service import WorkerPool
+
+    WorkerPool.get_worker_pool().shutdown()
+    WorkerPool.registry.release(WorkerPool._POOL_KEY)
+    WorkerPool._warm_kinds.clear()
+
+
+def main():
+    # service只在main中导入：spawn子进程会重新导入本脚本（作为__mp_main__），顶层导入会计入子进程启动耗时
+    import importlib
+
+    from service import WorkerPool
+
+    seal_module = importlib.import_module("service.ExtractSealService")
+    counts = [int(arg) for arg in sys.argv[1:]] or [2, 8, 40]
+    workers = WorkerPool.WORKER_POOL_SIZE
+    print(f"CPU {os.cpu_count()}，进程池大小 {workers}")
+    light = spawn_seconds(pdf_render.init_worker)
+    heavy = spawn_seconds(seal_module._workers, 1, 1)
+    print(f"子进程冷启动：轻量入口 {light:.2f}s，导入印章模块 {heavy:.2f}s，差值 {heavy - light:.2f}s")
+
+    for count in counts:
+        for name, data, run in (
+                ("图片", seal_pages(count), lambda data, **kw: list(seal_module.iter_extract_seals(data, **kw))),
+                ("PDF", scanned_pdf(count), lambda data, **kw: list(seal_module.iter_pdf_seals(data, **kw)))):
+            serial = best_of(lambda: run(data, workers=1))
+            auto = best_of(lambda: run(data))
+            reset_pool()
+            # 强制使用进程池：本轮首次（含进程池启动与子进程导入）与已启动
+            seal_module.parallel_worthwhile = lambda *args: True
+            start = time.perf_counter()
+            run(data, workers=workers)
+            first = time.perf_counter() - start
+            warm = best_of(lambda: run(data, workers=workers))
+            seal_module.parallel_worthwhile = WorkerPool.parallel_worthwhile
+            print(f"{count:3d}张{name:<3}  串行 {serial:.2f}s  自动 {auto:.2f}s  "
+                  f"进程池（本轮首次） {first:.2f}s  进程池（已启动） {warm:.2f}s")
+            reset_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+印章定位的闭运算：整幅MORPH_CLOSE与由粗到精的close_seal_mask在各缩小倍数下的耗时与一致性，
+以及extract_seals整页耗时；印章多的页面候选区域超过SEAL_COARSE_MAX_AREA时退回整幅计算
+运行：python benchmarks/bench_seal_close.py
+"""
+import importlib
+
+import cv2
+
+from _fixtures import best_of, seal_page
+
+seal_module = importlib.import_module("service.ExtractSealService")
+
+SCALES = (1, 2, 4, 8)
+
+
+def working_mask(image):
+    """_locate_seals中实际做闭运算的掩码（缩放、提取红色、扩充、去噪之后）"""
+    masks = []
+    close = seal_module.close_seal_mask
+    seal_module.close_seal_mask = lambda mask: masks.append(mask) or close(mask)
+    try:
+        seal_module._locate_seals(image, seal_module.MAX_SEALS)
+    finally:
+        seal_module.close_seal_mask = close
+    return masks[0]
+
+
+def main():
+    print(f"{'page':>10} {'seals':>5} {'mask':>10} {'full close':>11} "
+          + " ".join(f"{f'scale {s}':>9}" for s in SCALES) + " " + " ".join(f"{f'extract@{s}':>10}" for s in SCALES)
+          + f" {'equal':>6}")
+    for seed, (width, height, seals) in enumerate(((1240, 1754, 1), (1240, 1754, 3), (1240, 1754, 9),
+                                                    (2480, 3508, 2), (800, 600, 1))):
+        image = seal_page(seed, width, height, seals)
+        mask = working_mask(image)
+        expected = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, seal_module.CLOSE_KERNEL)
+        full = best_of(lambda: cv2.morphologyEx(mask, cv2.MORPH_CLOSE, seal_module.CLOSE_KERNEL))
+        close_times, extract_times, equal = [], [], True
+        for scale in SCALES:
+            equal &= bool((seal_module.close_seal_mask(mask, scale) == expected).all())
+            close_times.append(best_of(lambda: seal_module.close_seal_mask(mask, scale)))
+            seal_module.SEAL_COARSE_SCALE = scale
+            extract_times.append(best_of(lambda: seal_module.extract_seals(image)))
+        print(f"{width}x{height:<5} {seals:5d} {mask.shape[1]}x{mask.shape[0]:<5} {full * 1000:9.1f}ms "
+              + " ".join(f"{t * 1000:7.1f}ms" for t in close_times) + " "
+              + " ".join(f"{t * 1000:8.1f}ms" for t in extract_times) + f" {str(equal):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+pick_seal_image红色掩码合并与白色像素还原：逐像素循环的原实现与向量化实现的耗时与一致性
+运行：python benchmarks/bench_seal_mask.py
+"""
+import importlib
+
+import cv2
+import numpy as np
+
+from _fixtures import best_of, encode_png, seal_page
+
+seal_module = importlib.import_module("service.ExtractSealService")
+
+
+def reference_seal_layer(image):
+    """改动前的实现（当前实现见ExtractSealService.red_seal_layer）：两段红色分别生成掩码后相加，再逐像素把白色还原为原图"""
+    img_png = cv2.cvtColor(image, cv2.COLOR_RGB2RGBA)
+    hue_image = cv2.cvtColor(img_png, cv2.COLOR_BGR2HSV)
+    img_real = None
+    for low, high in seal_module.RED_HSV_RANGES:
+        th = cv2.inRange(hue_image, low, high)
+        th = cv2.dilate(th, cv2.getStructuringElement(cv2.MORPH_RECT, (1, 1)))
+        index1 = th == 255
+        mask = np.zeros(img_png.shape, np.uint8)
+        mask[:, :, :] = (255, 255, 255, 0)
+        mask[index1] = img_png[index1]
+        img_real = mask if img_real is None else cv2.add(img_real, mask)
+    white_px = np.asarray([255, 255, 255, 255])
+    row, col, _ = img_real.shape
+    for r in range(row):
+        for c in range(col):
+            if all(img_real[r][c] == white_px):
+                img_real[r][c] = img_png[r][c]
+    return img_real
+
+
+def main():
+    # 只比较掩码步骤，粗到精闭运算关闭，端到端耗时只反映本步骤的差异
+    seal_module.SEAL_COARSE_SCALE = 1
+    print(f"{'size':>10} {'reference':>12} {'vectorized':>12} {'pick_seal_image':>16} {'equal':>6}")
+    for seed, (width, height) in enumerate(((800, 600), (1024, 768), (1240, 1754), (1600, 1200))):
+        image = seal_page(seed, width, height)
+        data = encode_png(image)
+        decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        working = cv2.resize(decoded, (min(1024, width), int(min(1024, width) * height / width)),
+                             interpolation=cv2.INTER_CUBIC)
+        equal = np.array_equal(reference_seal_layer(working), seal_module.red_seal_layer(working))
+        reference = best_of(lambda: reference_seal_layer(working), 1)
+        vectorized = best_of(lambda: seal_module.red_seal_layer(working))
+        total = best_of(lambda: seal_module.ExtractSealService(data).pick_seal_image())
+        print(f"{width}x{height:<5} {reference * 1000:10.1f}ms {vectorized * 1000:10.2f}ms "
+              f"{total * 1000:14.1f}ms {str(equal):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-import io
 from time import time
 
 import streamlit as st
@@ -33,7 +32,7 @@ def main():
         with columns[0]:
             st.markdown("### 📷 原始图像")
             image = Image.open(uploaded_file)
-            # Convert CMYK to RGB before saving as PNG
+            # Convert CMYK to RGB for display
             if image.mode == 'CMYK':
                 image = image.convert('RGB')
             # Hide original image by default, show in expander
@@ -47,10 +46,8 @@ def main():
                     # Initialize service
                     ips_service = IPService()
                     
-                    # Convert image to bytes
-                    byte_stream = io.BytesIO()
-                    image.save(byte_stream, format='PNG')
-                    byte_data = byte_stream.getvalue()
+                    # Send the original upload; the service re-encodes only when needed
+                    byte_data = uploaded_file.getvalue()
                     
                     # Call card detection API
                     start = time()
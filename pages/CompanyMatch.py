@@ -1,7 +1,33 @@
+import csv
+import io
+
 import streamlit as st
 from dotenv import load_dotenv
 
 from service.CompanyMatchService import CompanyMatchService
+from service.CompanyRegistry import CompanyRegistry
+
+
+def parse_queries(uploaded_file) -> list:
+    """解析批量查询文件：TXT每行一个公司名，CSV取每行第一列"""
+    content = uploaded_file.getvalue().decode('utf-8-sig')
+    if uploaded_file.name.lower().endswith('.csv'):
+        rows = csv.reader(io.StringIO(content))
+        return [row[0].strip() for row in rows if row and row[0].strip()]
+    return [line.strip() for line in content.split('\n') if line.strip()]
+
+
+def results_to_csv(batch_results) -> bytes:
+    """批量匹配结果导出为CSV（带BOM，Excel可直接打开）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["查询公司名", "排名", "匹配公司名", "相似度", "编辑距离"])
+    for query, results in batch_results:
+        if not results:
+            writer.writerow([query, "", "", "", ""])
+        for rank, result in enumerate(results, 1):
+            writer.writerow([query, rank, result['company_name'], f"{result['score']:.3f}", result['distance']])
+    return buffer.getvalue().encode('utf-8-sig')
 
 
 def main():
@@ -9,9 +35,11 @@ def main():
     st.set_page_config(page_title="公司名匹配测试", layout="wide", menu_items={})
     st.subheader("🏢 公司名匹配测试")
     
-    # 初始化服务
+    # 初始化服务（从持久化名单库加载当前版本）
     try:
+        registry = CompanyRegistry()
         match_service = CompanyMatchService()
+        registry_count = match_service.load_registry(registry)
     except Exception as e:
         st.error(f"初始化服务失败: {e}")
         st.stop()
@@ -36,39 +64,77 @@ def main():
             type=['txt'],
             help="每行一个公司名，支持批量导入"
         )
+        import_mode = st.radio("导入方式", ["替换名单", "追加到名单", "从名单删除"], horizontal=True)
+        if registry_count:
+            st.caption(f"名单库版本 v{match_service.registry_version}，共 {registry_count} 个公司名")
+        
+        # 批量查询（可选）
+        query_file = st.file_uploader(
+            "批量查询文件（可选）",
+            type=['txt', 'csv'],
+            help="TXT每行一个公司名，CSV取第一列；上传后对文件中的每个公司名进行匹配并生成结果CSV"
+        )
         
         # 匹配按钮
         if st.button("🚀 开始匹配", type="primary", use_container_width=True):
-            if not search_query:
-                st.warning("⚠️ 请输入要查询的公司名")
-            elif not uploaded_file:
+            if not search_query and not query_file:
+                st.warning("⚠️ 请输入要查询的公司名或上传批量查询文件")
+            elif not uploaded_file and not registry_count:
                 st.warning("⚠️ 请上传公司名单文件")
             else:
                 # 解析文件内容
                 try:
-                    file_content = uploaded_file.getvalue().decode('utf-8')
-                    companies = [line.strip() for line in file_content.split('\n') if line.strip()]
-                    
-                    if companies:
-                        # 清空现有数据并导入新数据
-                        match_service.companies.clear()
-                        match_service.add_companies(companies)
-                        
-                        st.success(f"✅ 成功导入 {len(companies)} 个公司名")
+                    # 同一文件与导入方式只导入一次，之后直接使用名单库
+                    import_key = (uploaded_file.name, uploaded_file.size, import_mode) if uploaded_file else None
+                    if import_key and st.session_state.get('imported_file') != import_key:
+                        file_content = uploaded_file.getvalue().decode('utf-8')
+                        companies = [line.strip() for line in file_content.split('\n') if line.strip()]
                         
+                        if companies:
+                            if import_mode == "替换名单":
+                                registry.replace(companies)
+                            elif import_mode == "追加到名单":
+                                registry.add(companies)
+                            else:
+                                registry.remove(companies)
+                            st.session_state.imported_file = import_key
+                            registry_count = match_service.load_registry(registry)
+                            st.success(f"✅ {import_mode} {len(companies)} 个公司名，名单库当前共 {registry_count} 个公司名")
+                        else:
+                            st.warning("⚠️ 文件中没有有效的公司名")
+                    
+                    if registry_count:
                         # 立即进行匹配
-                        with st.spinner("正在匹配..."):
+                        if search_query:
+                            with st.spinner("正在匹配..."):
+                                try:
+                                    results = match_service.search_companies(search_query, limit=10)
+                                    
+                                    # 将结果存入session state以便右侧显示
+                                    st.session_state.match_results = results
+                                    st.session_state.search_query = search_query
+                                    
+                                except Exception as e:
+                                    st.error(f"匹配失败: {e}")
+                        
+                        # 批量匹配，结果流式返回并更新进度
+                        if query_file:
                             try:
-                                results = match_service.search_companies(search_query, limit=10)
-                                
-                                # 将结果存入session state以便右侧显示
-                                st.session_state.match_results = results
-                                st.session_state.search_query = search_query
-                                
+                                queries = parse_queries(query_file)
+                                progress = st.progress(0.0, text=f"正在批量匹配 0/{len(queries)}")
+                                batch_results = []
+                                for query, results in match_service.search_many(queries, limit=10):
+                                    batch_results.append((query, results))
+                                    if len(batch_results) % 50 == 0 or len(batch_results) == len(queries):
+                                        progress.progress(len(batch_results) / len(queries),
+                                                          text=f"正在批量匹配 {len(batch_results)}/{len(queries)}")
+                                st.session_state.batch_csv = results_to_csv(batch_results)
+                                st.session_state.batch_count = len(batch_results)
+                                st.success(f"✅ 批量匹配完成，共 {len(batch_results)} 个查询")
                             except Exception as e:
-                                st.error(f"匹配失败: {e}")
+                                st.error(f"批量匹配失败: {e}")
                     else:
-                        st.warning("⚠️ 文件中没有有效的公司名")
+                        st.warning("⚠️ 名单库为空，请上传公司名单文件")
                 
                 except Exception as e:
                     st.error(f"解析文件失败: {e}")
@@ -76,6 +142,15 @@ def main():
     with right_col:
         st.subheader("📊 匹配结果")
         
+        # 批量匹配结果下载
+        if 'batch_csv' in st.session_state:
+            st.download_button(
+                f"📥 下载批量匹配结果 ({st.session_state.batch_count} 个查询)",
+                data=st.session_state.batch_csv,
+                file_name="company_match_results.csv",
+                mime="text/csv"
+            )
+        
         # 显示匹配结果
         if 'match_results' in st.session_state and st.session_state.match_results:
             results = st.session_state.match_results
@@ -87,7 +162,11 @@ def main():
             for i, result in enumerate(results, 1):
                 with st.container():
                     st.write(f"**{i}. {result['company_name']}**")
-                    st.write(f"   相似度: {result['score']:.3f} | 编辑距离: {result['distance']}")
+                    if 'core_name' in result:
+                        st.write(f"   相似度: {result['score']:.3f} | 核心字号: {result['core_name']} | "
+                                 f"编辑距离: {result['distance']} | 加权距离: {result['weighted_distance']}")
+                    else:
+                        st.write(f"   相似度: {result['score']:.3f} | 编辑距离: {result['distance']}")
                     st.divider()
         
         elif 'match_results' in st.session_state and not st.session_state.match_results:
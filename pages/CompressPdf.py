@@ -4,7 +4,7 @@ from time import time
 import streamlit as st
 from dotenv import load_dotenv
 
-from service import pdf_to_pic, pic_to_pdf
+from service import compress_pdf
 
 
 def main():
@@ -25,20 +25,9 @@ def main():
                 st.warning(f"⚠️ 上传的文件小于目标大小 {compress_size}M，无需压缩")
                 return
             start = time()
-            ret_size = len(uploaded_file.getvalue())
-            ratio = 40
-            pdf_bits = None
-            while compress_size * 1024 * 1024 < ret_size:
-                if ratio == 10:
-                    st.warning(f"⚠️ 无法压缩到指定大小 {compress_size}M")
-                    return
-                pic_list = pdf_to_pic(uploaded_file.getvalue(), ratio)
-                pdf_bits = pic_to_pdf(pic_list)
-                ret_size = len(pdf_bits)
-                ratio = ratio - 10
-            
-            if pdf_bits is None:
-                st.error("❌ 压缩失败，请重试")
+            pdf_bits = compress_pdf(uploaded_file.getvalue(), compress_size * 1024 * 1024)
+            if len(pdf_bits) > compress_size * 1024 * 1024:
+                st.warning(f"⚠️ 无法压缩到指定大小 {compress_size}M")
                 return
             end = time()
             elapsed = end - start
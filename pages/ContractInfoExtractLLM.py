@@ -2,11 +2,11 @@ import json
 from time import time
 import os
 
-import requests
 import streamlit as st
 from dotenv import load_dotenv
 
 from service import *
+from service.HttpClient import http_post, long_timeout
 
 
 def main():
@@ -77,7 +77,7 @@ def main():
             with st.spinner("🔄 正在处理中..."):
                 url = os.getenv("DFS_URL")
                 files = {'file': (uploaded_file.name, uploaded_file.getvalue())}
-                r = requests.post(url, files=files)
+                r = http_post(url, idempotent=False, files=files)
                 data = json.loads(r.text)
                 print(data)
                 file_dfs_url = data["map"]["privateUrl"]
@@ -88,7 +88,7 @@ def main():
                 args = {'fileUrl': file_dfs_url, 'seal': select_seal, "question": user_input, "doc": select_doc, "useCls": 1 if usecls_options == "启用" else 0,
                         'returnOcrText': 1, 'returnLLMThink': 1, "appId": selected_app_id}
                 start = time()
-                valid_result = requests.post(os.getenv("CONTRACT_EXTRACT_URL"), json=args)
+                valid_result = http_post(os.getenv("CONTRACT_EXTRACT_URL"), idempotent=False, timeout=long_timeout(), json=args)
                 valid_data = json.loads(valid_result.text)
                 print(valid_data)
                 
@@ -2,9 +2,11 @@ import json
 from time import time
 
 import streamlit as st
+from PIL import Image
 from dotenv import load_dotenv
 
 from service import *
+from service.HttpClient import http_post, long_timeout
 
 
 def main():
@@ -70,7 +72,7 @@ def main():
                     return
                 url = os.getenv("DFS_URL")
                 files = {'file': (uploaded_file.name, uploaded_file.getvalue())}
-                r = requests.post(url, files=files)
+                r = http_post(url, idempotent=False, files=files)
                 data = json.loads(r.text)
                 file_dfs_url = data["map"]["privateUrl"]
                 select_seal = [1 if color == "红色圆章" else 2 if color == "灰色圆章" else None for color in
@@ -79,7 +81,7 @@ def main():
                 start = time()
                 args = {'fileUrl': file_dfs_url, 'seal': select_seal, "question": user_input, "doc": select_doc, "useCls": 1 if usecls_options == "启用" else 0,
                         'returnOcrText': 1, 'returnLLMThink': 1, "appId": selected_app_id}
-                valid_result = requests.post(os.getenv("CONTRACT_VALID_URL"), json=args)
+                valid_result = http_post(os.getenv("CONTRACT_VALID_URL"), idempotent=False, timeout=long_timeout(), json=args)
                 valid_data = json.loads(valid_result.text)
                 print(valid_data)
                 if valid_data.get("code") == "99":
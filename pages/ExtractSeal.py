@@ -43,12 +43,8 @@ def main():
                 with st.spinner("正在检测印章..."):
                     start = time()
                     ips_service = IPService()
-                    byte_stream = io.BytesIO()
-                    # Convert CMYK to RGB before saving as PNG
-                    if image.mode == 'CMYK':
-                        image = image.convert('RGB')
-                    image.save(byte_stream, format='PNG')
-                    byte_data = byte_stream.getvalue()
+                    # 原始文件直接发送，由服务按需转码
+                    byte_data = uploaded_file.getvalue()
                     results = ips_service.seal_preprocess(byte_data, return_seal_image=True, return_ocr_text=False, 
                                                         tool=(conf_size, False, False))
                     
@@ -1,10 +1,11 @@
 import os
 import json
-import requests
 import streamlit as st
 from PIL import Image
 from dotenv import load_dotenv
 
+from service.HttpClient import http_post
+
 
 def main():
     load_dotenv()
@@ -34,7 +35,7 @@ def main():
         # 上传到 DFS
         with st.spinner("正在上传到 DFS 服务器..."):
             files = {'file': (uploaded_file.name, uploaded_file.getvalue())}
-            r = requests.post(dfs_url, files=files)
+            r = http_post(dfs_url, idempotent=False, files=files)
 
         if r.status_code == 200:
             data = json.loads(r.text)
@@ -49,7 +50,7 @@ def main():
                     "position": position_input.strip() if position_input else "",
                     "fileUrl": file_dfs_url
                 }
-                response = requests.post(handprint_url, headers=headers, json=payload)
+                response = http_post(handprint_url, headers=headers, json=payload)
 
             if response.status_code == 200:
                 result = response.json()             
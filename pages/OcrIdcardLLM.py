@@ -1,4 +1,3 @@
-import io
 from time import time
 import json
 import os
@@ -41,11 +40,8 @@ def main():
                 st.subheader("检测结果")
                 with st.spinner("正在检测身份证信息..."):
                     ips_service = IPService()
-                    byte_stream = io.BytesIO()
-                    if image.mode == 'CMYK':
-                        image = image.convert('RGB')
-                    image.save(byte_stream, format='PNG')
-                    byte_data = byte_stream.getvalue()
+                    # 原始文件直接发送，由服务按需转码
+                    byte_data = uploaded_file.getvalue()
                     
                     start = time()
                     results = ips_service.idcard_preprocess(byte_data, return_ocr_text=True, return_corp_image=True,
@@ -1,4 +1,3 @@
-import io
 import os
 from time import time
 
@@ -7,6 +6,8 @@ from dotenv import load_dotenv
 from PIL import Image
 
 from service import OneApiService
+from service.IPService import IPService
+from service.ImageCodec import encode_image, crop_or_original
 
 
 def main():
@@ -16,6 +17,8 @@ def main():
     st.subheader(f"🆔 身份证信息提取({llm})")
     
     uploaded_file = st.file_uploader("上传身份证影像", type=["png", "jpg", "bmp"])
+    crop_card = st.checkbox("先裁剪身份证区域", value=False,
+                            help="先由IPS检测并裁剪身份证区域，只把裁剪图发送给视觉模型（图像更小、推理更快）")
     
     if uploaded_file is not None:
         columns = st.columns(2)
@@ -26,10 +29,18 @@ def main():
         
         with columns[1]:
             with st.spinner("正在提取身份证信息..."):
-                byte_stream = io.BytesIO()
-                image.save(byte_stream, format='PNG')
-                byte_data = byte_stream.getvalue()
                 start = time()
+                corp_image_base64 = None
+                if crop_card:
+                    try:
+                        results = IPService().idcard_preprocess(uploaded_file.getvalue(), return_corp_image=True,
+                                                                return_ocr_text=False)
+                        corp_image_base64 = next((r["corp_image_base64"] for r in results
+                                                  if r.get("corp_image_base64")), None)
+                    except Exception as e:
+                        st.warning(f"⚠️ 裁剪失败，使用原图: {e}")
+                # 按vlm预算缩放为灰度JPEG，只编码一次，页面重新运行时复用
+                byte_data = encode_image(crop_or_original(uploaded_file, corp_image_base64), "vlm", mode="L")
                 oneApiService = OneApiService(llm)
                 try:
                     res = oneApiService.ocr_idcard_vl(byte_data)
@@ -1,4 +1,3 @@
-import io
 from time import time
 
 import streamlit as st
@@ -29,9 +28,7 @@ def main():
         with columns[1]:
             with st.spinner("正在提取文字..."):
                 start = time()
-                byte_stream = io.BytesIO()
-                image.save(byte_stream, format='PNG')
-                byte_data = byte_stream.getvalue()
+                byte_data = uploaded_file.getvalue()
                 paddleOcr = PaddleOcrService()
                 text = paddleOcr.ocr_text(byte_data)
                 end = time()
@@ -2,11 +2,12 @@ import json
 import os
 from time import time
 
-import requests
 import streamlit as st
 from PIL import Image
 from dotenv import load_dotenv
 
+from service.HttpClient import http_post
+
 
 def main():
     load_dotenv()
@@ -39,7 +40,7 @@ def main():
                 with st.spinner("正在检测发票信息..."):
                     url = os.getenv("DFS_URL")
                     files = {'file': (uploaded_file.name, uploaded_file.getvalue())}
-                    r = requests.post(url, files=files)
+                    r = http_post(url, idempotent=False, files=files)
                     data = json.loads(r.text)
                     print(data)
                     file_dfs_url = data["map"]["privateUrl"]
@@ -49,7 +50,7 @@ def main():
                     }
                     start = time()
                     # 发送 POST 请求
-                    response = requests.post(os.getenv("RESOURCE_INVOICE_OCR_URL"), headers=headers, data=file_dfs_url)
+                    response = http_post(os.getenv("RESOURCE_INVOICE_OCR_URL"), headers=headers, data=file_dfs_url)
                     inv_result = json.loads(response.text)
                     print(inv_result)
 
@@ -5,6 +5,7 @@ import streamlit as st
 from dotenv import load_dotenv
 
 from service import OcrService
+from service.OcrService import PdfOcrStats
 
 
 def main():
@@ -15,23 +16,39 @@ def main():
     uploaded_file = st.file_uploader("上传PDF文件", type=["pdf"])
     
     if uploaded_file is not None:
-        with st.spinner("正在提取文字..."):
-            start = time()
-            ocr = OcrService()
-            res = ocr.detect_from_pdf_path(uploaded_file.getvalue())
-            end = time()
-            elapsed = end - start
-            st.success(f"✅ 提取完成，耗时: {elapsed:.2f}s")
-            
-            for key, value in res.items():
-                st.info(f"第 {key + 1} 页")
-                columns = st.columns(2)
-                with columns[0]:
-                    st.image(value[0], caption=f"第 {key + 1} 页")
-                with columns[1]:
-                    st.markdown("**识别结果：**")
-                    for txt in value[1]:
-                        st.caption(txt)
+        start = time()
+        ocr = OcrService()
+        status = st.empty()
+        progress = st.progress(0.0, text="正在识别第 1 页...")
+        first_page = None
+        errors = 0
+        stats = PdfOcrStats()
+        # 每页识别完成即显示，无需等待整个文档；有文字层的页面直接提取文字，不调用OCR
+        # 单页识别失败时照常显示该页并提示错误，不中断其余页面
+        for page in ocr.iter_pdf_ocr(uploaded_file.getvalue(), stats=stats, raise_on_error=False):
+            if first_page is None:
+                first_page = time() - start
+            progress.progress((page.page + 1) / page.total, text=f"已识别 {page.page + 1}/{page.total} 页")
+            st.info(f"第 {page.page + 1} 页" + ("（PDF文字层）" if page.source == "text_layer" else ""))
+            columns = st.columns(2)
+            with columns[0]:
+                st.image(page.image, caption=f"第 {page.page + 1} 页")
+            with columns[1]:
+                st.markdown("**识别结果：**")
+                if page.error:
+                    errors += 1
+                    st.error(f"识别失败: {page.error}")
+                for txt in page.lines:
+                    st.caption(txt)
+        elapsed = time() - start
+        progress.empty()
+        if first_page is None:
+            status.warning("⚠️ PDF中没有页面")
+        else:
+            status.success(f"✅ 提取完成，耗时: {elapsed:.2f}s（首页 {first_page:.2f}s）")
+            st.caption(str(stats))
+        if errors:
+            st.warning(f"⚠️ {errors} 页识别失败")
     else:
         st.info("💡 请上传PDF文件后查看文字识别结果")
         with st.expander("📖 使用说明"):
@@ -4,13 +4,13 @@ import re
 from time import time
 import json
 import os
-import requests
 
 import streamlit as st
 from dotenv import load_dotenv
 from PIL import Image
 
 from service.IPService import IPService
+from service.HttpClient import http_post
 from service.PaddleOcrService import PaddleOcrService
 
 
@@ -106,13 +106,12 @@ def main():
                                 if third_party_options == "启用" and "seal_image_base64" in res:
                                     with st.spinner("正在调用第三方识别引擎..."):
                                         try:                                          
-                                            import requests
                                             third_party_url = os.getenv('THIRD_PARTY_OCR_SEAL_URL')
                                             if not third_party_url:
                                                 st.warning("未配置 THIRD_PARTY_OCR_SEAL_URL 环境变量")
                                             else:                                              
                                                 base64_content = res["seal_image_base64"]                                              
-                                                response = requests.post(
+                                                response = http_post(
                                                     third_party_url,
                                                     data=base64_content,
                                                     headers={'Content-Type': 'text/plain'}
@@ -1,15 +1,27 @@
 import os
-from io import BytesIO
 from time import time
 from datetime import datetime
+from typing import NamedTuple
 
 import streamlit as st
 from dotenv import load_dotenv
-from PIL import Image
 
 from service.OcrService import OcrService
+from service.ResourceRegistry import registry, embedding_ready
 from service.VectorDBService import VectorDBService
 from service.vllm_inference import text_inference_with_llm
+
+# 流式构建知识库时，积累到该块数即嵌入并写入
+INGEST_BATCH_CHUNKS = 16
+
+
+class IngestProgress(NamedTuple):
+    """流式构建知识库的进度：已处理页数、总页数、累计识别字符数、累计写入块数、识别失败的页码（从1开始）"""
+    pages_done: int
+    total_pages: int
+    chars: int
+    stored_chunks: int
+    failed_pages: tuple = ()
 
 
 class SmartQAKB:
@@ -86,40 +98,79 @@ class SmartQAKB:
             st.error(f"清空知识库失败: {str(e)}")
             return False
     
-    def process_uploaded_file(self, uploaded_file):
-        """处理上传的文件，进行OCR识别"""
+    def iter_uploaded_file_pages(self, uploaded_file):
+        """逐页OCR识别上传的文件，PDF每页识别完成即返回：(页码, 总页数, 页面文本, 识别失败时的异常)"""
         file_extension = uploaded_file.name.split('.')[-1].lower()
         
         if file_extension in ['jpg', 'jpeg', 'png', 'bmp']:
             # 处理图片文件
-            image = uploaded_file.getvalue()
-            pil_image = Image.open(BytesIO(image))
-            ocr_result = self.ocr_service.detect_from_image(pil_image)
-            return " ".join(ocr_result) if ocr_result else ""
+            # 原始文件直接发送，无需解码后再编码为PNG
+            ocr_result = self.ocr_service.detect_from_image(uploaded_file.getvalue())
+            yield 0, 1, " ".join(ocr_result), None
             
         elif file_extension == 'pdf':
-            # 处理PDF文件
-            pdf_bytes = uploaded_file.getvalue()
-            pdf_text_dict = self.ocr_service.detect_from_pdf_path(pdf_bytes)
-            
-            # 合并所有页面的文本
-            all_text = []
-            for page_num, (img, text_list) in pdf_text_dict.items():
-                all_text.extend(text_list)
-            
-            return " ".join(all_text) if all_text else ""
+            # 处理PDF文件，单页识别失败时返回该页的异常，由调用方统计并提示
+            # 有文字层的页面直接提取文字，无需渲染页面图像
+            for page in self.ocr_service.iter_pdf_ocr(uploaded_file.getvalue(), render_text_pages=False,
+                                                      raise_on_error=False):
+                yield page.page, page.total, " ".join(page.lines), page.error
         
         else:
             raise ValueError(f"不支持的文件格式: {file_extension}")
     
+    def process_uploaded_file(self, uploaded_file):
+        """处理上传的文件，进行OCR识别；任一页识别失败时抛出该页的异常"""
+        texts = []
+        for _, _, text, error in self.iter_uploaded_file_pages(uploaded_file):
+            if error is not None:
+                raise error
+            if text:
+                texts.append(text)
+        return " ".join(texts)
+    
+    def ingest_uploaded_file(self, uploaded_file, document_id, chunk_size=500, overlap=50):
+        """
+        流式构建知识库：逐页OCR的同时分块、嵌入并写入，前面页面的嵌入与后面页面的OCR请求并行进行
+        识别失败的页面跳过并记录在failed_pages中；中途出错（或调用方未读完就结束）时删除本文件已写入的分块后抛出
+        :return: IngestProgress生成器，每处理完一页返回一次，最后一次为全部写入完成后的结果
+        """
+        chunker = self.vector_db_service.streaming_chunker(chunk_size, overlap)
+        pending = []
+        stored = 0
+        chars = 0
+        total_pages = 0
+        failed_pages = []
+        try:
+            for page, total_pages, text, error in self.iter_uploaded_file_pages(uploaded_file):
+                if error is not None:
+                    failed_pages.append(page + 1)
+                chars += len(text)
+                pending.extend(chunker.feed(text))
+                if len(pending) >= INGEST_BATCH_CHUNKS:
+                    stored += self.store_in_knowledge_base(pending, document_id, uploaded_file.name, start_index=stored)
+                    pending = []
+                yield IngestProgress(page + 1, total_pages, chars, stored, tuple(failed_pages))
+            
+            pending.extend(chunker.finish())
+            if pending:
+                stored += self.store_in_knowledge_base(pending, document_id, uploaded_file.name, start_index=stored)
+            if stored:
+                self.vector_db_service.set_total_chunks(document_id, stored)
+        except BaseException:
+            # 写入失败的批次也可能已有部分分块落库，按document_id整体删除
+            if not self.vector_db_service.delete_document(document_id):
+                print(f"撤销文档 {document_id} 已写入的分块失败")
+            raise
+        yield IngestProgress(total_pages, total_pages, chars, stored, tuple(failed_pages))
+    
     def chunk_text(self, text, chunk_size=500, overlap=50):
         """将文本分块"""
         return self.vector_db_service.chunk_text(text, chunk_size, overlap)
     
-    def store_in_knowledge_base(self, text_chunks, document_id, file_name=None):
+    def store_in_knowledge_base(self, text_chunks, document_id, file_name=None, start_index=0):
         """将文本块存储到知识库，并附加文件名和时间作为元数据"""
         metadata = {"file_name": file_name, "timestamp": int(time())} if file_name else None
-        return self.vector_db_service.store_document_chunks(document_id, text_chunks, metadata)
+        return self.vector_db_service.store_document_chunks(document_id, text_chunks, metadata, start_index)
     
     def search_knowledge_base(self, query, top_k=5):
         """在知识库中搜索相似文本块"""
@@ -136,8 +187,12 @@ def main():
     # 清除所有会话状态，确保每次打开都是新的
     st.session_state.clear()
     
-    # 初始化应用
-    st.session_state.qa_system = SmartQAKB()
+    # 初始化应用（嵌入模型与Qdrant客户端在进程内共享，只有首次加载需要等待）
+    if embedding_ready():
+        st.session_state.qa_system = SmartQAKB()
+    else:
+        with st.spinner("正在加载嵌入模型..."):
+            st.session_state.qa_system = SmartQAKB()
     qa_system = st.session_state.qa_system
     
     # 初始化知识库
@@ -201,6 +256,11 @@ def main():
                 st.session_state.uploaded_file = uploaded_file
                 st.success(f"已上传: {uploaded_file.name}")
             
+            # 共享资源加载状态
+            for name, state in registry.health().items():
+                load_seconds = state.get("load_seconds")
+                st.caption(f"{name}: {state['status']}" + (f"（加载耗时 {load_seconds}s）" if load_seconds is not None else ""))
+            
             # 创建两列布局放置知识库管理按钮
             col_update, col_delete = st.columns(2)
             
@@ -210,36 +270,44 @@ def main():
                     if st.button("更新知识库", type="primary", help="向知识库添加新文档，不清空现有内容"):
                         with st.spinner("正在更新知识库..."):
                             try:
-                                # OCR识别
-                                ocr_text = qa_system.process_uploaded_file(st.session_state.uploaded_file)
+                                # 逐页OCR，识别出的页面立即分块、嵌入并写入知识库
+                                document_id = f"doc_{int(time())}"
+                                progress = st.progress(0.0, text="正在识别第 1 页...")
+                                result = None
+                                for result in qa_system.ingest_uploaded_file(st.session_state.uploaded_file, document_id):
+                                    progress.progress(result.pages_done / max(result.total_pages, 1),
+                                                      text=f"已识别 {result.pages_done}/{result.total_pages} 页，"
+                                                           f"{result.chars} 个字符，已写入 {result.stored_chunks} 个文本块")
+                                
+                                if result and result.failed_pages:
+                                    failed = "、".join(str(page) for page in result.failed_pages)
+                                    if len(result.failed_pages) == result.total_pages:
+                                        st.error(f"全部 {result.total_pages} 页识别失败")
+                                    else:
+                                        st.warning(f"⚠️ 第 {failed} 页识别失败（共 {len(result.failed_pages)} 页），"
+                                                   f"这些页面的内容未写入知识库")
                                 
-                                if not ocr_text.strip():
+                                if not result or not result.chars:
                                     st.error("OCR识别失败或未识别到文本内容")
                                     return
                                 
-                                st.success(f"OCR识别完成，识别到 {len(ocr_text)} 个字符")
-                                
-                                # 文本分块
-                                text_chunks = qa_system.chunk_text(ocr_text)
-                                st.success(f"文本分块完成，共 {len(text_chunks)} 个块")
-                                
-                                # 存储到知识库
-                                document_id = f"doc_{int(time())}"
-                                stored_count = qa_system.store_in_knowledge_base(text_chunks, document_id, st.session_state.uploaded_file.name)
-                                st.success(f"知识库更新完成，新增了 {stored_count} 个文本块")
+                                st.success(f"OCR识别完成，识别到 {result.chars} 个字符")
+                                st.success(f"知识库更新完成，新增了 {result.stored_chunks} 个文本块")
                                 
                                 # 保存处理状态
                                 st.session_state.knowledge_base = {
                                     'document_id': document_id,
-                                    'ocr_text': ocr_text,
-                                    'chunk_count': len(text_chunks),
+                                    'char_count': result.chars,
+                                    'chunk_count': result.stored_chunks,
                                     'kb_name': qa_system.kb_name
                                 }
                                 
-                                st.experimental_rerun()
+                                # 有页面识别失败时不刷新页面，保留提示
+                                if not result.failed_pages:
+                                    st.experimental_rerun()
                                 
                             except Exception as e:
-                                st.error(f"处理文件时出错: {str(e)}")
+                                st.error(f"处理文件时出错: {str(e)}，本文件已写入的内容已撤销")
             
             with col_delete:
                 # 清空知识库按钮
@@ -261,7 +329,7 @@ def main():
         
         # 显示OCR原始文本（如果有新上传的文档）
         if 'knowledge_base' in st.session_state:
-            st.success(f"已处理文档: {len(st.session_state.knowledge_base['ocr_text'])} 字符, {st.session_state.knowledge_base['chunk_count']} 个文本块")
+            st.success(f"已处理文档: {st.session_state.knowledge_base['char_count']} 字符, {st.session_state.knowledge_base['chunk_count']} 个文本块")
         
         # 显示搜索结果
         if 'search_results' in st.session_state:
@@ -335,7 +403,7 @@ def main():
                 st.info("知识库统计")
                 st.write(f"- 知识库名称: {st.session_state.knowledge_base['kb_name']}")
                 st.write(f"- 文档ID: {st.session_state.knowledge_base['document_id']}")
-                st.write(f"- 文本字符数: {len(st.session_state.knowledge_base['ocr_text'])}")
+                st.write(f"- 文本字符数: {st.session_state.knowledge_base['char_count']}")
                 st.write(f"- 文本块数量: {st.session_state.knowledge_base['chunk_count']}")
 
 
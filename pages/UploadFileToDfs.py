@@ -1,9 +1,10 @@
 import os
 
-import requests
 import streamlit as st
 from dotenv import load_dotenv
 
+from service.HttpClient import http_post
+
 
 def main():
     load_dotenv()
@@ -20,7 +21,14 @@ def main():
         with st.spinner("正在上传文件..."):
             url = os.getenv("DFS_URL")
             files = {'file': (uploaded_file.name, uploaded_file.getvalue())}
-            r = requests.post(url, files=files)
+            try:
+                r = http_post(url, idempotent=False, files=files)
+            except Exception as e:
+                st.error(f"❌ 文件上传失败: {e}")
+                return
+            if r.status_code != 200:
+                st.error(f"❌ 文件上传失败 (HTTP {r.status_code}): {r.text}")
+                return
             st.success(f"✅ 文件上传成功: {uploaded_file.name}")
             st.json(r.text)
     else:
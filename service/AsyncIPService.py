@@ -0,0 +1,157 @@
+import asyncio
+from typing import Tuple, List, Dict, Optional, Union, Iterable
+
+import httpx
+
+from service.HttpClient import default_timeout, endpoint_concurrency, max_retries
+from service.ImageCodec import EncodedImage, encode_image
+from service.IPService import IPService, _api_url, _encode_image, _check_status
+
+# preprocess_many中可用的接口名称与对应方法
+ENDPOINT_METHODS = {
+    "seal": "seal_preprocess",
+    "invoice": "invoice_preprocess",
+    "idcard": "idcard_preprocess",
+    "bizlic": "bizlic_preprocess",
+    "card_det": "card_det",
+}
+
+
+def _encode_once(image_bytes) -> EncodedImage:
+    # 编码并计算base64，之后各接口直接复用
+    encoded = encode_image(image_bytes, "ips")
+    encoded.base64
+    return encoded
+
+
+async def _encode_async(image_bytes) -> str:
+    # 大图的解码/编码与base64计算放到线程中，不阻塞事件循环；已编码的EncodedImage直接返回缓存的base64
+    return await asyncio.to_thread(_encode_image, image_bytes)
+
+
+class AsyncIPService(IPService):
+    """
+    IPService的异步版本，方法与IPService一致，基于httpx.AsyncClient；
+    所有调用均可取消，并可通过deadline（秒）限定最长耗时
+    """
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        self._client = client
+        self._own_client = client is None
+        self._limits = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._client is not None and self._own_client:
+            await self._client.aclose()
+            self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            connect, read = default_timeout()
+            # 连接失败（请求尚未发出）时自动重试
+            transport = httpx.AsyncHTTPTransport(retries=max_retries())
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(read, connect=connect), transport=transport)
+        return self._client
+
+    def _limit(self, api_url) -> asyncio.Semaphore:
+        limit = self._limits.get(api_url)
+        if limit is None:
+            limit = self._limits[api_url] = asyncio.Semaphore(endpoint_concurrency())
+        return limit
+
+    async def seal_preprocess(self, image_bytes, file_type: str = "image", return_seal_image: bool = True,
+                              return_ocr_text: bool = True, tool: Tuple[float, bool, bool] = (0.5, True, True),
+                              deadline: Optional[float] = None) -> List[Dict]:
+        api_url = _api_url("IPS_SEAL_PREPROCESS")
+        payload = self._seal_payload(await _encode_async(image_bytes), file_type, return_seal_image, return_ocr_text, tool)
+        return await self._call(api_url, payload, deadline)
+
+    async def invoice_preprocess(self, image_bytes, file_type: str = "image", return_corp_image: bool = True,
+                                 return_ocr_text: bool = True, tool: Tuple[float, bool, bool] = (0.5, True, False),
+                                 deadline: Optional[float] = None) -> List[Dict]:
+        api_url = _api_url("IPS_INVOICE_PREPROCESS")
+        payload = self._invoice_payload(await _encode_async(image_bytes), file_type, return_corp_image, return_ocr_text, tool)
+        return await self._call(api_url, payload, deadline)
+
+    async def idcard_preprocess(self, image_bytes, return_corp_image: bool = True, return_ocr_text: bool = False,
+                                tool: Tuple[float, bool, bool] = (0.5, True, False),
+                                deadline: Optional[float] = None) -> List[Dict]:
+        api_url = _api_url("IPS_IDCARD_PREPROCESS")
+        payload = self._card_payload(await _encode_async(image_bytes), return_corp_image, return_ocr_text, tool)
+        return await self._call(api_url, payload, deadline)
+
+    async def bizlic_preprocess(self, image_bytes, return_corp_image: bool = True, return_ocr_text: bool = True,
+                                tool: Tuple[float, bool, bool] = (0.8, True, False),
+                                deadline: Optional[float] = None) -> List[Dict]:
+        api_url = _api_url("IPS_BIZLIC_PREPROCESS")
+        payload = self._card_payload(await _encode_async(image_bytes), return_corp_image, return_ocr_text, tool)
+        return await self._call(api_url, payload, deadline)
+
+    async def card_det(self, image_bytes, return_corp_image: bool = True, deadline: Optional[float] = None) -> Dict:
+        api_url = _api_url("IPS_CARD_DET")
+        payload = self._card_det_payload(await _encode_async(image_bytes), return_corp_image)
+        return await self._call(api_url, payload, deadline)
+
+    async def preprocess_many(self, image_bytes, endpoints: Union[Iterable[str], Dict[str, Dict]] = ("seal", "idcard", "bizlic"),
+                              deadline: Optional[float] = None) -> Dict:
+        """
+        将同一张图片同时发送到多个IPS接口；图片只编码一次（在线程中进行），各接口共用同一份base64
+        :param image_bytes: 图片字节数据或已编码的EncodedImage
+        :param endpoints: 接口名称列表（见ENDPOINT_METHODS），或 {接口名称: 该接口的参数} 字典
+        :param deadline: 整体最长耗时（秒，包括编码），到期仍未完成的请求会被取消
+        :return: {接口名称: 返回结果}，调用失败或超时的接口对应值为异常对象（编码超时时所有接口均为超时异常）
+        """
+        if not isinstance(endpoints, dict):
+            endpoints = {name: {} for name in endpoints}
+        unknown = [name for name in endpoints if name not in ENDPOINT_METHODS]
+        if unknown:
+            raise ValueError(f"未知的IPS接口: {unknown}")
+
+        if not endpoints:
+            return {}
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            encoded = await asyncio.wait_for(asyncio.to_thread(_encode_once, image_bytes), deadline)
+        except asyncio.TimeoutError:
+            # 与接口超时相同，以结果中的异常返回，不向调用方抛出
+            return {name: asyncio.TimeoutError(f"图片编码在截止时间内未完成，IPS接口 {name} 未调用") for name in endpoints}
+        if deadline is not None:
+            deadline = max(0.0, deadline - (loop.time() - started))
+
+        tasks = {name: asyncio.ensure_future(getattr(self, ENDPOINT_METHODS[name])(encoded, **kwargs))
+                 for name, kwargs in endpoints.items()}
+        try:
+            await asyncio.wait(tasks.values(), timeout=deadline)
+        finally:
+            # 超时或调用方取消时，取消所有未完成的请求并等待其结束
+            pending = [task for task in tasks.values() if not task.done()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        results = {}
+        for name, task in tasks.items():
+            if task.cancelled():
+                results[name] = asyncio.TimeoutError(f"IPS接口 {name} 在截止时间内未完成")
+            elif task.exception() is not None:
+                results[name] = task.exception()
+            else:
+                results[name] = task.result()
+        return results
+
+    async def _call(self, api_url, payload, deadline: Optional[float] = None):
+        return await asyncio.wait_for(self._post(api_url, payload), deadline)
+
+    async def _post(self, api_url, payload):
+        async with self._limit(api_url):
+            response = await self._get_client().post(api_url, json=payload)
+        _check_status(response.status_code, response.text)
+        return response.json()
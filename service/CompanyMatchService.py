@@ -1,15 +1,170 @@
 import os
 import re
-from typing import List, Optional
+import pickle
+import time
+from typing import List, Optional, Iterable, Iterator, Tuple
 import Levenshtein
 import heapq
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from service.CompanyNameNormalizer import NormalizedName, normalize_company_name
+from service.WorkerPool import imap_ordered, parallel_worthwhile, shared_file
+
+# 出现在超过该比例公司名中的字符或二元组（如"公司"、"有限"）不查倒排表，直接按上界计入
+STOP_GRAM_RATIO = 0.2
+
+# 批量匹配时每个任务包含的查询数
+SEARCH_CHUNK_SIZE = 32
+# 子进程首次运行匹配任务时导入service包的耗时估计（见benchmarks/bench_company_batch.py）
+COMPANY_MATCH_STARTUP_SECONDS = float(os.getenv("COMPANY_MATCH_STARTUP_SECONDS", 1.0))
+# 子进程内缓存的公司名列表与索引份数（按临时文件路径），超出时丢弃最早加载的
+WORKER_STATE_CACHE_SIZE = 2
+
+_worker_services = OrderedDict()
+
+# 已删除的公司名的距离下界取该值，不参与校验
+EXCLUDED_BOUND = np.iinfo(np.int32).max
+
+# 规范化匹配时，地区、组织形式不一致的附加距离（两者之和小于1，只影响核心字号距离相同的结果的排序）
+REGION_WEIGHT = 0.3
+LEGAL_FORM_WEIGHT = 0.2
+
+
+def _codepoints(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+
+def _bigram_codes(codepoints: np.ndarray) -> np.ndarray:
+    """相邻两个字符的码位组合为一个int64编码"""
+    return (codepoints[:-1].astype(np.int64) << 21) | codepoints[1:].astype(np.int64)
+
+
+class _Postings:
+    """倒排表（CSR结构）：每个gram对应包含它的公司下标及出现次数"""
+
+    def __init__(self, grams: np.ndarray, owners: np.ndarray):
+        order = np.lexsort((owners, grams))
+        grams = grams[order]
+        owners = owners[order]
+        del order
+        # 同一公司内重复的gram合并为一条并记录次数
+        if len(grams):
+            entry_starts = np.flatnonzero(np.r_[True, (grams[1:] != grams[:-1]) | (owners[1:] != owners[:-1])])
+        else:
+            entry_starts = np.empty(0, dtype=np.int64)
+        self.counts = np.diff(np.r_[entry_starts, len(grams)]).astype(np.uint16)
+        self.owners = owners[entry_starts]
+        grams = grams[entry_starts]
+        key_starts = np.flatnonzero(np.r_[True, grams[1:] != grams[:-1]]) if len(grams) else entry_starts
+        self.keys = grams[key_starts]
+        self.offsets = np.r_[key_starts, len(grams)].astype(np.int64)
+
+    def save(self, directory: str, prefix: str):
+        for name in ("keys", "offsets", "owners", "counts"):
+            np.save(os.path.join(directory, f"{prefix}_{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str, prefix: str, mmap_mode: Optional[str] = "r") -> "_Postings":
+        """加载已保存的倒排表，默认以内存映射方式打开，不读入整个文件"""
+        postings = cls.__new__(cls)
+        for name in ("keys", "offsets", "owners", "counts"):
+            setattr(postings, name, np.load(os.path.join(directory, f"{prefix}_{name}.npy"), mmap_mode=mmap_mode))
+        return postings
+
+    def shared(self, query_grams: np.ndarray, size: int) -> np.ndarray:
+        """查询与每个公司名共有的gram数量（多重集交集），高频gram按查询中的次数计入，结果不小于真实值"""
+        shared = np.zeros(size, dtype=np.int32)
+        if not len(query_grams):
+            return shared
+        grams, counts = np.unique(query_grams, return_counts=True)
+        slots = np.searchsorted(self.keys, grams)
+        stop_limit = STOP_GRAM_RATIO * size
+        singles, owners, weights = [], [], []
+        for gram, count, slot in zip(grams, counts, slots):
+            if slot >= len(self.keys) or self.keys[slot] != gram:
+                continue
+            start, end = self.offsets[slot], self.offsets[slot + 1]
+            if end - start > stop_limit:
+                shared += count
+            elif count == 1:
+                # 查询中只出现一次的gram，每个包含它的公司计1（不需要加权计数）
+                singles.append(self.owners[start:end])
+            else:
+                owners.append(self.owners[start:end])
+                weights.append(np.minimum(self.counts[start:end], count))
+        if singles:
+            shared += np.bincount(np.concatenate(singles), minlength=size).astype(np.int32)
+        if owners:
+            shared += np.bincount(np.concatenate(owners), weights=np.concatenate(weights),
+                                  minlength=size).astype(np.int32)
+        return shared
+
+
+class _NgramIndex:
+    """
+    字符与二元组倒排索引，用于编辑距离检索的候选过滤
+    每次编辑最多改变一个字符、两个二元组，因此 ed(x, y) 不小于：
+    长度差、max(|x|, |y|) - 共有字符数、(max(|x|, |y|) - 1 - 共有二元组数) / 2
+    """
+
+    def __init__(self, companies: List[str]):
+        self.size = len(companies)
+        self.lengths = np.fromiter((len(c) for c in companies), dtype=np.int32, count=self.size)
+
+        # 所有公司名以\0分隔拼接后一次性计算，跨越分隔符的二元组丢弃
+        codepoints = _codepoints("\0".join(companies))
+        separators = codepoints == 0
+        owners = np.cumsum(separators, dtype=np.int32)
+        chars = ~separators
+        self.unigrams = _Postings(codepoints[chars].astype(np.int64), owners[chars])
+        del chars
+        pairs = ~(separators[:-1] | separators[1:])
+        self.bigrams = _Postings(_bigram_codes(codepoints)[pairs], owners[:-1][pairs])
+
+    def save(self, directory: str):
+        np.save(os.path.join(directory, "lengths.npy"), self.lengths)
+        self.unigrams.save(directory, "unigram")
+        self.bigrams.save(directory, "bigram")
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = "r") -> "_NgramIndex":
+        index = cls.__new__(cls)
+        index.lengths = np.load(os.path.join(directory, "lengths.npy"), mmap_mode=mmap_mode)
+        index.size = len(index.lengths)
+        index.unigrams = _Postings.load(directory, "unigram", mmap_mode)
+        index.bigrams = _Postings.load(directory, "bigram", mmap_mode)
+        return index
+
+    def lower_bounds(self, query: str) -> np.ndarray:
+        """查询与每个公司名编辑距离的下界"""
+        codepoints = _codepoints(query)
+        longest = np.maximum(self.lengths, len(query))
+        bounds = np.abs(self.lengths - len(query))
+        np.maximum(bounds, longest - self.unigrams.shared(codepoints.astype(np.int64), self.size), out=bounds)
+        np.maximum(bounds, (longest - self.bigrams.shared(_bigram_codes(codepoints), self.size)) // 2, out=bounds)
+        return bounds
 
 
 class CompanyMatchService:
-    def __init__(self):
-        """初始化服务"""
+    def __init__(self, normalize: bool = None):
+        """
+        初始化服务
+        :param normalize: 是否按规范化后的核心字号匹配（去除地区、组织形式），默认读取COMPANY_MATCH_NORMALIZE环境变量（1）；
+                          为False时对原始公司名计算Levenshtein距离
+        """
+        if normalize is None:
+            normalize = os.getenv("COMPANY_MATCH_NORMALIZE", "1") == "1"
+        self.normalize = normalize
         # 存储公司名列表用于Levenshtein距离计算
         self.companies = []
+        # 与公司名一一对应的规范化结果
+        self.normalized_companies = []
+        # 参与编辑距离计算的字符串：规范化时为核心字号，否则为原始公司名
+        self._match_keys = []
+        # 匹配字符串的字符/二元组索引，在add_companies时构建
+        self._index = None
     
     def add_companies(self, companies: List[str]) -> int:
         """添加公司名到本地列表"""
@@ -17,8 +172,8 @@ class CompanyMatchService:
             return 0
         
         try:
-            # 清空现有列表
-            self.companies.clear()
+            # 清空现有列表（可能是注册表快照的只读视图，直接替换）
+            self.companies = []
             
             # 添加新公司
             total_added = 0
@@ -28,6 +183,8 @@ class CompanyMatchService:
                     self.companies.append(company_clean)
                     total_added += 1
             
+            self._build_index()
+            
             print(f"总计成功添加 {total_added} 个公司到本地列表")
             return total_added
                 
@@ -35,52 +192,252 @@ class CompanyMatchService:
             print(f"添加公司失败: {e}")
             raise
     
+    def load_registry(self, registry=None) -> int:
+        """
+        从持久化注册表加载当前版本（内存映射，毫秒级），替换本地列表
+        :param registry: CompanyRegistry，默认使用COMPANY_REGISTRY_PATH下的注册表
+        :return: 有效公司名数量
+        """
+        from service.CompanyRegistry import CompanyRegistry
+        
+        snapshot = (registry or CompanyRegistry()).load()
+        self.normalize = snapshot.normalize
+        self.companies = snapshot.companies
+        self.normalized_companies = snapshot.normalized_companies
+        self._match_keys = snapshot.keys
+        self._index = snapshot.index
+        self.registry_version = snapshot.version
+        return snapshot.count
+    
     def search_companies(self, query: str, limit: int = 10) -> List[dict]:
-        """使用Levenshtein距离搜索相似的公司名（全量匹配版本）"""
+        """
+        使用Levenshtein距离搜索相似的公司名（字符/二元组索引过滤 + 精确编辑距离校验，结果与全量匹配一致）
+        规范化模式下对核心字号计算距离，地区、组织形式不一致时追加少量距离；
+        查询只有组织形式（核心字号为空）时按原始公司名匹配
+        """
         try:
             if not query or not query.strip():
                 return []
             
             query = query.strip()
+            if limit <= 0:
+                return []
             
-            # 使用堆（优先队列）来维护距离最小的前limit个结果
-            heap = []  # 最大堆，存储(-distance, company)对
+            query_name = normalize_company_name(query) if self.normalize else None
+            if query_name is not None and not query_name.core:
+                return self._search_raw(query, limit)
+            query_key = query_name.core if self.normalize else query
+            lower_bounds = self._ensure_index().lower_bounds(query_key)
             
-            # 对所有公司名进行全量匹配
-            for company in self.companies:
-                # 计算编辑距离
-                distance = Levenshtein.distance(query, company)
-                
-                # 计算相似度分数
-                max_len = max(len(query), len(company))
-                if max_len == 0:
-                    score = 1.0
+            # 按下界从小到大逐层校验：第level层校验完后，未校验的公司名距离都大于level，
+            # 加权距离不超过level的公司名也都已校验，已找到limit个时即可停止
+            distances = {}
+            weighted = {}
+            histogram = Counter()
+            found = 0
+            live_bounds = lower_bounds[lower_bounds != EXCLUDED_BOUND]
+            max_level = int(live_bounds.max()) if len(live_bounds) else -1
+            for level in range(max_level + 1):
+                for i in np.flatnonzero(lower_bounds == level).tolist():
+                    distance = distances[i] = Levenshtein.distance(query_key, self._match_keys[i])
+                    if self.normalize:
+                        penalty = self._penalty(query_name, self.normalized_companies[i])
+                        weighted[i] = distance + penalty
+                        distance += 1 if penalty else 0
+                    histogram[distance] += 1
+                found += histogram[level]
+                if found >= limit:
+                    break
+            
+            if not self.normalize:
+                if len(distances) > limit:
+                    # 保留距离不超过第limit小距离的全部公司名（含并列），按原始顺序参与排序
+                    kth = heapq.nsmallest(limit, distances.values())[-1]
+                    candidates = sorted(i for i, d in distances.items() if d <= kth)
                 else:
-                    score = 1.0 - (distance / max_len)
+                    candidates = sorted(distances)
                 
-                # 使用堆来维护前limit个最小距离的结果
-                if len(heap) < limit:
-                    heapq.heappush(heap, (-distance, company, score))
-                else:
-                    # 如果当前距离比堆中最大距离小，替换
-                    if distance < -heap[0][0]:
-                        heapq.heappushpop(heap, (-distance, company, score))
-            
-            # 从堆中提取结果并排序
-            results = []
-            while heap:
-                neg_distance, company, score = heapq.heappop(heap)
-                results.append({
-                    "company_name": company,
-                    "score": score,
-                    "distance": -neg_distance
-                })
+                return self._top_k(query, ((self.companies[i], distances[i]) for i in candidates), limit)
             
-            # 按距离升序排序（距离最小的在前）
-            results.sort(key=lambda x: x["distance"])
-            
-            return results
+            best = heapq.nsmallest(limit, weighted, key=lambda i: (weighted[i], i))
+            return [self._normalized_result(query_key, i, distances[i], weighted[i]) for i in best]
             
         except Exception as e:
             print(f"搜索公司失败: {e}")
-            return []   
+            return []
+    
+    def search_many(self, queries: Iterable[str], limit: int = 10,
+                    workers: int = None) -> Iterator[Tuple[str, List[dict]]]:
+        """
+        批量搜索相似的公司名，相同的查询只计算一次
+        先在当前进程逐块匹配，按实测的单条查询耗时估算剩余查询的串行耗时，分给多个进程节省的时间超过
+        进程池启动与传输公司名列表、索引的开销时（见WorkerPool.parallel_worthwhile），剩余查询交给共享进程池
+        :param queries: 查询公司名列表
+        :param limit: 每个查询返回的结果数
+        :param workers: 进程数，默认读取COMPANY_MATCH_WORKERS环境变量或CPU核数，为1时不使用进程池
+        :return: (查询, 结果列表) 生成器，按输入顺序流式返回
+        """
+        queries = [query.strip() if query else "" for query in queries]
+        unique_queries = list(dict.fromkeys(query for query in queries if query))
+        if workers is None:
+            workers = int(os.getenv("COMPANY_MATCH_WORKERS", os.cpu_count() or 1))
+        chunks = [unique_queries[i:i + SEARCH_CHUNK_SIZE] for i in range(0, len(unique_queries), SEARCH_CHUNK_SIZE)]
+        workers = min(workers, len(chunks))
+        
+        results = {}
+        chunk_results = self._iter_chunk_results(chunks, limit, workers)
+        
+        # 按输入顺序输出：当前查询所在的块完成后即返回，重复的查询复用结果
+        chunk_iter = iter(zip(chunks, chunk_results))
+        try:
+            for query in queries:
+                if not query:
+                    yield query, []
+                    continue
+                while query not in results:
+                    chunk, matches = next(chunk_iter)
+                    results.update(zip(chunk, matches))
+                yield query, results[query]
+        finally:
+            chunk_results.close()
+    
+    def _iter_chunk_results(self, chunks, limit, workers):
+        # 按块顺序返回每块的匹配结果，剩余查询值得并行时交给共享进程池
+        state = None
+        transfer = 0.0
+        done = 0
+        while done < len(chunks):
+            start = time.perf_counter()
+            yield [self.search_companies(query, limit) for query in chunks[done]]
+            per_query = (time.perf_counter() - start) / len(chunks[done])
+            done += 1
+            if workers <= 1 or len(chunks) - done < 2:
+                continue
+            serial = per_query * sum(len(chunk) for chunk in chunks[done:])
+            if not parallel_worthwhile(serial, workers, "company_match", COMPANY_MATCH_STARTUP_SECONDS):
+                continue
+            if state is None:
+                # 公司名列表与索引只序列化一次（注册表快照只传路径与版本），子进程加载的耗时按序列化耗时计
+                start = time.perf_counter()
+                state = pickle.dumps(self._match_state(), protocol=pickle.HIGHEST_PROTOCOL)
+                transfer = 2 * (time.perf_counter() - start)
+            if parallel_worthwhile(serial, workers, "company_match", COMPANY_MATCH_STARTUP_SECONDS, transfer):
+                break
+        if done == len(chunks):
+            return
+        
+        # 状态只写出一次临时文件，子进程按路径加载并缓存，任务只传查询
+        with shared_file(state, ".pkl") as path:
+            results = imap_ordered(_search_chunk_task, ((path, chunk, limit) for chunk in chunks[done:]),
+                                   workers, "company_match")
+            try:
+                yield from results
+            finally:
+                results.close()
+    
+    def _match_state(self):
+        return self.normalize, self.companies, self.normalized_companies, self._match_keys, self._ensure_index()
+    
+    def _search_raw(self, query: str, limit: int) -> List[dict]:
+        """规范化模式下按原始公司名逐个计算编辑距离（索引建立在核心字号上，无法用于过滤）"""
+        # 核心字号为空的查询的下界即各公司名核心字号的长度，已删除的公司名为EXCLUDED_BOUND
+        live = np.flatnonzero(self._ensure_index().lower_bounds("") != EXCLUDED_BOUND).tolist()
+        return self._top_k(query, ((self.companies[i], Levenshtein.distance(query, self.companies[i]))
+                                   for i in live), limit)
+    
+    def _build_index(self):
+        if self.normalize:
+            self.normalized_companies = [normalize_company_name(company) for company in self.companies]
+            self._match_keys = [name.core for name in self.normalized_companies]
+        else:
+            self.normalized_companies = []
+            self._match_keys = self.companies
+        self._index = _NgramIndex(self._match_keys)
+    
+    def _ensure_index(self) -> _NgramIndex:
+        # 公司列表被直接修改过时重建索引
+        if self._index is None or self._index.size != len(self.companies):
+            self._build_index()
+        return self._index
+    
+    @staticmethod
+    def _penalty(query_name: NormalizedName, name: NormalizedName) -> float:
+        """地区、组织形式均存在且不一致时的附加距离"""
+        penalty = 0.0
+        if query_name.region and name.region and query_name.region != name.region:
+            penalty += REGION_WEIGHT
+        if query_name.legal_form and name.legal_form and query_name.legal_form != name.legal_form:
+            penalty += LEGAL_FORM_WEIGHT
+        return penalty
+    
+    def _normalized_result(self, query_key: str, i: int, distance: int, weighted: float) -> dict:
+        core = self._match_keys[i]
+        max_len = max(len(query_key), len(core))
+        score = 1.0 - (weighted / max_len) if max_len else 1.0
+        return {
+            "company_name": self.companies[i],
+            "score": max(score, 0.0),
+            "distance": distance,
+            "weighted_distance": round(weighted, 2),
+            "core_name": core
+        }
+    
+    def _top_k(self, query: str, matches, limit: int) -> List[dict]:
+        """从(公司名, 编辑距离)中选出距离最小的前limit个结果"""
+        # 使用堆（优先队列）来维护距离最小的前limit个结果
+        heap = []  # 最大堆，存储(-distance, company)对
+        
+        for company, distance in matches:
+            # 计算相似度分数
+            max_len = max(len(query), len(company))
+            if max_len == 0:
+                score = 1.0
+            else:
+                score = 1.0 - (distance / max_len)
+            
+            # 使用堆来维护前limit个最小距离的结果
+            if len(heap) < limit:
+                heapq.heappush(heap, (-distance, company, score))
+            else:
+                # 如果当前距离比堆中最大距离小，替换
+                if distance < -heap[0][0]:
+                    heapq.heappushpop(heap, (-distance, company, score))
+        
+        # 从堆中提取结果并排序
+        results = []
+        while heap:
+            neg_distance, company, score = heapq.heappop(heap)
+            results.append({
+                "company_name": company,
+                "score": score,
+                "distance": -neg_distance
+            })
+        
+        # 按距离升序排序（距离最小的在前）
+        results.sort(key=lambda x: x["distance"])
+        
+        return results
+
+
+def _worker_service(path):
+    """子进程内按路径加载（并缓存）父进程写出的公司名列表与索引"""
+    service = _worker_services.get(path)
+    if service is not None:
+        _worker_services.move_to_end(path)
+        return service
+    with open(path, "rb") as f:
+        normalize, companies, normalized_companies, match_keys, index = pickle.load(f)
+    service = CompanyMatchService(normalize)
+    service.companies = companies
+    service.normalized_companies = normalized_companies
+    service._match_keys = match_keys
+    service._index = index
+    _worker_services[path] = service
+    while len(_worker_services) > WORKER_STATE_CACHE_SIZE:
+        _worker_services.popitem(last=False)
+    return service
+
+
+def _search_chunk_task(path, queries, limit):
+    service = _worker_service(path)
+    return [service.search_companies(query, limit) for query in queries]
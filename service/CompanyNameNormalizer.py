@@ -0,0 +1,83 @@
+import re
+import unicodedata
+from typing import NamedTuple
+
+# 省级行政区与常见城市（匹配名称开头或括号中的地区）
+REGIONS = (
+    "北京", "天津", "上海", "重庆", "河北", "山西", "辽宁", "吉林", "黑龙江", "江苏", "浙江", "安徽", "福建", "江西",
+    "山东", "河南", "湖北", "湖南", "广东", "海南", "四川", "贵州", "云南", "陕西", "甘肃", "青海", "台湾",
+    "内蒙古", "广西", "西藏", "宁夏", "新疆", "香港", "澳门",
+    "石家庄", "太原", "沈阳", "长春", "哈尔滨", "南京", "杭州", "合肥", "福州", "南昌", "济南", "郑州", "武汉",
+    "长沙", "广州", "海口", "成都", "贵阳", "昆明", "西安", "兰州", "西宁", "呼和浩特", "南宁", "拉萨", "银川",
+    "乌鲁木齐", "大连", "青岛", "宁波", "厦门", "深圳", "苏州", "无锡", "常州", "南通", "温州", "绍兴", "嘉兴",
+    "金华", "台州", "佛山", "东莞", "珠海", "中山", "惠州", "汕头", "泉州", "烟台", "潍坊", "徐州", "扬州",
+    "洛阳", "唐山", "保定", "包头", "鄂尔多斯", "绵阳", "宜昌", "襄阳", "芜湖", "赣州", "柳州", "遵义",
+)
+
+# 组织形式，按长度从长到短匹配名称结尾
+LEGAL_FORMS = (
+    "合伙企业(有限合伙)", "合伙企业(普通合伙)", "集团股份有限公司", "集团有限责任公司", "集团有限公司",
+    "股份有限公司", "有限责任公司", "(有限合伙)", "(普通合伙)", "有限公司", "股份公司", "合伙企业", "有限合伙",
+    "集团公司", "公司",
+)
+
+_BRACKETS = str.maketrans({"【": "(", "】": ")", "〔": "(", "〕": ")", "［": "(", "］": ")", "｛": "(", "｝": ")",
+                           "[": "(", "]": ")", "{": "(", "}": ")", "〈": "(", "〉": ")", "《": "(", "》": ")"})
+_REGION_PATTERN = "|".join(sorted(REGIONS, key=len, reverse=True))
+# “中国”开头多为字号的一部分（如中国银行），只在括号中作为地区
+_BRACKET_REGION_PATTERN = "中国|" + _REGION_PATTERN
+_REGION_SUFFIX = "(?:省|市|自治区|壮族自治区|回族自治区|维吾尔自治区|特别行政区)?"
+# 开头的地区：省/市，其后可跟一级已知地区或“XX区/XX县”
+_LEADING_REGION = re.compile(rf"^(?P<region>(?:(?:{_REGION_PATTERN}){_REGION_SUFFIX})+)(?:[^\W\d_]{{1,3}}?(?:区|县))?")
+_BRACKET_REGION = re.compile(rf"\(((?:{_BRACKET_REGION_PATTERN}){_REGION_SUFFIX})\)")
+# 分支机构（如“有限公司上海分公司”）的分支部分计入组织形式
+_LEGAL_FORM = re.compile("(?:" + "|".join(re.escape(f) for f in LEGAL_FORMS) + r")(?:[^()]{0,10}?(?:分公司|分行|支行))?$")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class NormalizedName(NamedTuple):
+    """规范化后的公司名：完整规范化形式、地区、核心字号、组织形式"""
+    normalized: str
+    region: str
+    core: str
+    legal_form: str
+
+
+def fold_name(name: str) -> str:
+    """全角转半角、统一括号、去除空白、英文字母转大写"""
+    name = unicodedata.normalize("NFKC", name).translate(_BRACKETS)
+    return _WHITESPACE.sub("", name).upper()
+
+
+def normalize_company_name(name: str) -> NormalizedName:
+    """
+    拆分公司名中的地区、组织形式与核心字号
+    例：“北京市华瑞科技（上海）有限公司” -> 地区“北京市/上海”，核心“华瑞科技”，组织形式“有限公司”
+    地区只在去除后仍有核心字号时去除（如“北京有限公司”的核心为“北京”）；名称只有组织形式时核心为空
+    """
+    normalized = fold_name(name)
+    rest = normalized
+
+    legal_form = ""
+    match = _LEGAL_FORM.search(rest)
+    if match:
+        legal_form = match.group(0)
+        rest = rest[:match.start()]
+
+    # 开头的地区：先尝试连同“XX区/XX县”一起去除，核心为空时只去除省/市
+    regions = []
+    match = _LEADING_REGION.match(rest)
+    if match:
+        for end in (match.end(), match.end("region")):
+            if end < len(rest):
+                regions.append(rest[:end])
+                rest = rest[end:]
+                break
+
+    # 括号中的地区，如“华瑞科技(上海)”
+    stripped = _BRACKET_REGION.sub("", rest)
+    if stripped:
+        regions.extend(_BRACKET_REGION.findall(rest))
+        rest = stripped
+
+    return NormalizedName(normalized, "/".join(regions), rest, legal_form)
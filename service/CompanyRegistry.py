@@ -0,0 +1,492 @@
+import os
+import json
+import mmap
+import hashlib
+import time
+import shutil
+import bisect
+import threading
+import weakref
+from contextlib import ExitStack, contextmanager, nullcontext
+from typing import List, Optional, Iterable
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+import numpy as np
+from dotenv import load_dotenv
+
+from service.CompanyMatchService import _NgramIndex, EXCLUDED_BOUND
+from service.CompanyNameNormalizer import NormalizedName, fold_name, normalize_company_name
+
+load_dotenv()
+
+# 注册表默认目录
+DEFAULT_REGISTRY_PATH = os.path.join(".cache", "company_registry")
+# 增量段数超过该值时自动合并为一个段
+COMPACT_MAX_SEGMENTS = 8
+# 段内保存的规范化字段，各自为一个子目录下的字符串表
+NORMALIZED_FIELDS = ("region", "core", "legal_form")
+
+_CURRENT = "CURRENT"
+# 写操作的跨进程文件锁
+_WRITE_LOCK = "LOCK"
+
+# np.load解析.npy文件头时使用ast，Python 3.11.7及更早版本多线程并发解析会报SystemError，加载快照时串行
+_load_lock = threading.Lock()
+
+# 按注册表目录共享的进程内写锁：页面每次重新运行都会新建CompanyRegistry实例，锁不能属于实例
+_root_locks = {}
+_root_locks_guard = threading.Lock()
+
+
+def _root_lock(root: str) -> threading.Lock:
+    with _root_locks_guard:
+        return _root_locks.setdefault(root, threading.Lock())
+
+
+@contextmanager
+def _file_lock(path: str):
+    """跨进程互斥的文件锁（阻塞等待）"""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            # msvcrt.locking的阻塞模式最多重试10秒后报错，改为自行轮询
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _pin(path: str):
+    """
+    读取方持有某个版本：打开该版本的租约文件并加共享锁，直到关闭文件（进程退出时自动释放）
+    Windows下打开中的文件无法删除，保持打开即可
+    """
+    f = open(path, "a+b")
+    if os.name != "nt":
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+    return f
+
+
+def _lock_unpinned(path: str):
+    """
+    版本无人持有时加排他锁并返回租约文件（删除该版本的文件后关闭），仍被读取方持有时返回None
+    持有排他锁期间新的读取方会等待，拿到锁后发现版本已删除
+    """
+    if os.name == "nt":
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return None
+        return nullcontext()
+    f = open(path, "a+b")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+class _StringTable:
+    """内存映射的字符串表：names.bin为UTF-8拼接的公司名，offsets.npy为各公司名的起止偏移"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "names.bin"), "rb") as f:
+            # 空文件无法映射
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self._data[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @staticmethod
+    def write(directory: str, names: List[str]):
+        encoded = [name.encode("utf-8") for name in names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        with open(os.path.join(directory, "names.bin"), "wb") as f:
+            f.write(b"".join(encoded))
+        np.save(os.path.join(directory, "offsets.npy"), offsets)
+
+
+def _name_hash(name: str) -> int:
+    return int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class _Segment:
+    """
+    不可变的数据段：公司名字符串表 + 规范化字段字符串表 + 匹配字符串的n-gram索引
+    + 按公司名哈希排序的下标（用于精确查找）
+    """
+
+    def __init__(self, directory: str):
+        self.names = _StringTable(directory)
+        self.columns = {"names": self.names}
+        for field in NORMALIZED_FIELDS:
+            # 早期版本写入的段没有规范化字段
+            if os.path.isdir(os.path.join(directory, field)):
+                self.columns[field] = _StringTable(os.path.join(directory, field))
+        self.index = _NgramIndex.load(directory)
+        self.hashes = np.load(os.path.join(directory, "hashes.npy"), mmap_mode="r")
+        self.hash_ids = np.load(os.path.join(directory, "hash_ids.npy"), mmap_mode="r")
+
+    def find(self, name: str) -> List[int]:
+        """公司名在段内的全部下标"""
+        key = _name_hash(name)
+        start = np.searchsorted(self.hashes, key, side="left")
+        end = np.searchsorted(self.hashes, key, side="right")
+        return [i for i in self.hash_ids[start:end].tolist() if self.names[i] == name]
+
+    @staticmethod
+    def write(directory: str, names: List[str], normalize: bool):
+        """
+        :param normalize: 为True时索引核心字号，否则索引原始公司名
+        """
+        tmp = directory + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        _StringTable.write(tmp, names)
+        normalized = [normalize_company_name(name) for name in names]
+        for field in NORMALIZED_FIELDS:
+            os.makedirs(os.path.join(tmp, field))
+            _StringTable.write(os.path.join(tmp, field), [getattr(name, field) for name in normalized])
+        _NgramIndex([name.core for name in normalized] if normalize else names).save(tmp)
+        hashes = np.fromiter((_name_hash(name) for name in names), dtype=np.int64, count=len(names))
+        order = np.argsort(hashes, kind="stable")
+        np.save(os.path.join(tmp, "hashes.npy"), hashes[order])
+        np.save(os.path.join(tmp, "hash_ids.npy"), order.astype(np.int32))
+        os.replace(tmp, directory)
+
+
+class _SnapshotNames:
+    """快照中所有段的某一列（公司名或规范化字段，按段顺序拼接，已删除的公司名仍占位）"""
+
+    def __init__(self, snapshot: "RegistrySnapshot", column: str = "names"):
+        self._snapshot = snapshot
+        self._column = column
+
+    def __len__(self):
+        return self._snapshot.starts[-1]
+
+    def __getitem__(self, i):
+        seg = bisect.bisect_right(self._snapshot.starts, i) - 1
+        return self._snapshot.segments[seg].columns[self._column][i - self._snapshot.starts[seg]]
+
+    def __iter__(self):
+        for segment in self._snapshot.segments:
+            yield from segment.columns[self._column]
+
+    def __reduce__(self):
+        # 传给子进程时只传路径与版本，由子进程自行映射文件
+        return _load_snapshot_part, (self._snapshot.root, self._snapshot.version, self._column)
+
+
+class _SnapshotNormalizedNames:
+    """快照中所有公司名的规范化结果"""
+
+    def __init__(self, snapshot: "RegistrySnapshot"):
+        self._snapshot = snapshot
+
+    def __len__(self):
+        return self._snapshot.starts[-1]
+
+    def __getitem__(self, i):
+        seg = bisect.bisect_right(self._snapshot.starts, i) - 1
+        columns = self._snapshot.segments[seg].columns
+        i -= self._snapshot.starts[seg]
+        if "core" not in columns:
+            return normalize_company_name(columns["names"][i])
+        return NormalizedName(fold_name(columns["names"][i]), columns["region"][i], columns["core"][i],
+                              columns["legal_form"][i])
+
+    def __reduce__(self):
+        return _load_snapshot_part, (self._snapshot.root, self._snapshot.version, "normalized")
+
+
+class _SnapshotIndex:
+    """快照中所有段索引的组合，已删除公司名的下界为EXCLUDED_BOUND"""
+
+    def __init__(self, snapshot: "RegistrySnapshot"):
+        self._snapshot = snapshot
+        self.size = snapshot.starts[-1]
+
+    def lower_bounds(self, query: str) -> np.ndarray:
+        segments = self._snapshot.segments
+        if not segments:
+            return np.empty(0, dtype=np.int32)
+        bounds = np.concatenate([segment.index.lower_bounds(query) for segment in segments]).astype(np.int32)
+        bounds[self._snapshot.deleted] = EXCLUDED_BOUND
+        return bounds
+
+    def __reduce__(self):
+        return _load_snapshot_part, (self._snapshot.root, self._snapshot.version, "index")
+
+
+class RegistrySnapshot:
+    """注册表的某个版本，只读；同一版本的文件不会再被修改"""
+
+    def __init__(self, root: str, version: int, manifest: dict):
+        self.root = root
+        self.version = version
+        self.segment_ids = [segment["id"] for segment in manifest["segments"]]
+        self.segments = [_Segment(os.path.join(root, "segments", sid)) for sid in self.segment_ids]
+        self.starts = [0]
+        for segment in self.segments:
+            self.starts.append(self.starts[-1] + len(segment.names))
+        deleted = manifest.get("deleted")
+        self.deleted = np.load(os.path.join(root, deleted)) if deleted else np.empty(0, dtype=np.int64)
+        # 索引建立在核心字号（规范化）还是原始公司名上
+        self.normalize = manifest.get("normalize", False)
+        self.companies = _SnapshotNames(self)
+        self.normalized_companies = _SnapshotNormalizedNames(self)
+        self.keys = _SnapshotNames(self, "core") if self.normalize else self.companies
+        self.index = _SnapshotIndex(self)
+
+    @property
+    def count(self) -> int:
+        """有效公司名数量"""
+        return self.starts[-1] - len(self.deleted)
+
+    def live_names(self) -> Iterable[str]:
+        deleted = set(self.deleted.tolist())
+        for i, name in enumerate(self.companies):
+            if i not in deleted:
+                yield name
+
+
+_snapshot_cache = {}
+
+
+def _load_snapshot_part(root, version, part):
+    key = (root, version)
+    snapshot = _snapshot_cache.get(key)
+    if snapshot is None:
+        snapshot = _snapshot_cache[key] = CompanyRegistry(root).load(version)
+    if part == "names":
+        return snapshot.companies
+    if part == "normalized":
+        return snapshot.normalized_companies
+    if part == "index":
+        return snapshot.index
+    return _SnapshotNames(snapshot, part)
+
+
+class CompanyRegistry:
+    """
+    持久化的公司名注册表
+    数据由若干不可变的段组成，新增公司名写入新段，删除记录为墓碑，均无需重建已有索引；
+    每次修改生成新版本清单，最后原子替换CURRENT指针，读取方只会看到完整的版本
+    写操作在进程内（按目录）与进程间（LOCK文件锁）互斥；加载的版本持有租约，清理旧版本时跳过仍在使用的版本
+    """
+
+    def __init__(self, path: str = None, keep_versions: int = None, normalize: bool = None):
+        """
+        :param path: 注册表目录，默认读取COMPANY_REGISTRY_PATH环境变量
+        :param keep_versions: 保留的历史版本数，默认读取COMPANY_REGISTRY_KEEP_VERSIONS环境变量（3）
+        :param normalize: 新建/替换/合并时索引核心字号还是原始公司名，默认读取COMPANY_MATCH_NORMALIZE环境变量（1）；
+                          追加时沿用当前版本的设置
+        """
+        self.root = os.path.abspath(path or os.getenv("COMPANY_REGISTRY_PATH", DEFAULT_REGISTRY_PATH))
+        self.keep_versions = keep_versions or int(os.getenv("COMPANY_REGISTRY_KEEP_VERSIONS", 3))
+        if normalize is None:
+            normalize = os.getenv("COMPANY_MATCH_NORMALIZE", "1") == "1"
+        self.normalize = normalize
+        os.makedirs(os.path.join(self.root, "segments"), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "versions"), exist_ok=True)
+
+    def current_version(self) -> int:
+        """当前版本号，尚未写入任何数据时为0"""
+        try:
+            with open(os.path.join(self.root, _CURRENT), encoding="utf-8") as f:
+                return int(f.read().strip())
+        except FileNotFoundError:
+            return 0
+
+    def load(self, version: int = None) -> RegistrySnapshot:
+        """
+        加载指定版本（默认当前版本），文件以内存映射方式打开
+        快照存活期间持有该版本的租约，其文件不会被清理
+        """
+        while True:
+            target = self.current_version() if version is None else version
+            lease = _pin(self._lease_path(target)) if target else None
+            try:
+                with _load_lock:
+                    snapshot = RegistrySnapshot(self.root, target, self._read_manifest(target))
+            except FileNotFoundError:
+                if lease:
+                    lease.close()
+                # 读取CURRENT之后该版本已被后续写入清理，重新读取当前版本
+                if version is None and self.current_version() != target:
+                    continue
+                raise
+            except BaseException:
+                if lease:
+                    lease.close()
+                raise
+            if lease:
+                weakref.finalize(snapshot, lease.close)
+            return snapshot
+
+    def replace(self, names: Iterable[str]) -> int:
+        """用新名单替换全部数据，返回新版本号"""
+        names = _clean(names)
+        with self._writing():
+            version = self.current_version() + 1
+            segments = [self._write_segment(version, names, self.normalize)] if names else []
+            return self._publish(version, segments, None, self.normalize)
+
+    def add(self, names: Iterable[str]) -> int:
+        """追加公司名（写入新段，不重建已有段），返回新版本号"""
+        names = _clean(names)
+        with self._writing():
+            current = self.current_version()
+            manifest = self._read_manifest(current)
+            if not names:
+                return current
+            version = current + 1
+            # 同一版本的各段索引方式必须一致
+            normalize = manifest.get("normalize", False) if manifest["segments"] else self.normalize
+            segments = manifest["segments"] + [self._write_segment(version, names, normalize)]
+            version = self._publish(version, segments, manifest.get("deleted"), normalize)
+        if len(segments) > COMPACT_MAX_SEGMENTS:
+            version = self.compact()
+        return version
+
+    def remove(self, names: Iterable[str]) -> int:
+        """删除公司名（同名的全部删除，记录为墓碑），返回新版本号"""
+        names = set(_clean(names))
+        with self._writing():
+            snapshot = self.load()
+            if not names:
+                return snapshot.version
+            deleted = set(snapshot.deleted.tolist())
+            for name in names:
+                for start, segment in zip(snapshot.starts, snapshot.segments):
+                    deleted.update(start + i for i in segment.find(name))
+            if len(deleted) == len(snapshot.deleted):
+                return snapshot.version
+            version = snapshot.version + 1
+            tombstones = os.path.join("versions", f"{version:06d}.deleted.npy")
+            np.save(os.path.join(self.root, tombstones), np.array(sorted(deleted), dtype=np.int64))
+            return self._publish(version, self._read_manifest(snapshot.version)["segments"], tombstones,
+                                 snapshot.normalize)
+
+    def compact(self) -> int:
+        """将所有段与墓碑合并为一个段，返回新版本号"""
+        with self._writing():
+            snapshot = self.load()
+            names = list(snapshot.live_names())
+            version = snapshot.version + 1
+            segments = [self._write_segment(version, names, self.normalize)] if names else []
+            return self._publish(version, segments, None, self.normalize)
+
+    @contextmanager
+    def _writing(self):
+        """读取当前版本→写入段→发布新版本的整个过程在同一目录的所有实例、所有进程间互斥"""
+        with _root_lock(self.root), _file_lock(os.path.join(self.root, _WRITE_LOCK)):
+            yield
+
+    def _lease_path(self, version: int) -> str:
+        return os.path.join(self.root, "versions", f"{version:06d}.lease")
+
+    def _write_segment(self, version: int, names: List[str], normalize: bool) -> dict:
+        segment_id = f"{version:06d}"
+        _Segment.write(os.path.join(self.root, "segments", segment_id), names, normalize)
+        return {"id": segment_id, "count": len(names)}
+
+    def _read_manifest(self, version: int) -> dict:
+        if version == 0:
+            return {"version": 0, "segments": [], "deleted": None}
+        with open(os.path.join(self.root, "versions", f"{version:06d}.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _publish(self, version: int, segments: List[dict], deleted: Optional[str], normalize: bool) -> int:
+        manifest = {"version": version, "segments": segments, "deleted": deleted, "normalize": normalize,
+                    "created_at": int(time.time())}
+        manifest_path = os.path.join(self.root, "versions", f"{version:06d}.json")
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        current_path = os.path.join(self.root, _CURRENT)
+        with open(current_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(str(version))
+        os.replace(current_path + ".tmp", current_path)
+
+        self._collect_garbage(version)
+        return version
+
+    def _collect_garbage(self, version: int):
+        """
+        删除超出保留数量的旧版本及不再被引用的段（在写锁内调用）
+        仍被读取方持有租约的旧版本（如正在批量匹配的快照）连同其引用的段一并保留，待下次写入时再清理
+        """
+        versions_dir = os.path.join(self.root, "versions")
+        keep = set(range(max(1, version - self.keep_versions + 1), version + 1))
+        existing = set()
+        for file_name in os.listdir(versions_dir):
+            prefix = file_name.split(".")[0]
+            if prefix.isdigit():
+                existing.add(int(prefix))
+        with ExitStack() as retired:
+            for v in sorted(existing - keep):
+                lease = _lock_unpinned(self._lease_path(v))
+                if lease is None:
+                    keep.add(v)
+                else:
+                    retired.enter_context(lease)
+
+            referenced = set()
+            tombstones = set()
+            for v in keep:
+                try:
+                    manifest = self._read_manifest(v)
+                except FileNotFoundError:
+                    continue
+                referenced.update(segment["id"] for segment in manifest["segments"])
+                if manifest.get("deleted"):
+                    # 墓碑文件会被之后的版本沿用
+                    tombstones.add(os.path.basename(manifest["deleted"]))
+            for file_name in os.listdir(versions_dir):
+                prefix = file_name.split(".")[0]
+                if prefix.isdigit() and int(prefix) not in keep and file_name not in tombstones:
+                    try:
+                        os.remove(os.path.join(versions_dir, file_name))
+                    except OSError:
+                        pass
+            segments_dir = os.path.join(self.root, "segments")
+            for segment_id in os.listdir(segments_dir):
+                if segment_id not in referenced:
+                    shutil.rmtree(os.path.join(segments_dir, segment_id), ignore_errors=True)
+
+
+def _clean(names: Iterable[str]) -> List[str]:
+    return [name.strip() for name in names if name and name.strip()]
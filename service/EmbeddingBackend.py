@@ -0,0 +1,146 @@
+import os
+import threading
+from typing import List
+
+import numpy as np
+
+# 文本最大token长度
+MAX_SEQ_LENGTH = 512
+
+
+def _mean_pool(last_hidden_state: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """按attention mask对最后一层隐藏状态求平均，padding位置不参与计算"""
+    mask = attention_mask[..., None].astype(last_hidden_state.dtype)
+    summed = (last_hidden_state * mask).sum(axis=1)
+    counts = np.clip(mask.sum(axis=1), 1e-9, None)
+    return summed / counts
+
+
+class TorchEmbeddingBackend:
+    """PyTorch推理（transformers AutoModel，fp32）"""
+
+    name = "torch"
+
+    def __init__(self, model_path: str, num_threads: int = None):
+        import torch
+        from transformers import AutoTokenizer, AutoModel
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
+        self.model = AutoModel.from_pretrained(model_path, trust_remote_code=True)
+        # 设置为评估模式
+        self.model.eval()
+        # 后端在进程内共享，tokenizer不支持并发调用
+        self._lock = threading.Lock()
+
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        import torch
+
+        with self._lock, torch.no_grad():
+            inputs = self.tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=MAX_SEQ_LENGTH)
+            outputs = self.model(**inputs)
+        return _mean_pool(outputs.last_hidden_state.numpy(), inputs["attention_mask"].numpy())
+
+
+class OnnxEmbeddingBackend:
+    """
+    ONNX Runtime推理：优先加载已导出的ONNX模型，不存在时从PyTorch模型导出（需要torch）；
+    可选动态int8量化
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, onnx_path: str = None, quantize: bool = False, num_threads: int = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
+        onnx_path = onnx_path or os.path.join(model_path, "model.onnx")
+        if not os.path.exists(onnx_path):
+            export_onnx(model_path, onnx_path)
+        if quantize:
+            onnx_path = quantize_onnx(onnx_path)
+            # 量化后的向量与fp32不同，使用不同名称以区分嵌入缓存
+            self.name = "onnx-int8"
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        # 后端在进程内共享，tokenizer不支持并发调用（InferenceSession.run本身线程安全）
+        self._lock = threading.Lock()
+        print(f"ONNX嵌入模型加载成功: {onnx_path}")
+
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            inputs = self.tokenizer(texts, return_tensors="np", padding=True, truncation=True, max_length=MAX_SEQ_LENGTH)
+        feeds = {name: inputs[name].astype(np.int64) for name in self.input_names}
+        last_hidden_state = self.session.run(None, feeds)[0]
+        return _mean_pool(last_hidden_state, inputs["attention_mask"])
+
+
+def export_onnx(model_path: str, onnx_path: str) -> str:
+    """将PyTorch嵌入模型导出为ONNX（batch与序列长度为动态维度）"""
+    import torch
+    from transformers import AutoTokenizer, AutoModel
+
+    print(f"正在导出ONNX模型: {onnx_path}")
+    tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
+    model = AutoModel.from_pretrained(model_path, trust_remote_code=True)
+    model.eval()
+    dummy = tokenizer(["嵌入模型导出示例文本"], return_tensors="pt")
+    input_names = list(dummy.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(model, (dict(dummy),), onnx_path,
+                          input_names=input_names,
+                          output_names=["last_hidden_state"],
+                          dynamic_axes=dynamic_axes,
+                          opset_version=14)
+    return onnx_path
+
+
+def quantize_onnx(onnx_path: str) -> str:
+    """对ONNX模型做动态int8量化，结果缓存在同目录下"""
+    root, ext = os.path.splitext(onnx_path)
+    quant_path = f"{root}.int8{ext}"
+    if not os.path.exists(quant_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        print(f"正在量化ONNX模型: {quant_path}")
+        quantize_dynamic(onnx_path, quant_path, weight_type=QuantType.QInt8)
+    return quant_path
+
+
+def create_embedding_backend(model_path: str, backend: str = None):
+    """
+    按配置创建嵌入推理后端
+    :param model_path: 嵌入模型目录
+    :param backend: torch 或 onnx，默认取EMBEDDING_BACKEND环境变量（torch）
+    """
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "torch")).lower()
+    num_threads = int(os.getenv("EMBEDDING_NUM_THREADS", 0)) or None
+    if backend == "torch":
+        return TorchEmbeddingBackend(model_path, num_threads=num_threads)
+    if backend == "onnx":
+        return OnnxEmbeddingBackend(model_path,
+                                    onnx_path=os.getenv("EMBEDDING_ONNX_PATH"),
+                                    quantize=os.getenv("EMBEDDING_ONNX_QUANTIZE", "0") == "1",
+                                    num_threads=num_threads)
+    raise ValueError(f"不支持的嵌入推理后端: {backend}")
+
+
+def cosine_parity(reference, candidate, texts: List[str]) -> float:
+    """
+    比较两个后端对同一批文本的编码结果
+    :return: 各文本向量余弦相似度的最小值，越接近1说明两个后端越一致
+    """
+    a = reference.encode_batch(texts)
+    b = candidate.encode_batch(texts)
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float((a * b).sum(axis=1).min())
@@ -0,0 +1,246 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+import numpy as np
+
+# 缓存文件默认位置
+DEFAULT_CACHE_PATH = os.path.join(".cache", "embedding_cache.sqlite3")
+
+_WHITESPACE = re.compile(r"\s+")
+
+# 内存层每条记录除向量本身外的大致开销（字节）：sha256十六进制键、OrderedDict节点与ndarray对象头
+MEMORY_ENTRY_OVERHEAD = 320
+
+# 磁盘层超出容量上限时，淘汰到上限的这一比例，避免写满后每次写入都触发淘汰
+DISK_EVICT_TARGET = 0.9
+
+
+def normalize_text(text: str) -> str:
+    """缓存键使用的文本规范化：Unicode NFC、去除首尾空白、连续空白合并为一个空格"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(text: str) -> str:
+    """规范化文本的sha256摘要"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    按内容寻址的嵌入向量缓存：内存LRU + SQLite磁盘两级
+    同一模型（路径、维度、推理后端）下相同文本只编码一次，重复上传的文档与重复提问直接命中缓存
+    向量以只读的float32数组缓存和返回，两级缓存都按字节数限制容量
+    """
+
+    def __init__(self, namespace: str, dim: int, memory_bytes: int = 64 * 1024 * 1024,
+                 db_path: Optional[str] = DEFAULT_CACHE_PATH, max_disk_bytes: int = 1024 * 1024 * 1024):
+        """
+        :param namespace: 缓存命名空间，区分不同模型
+        :param dim: 向量维度，维度不符的向量不会写入缓存
+        :param memory_bytes: 内存LRU的容量上限（字节），0表示不使用内存层
+        :param db_path: SQLite文件路径，为空时不使用磁盘层
+        :param max_disk_bytes: 磁盘层向量数据的总大小上限（字节，同一文件内所有命名空间合计），超出时按最近使用时间淘汰
+        """
+        self.namespace = namespace
+        self.dim = dim
+        self.memory_bytes = memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        # 磁盘层向量总大小的估计值，首次写入时统计，超出上限时重新统计（其他进程也可能写入同一文件）
+        self._disk_used = None
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (namespace, key)
+                )""")
+            # 旧版本的缓存文件没有size列，补上并回填
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(embeddings)")]
+            if "size" not in columns:
+                self._db.execute("ALTER TABLE embeddings ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                self._db.execute("UPDATE embeddings SET size = LENGTH(vector)")
+            # 按容量淘汰在整个文件范围内按最近使用时间进行，索引同时覆盖size，统计总大小时不必读取向量数据
+            self._db.execute("DROP INDEX IF EXISTS idx_embeddings_last_used")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_lru ON embeddings (last_used, size)")
+            self._db.commit()
+
+    def get_many(self, texts: List[str]) -> Dict[int, np.ndarray]:
+        """
+        查询缓存
+        :param texts: 文本列表
+        :return: {文本下标: 向量}，只包含命中的文本；向量为只读的float32数组，与缓存共享内存，不要原地修改
+        """
+        keys = [text_key(text) for text in texts]
+        found = {}
+        with self._lock:
+            missing = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            if missing and self._db is not None:
+                for key, vector in self._load(list(missing)).items():
+                    self._remember(key, vector)
+                    for i in missing.pop(key):
+                        found[i] = vector
+                        self.disk_hits += 1
+
+            self.misses += sum(len(ids) for ids in missing.values())
+        return found
+
+    def put_many(self, texts: List[str], vectors):
+        """写入缓存（向量可以是数组、数组的行或浮点数列表）"""
+        entries = {text_key(text): _frozen(vector) for text, vector in zip(texts, vectors) if len(vector) == self.dim}
+        if not entries:
+            return
+        with self._lock:
+            for key, vector in entries.items():
+                self._remember(key, vector)
+            if self._db is not None:
+                now = time.time()
+                rows = [(self.namespace, key, vector.tobytes(), now, vector.nbytes) for key, vector in entries.items()]
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (namespace, key, vector, last_used, size) VALUES (?, ?, ?, ?, ?)",
+                    rows)
+                self._evict(sum(row[4] for row in rows))
+                self._db.commit()
+
+    def stats(self) -> Dict:
+        """命中统计"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            disk_entries = 0
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM embeddings WHERE namespace = ?",
+                                                (self.namespace,)).fetchone()[0]
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "disk_entries": disk_entries,
+            }
+
+    def clear(self):
+        """清空当前命名空间的缓存"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings WHERE namespace = ?", (self.namespace,))
+                self._db.commit()
+                self._disk_used = None
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key, vector: np.ndarray):
+        size = vector.nbytes + MEMORY_ENTRY_OVERHEAD
+        if size > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_used -= previous.nbytes + MEMORY_ENTRY_OVERHEAD
+        self._memory[key] = vector
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= evicted.nbytes + MEMORY_ENTRY_OVERHEAD
+
+    def _load(self, keys) -> Dict[str, np.ndarray]:
+        vectors = {}
+        # SQLite单条语句的参数个数有限，分批查询
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(
+                f"SELECT key, vector FROM embeddings WHERE namespace = ? AND key IN ({placeholders})",
+                [self.namespace, *batch]).fetchall()
+            for key, blob in rows:
+                # frombuffer得到的数组只读，并直接引用查询结果的bytes，不再复制
+                vector = np.frombuffer(blob, dtype=np.float32)
+                if vector.size == self.dim:
+                    vectors[key] = vector
+        if vectors:
+            now = time.time()
+            self._db.executemany("UPDATE embeddings SET last_used = ? WHERE namespace = ? AND key = ?",
+                                 [(now, self.namespace, key) for key in vectors])
+            self._db.commit()
+        return vectors
+
+    def _evict(self, written: int):
+        """
+        磁盘层总大小超出上限时，按最近使用时间从旧到新删除，直到降到上限的DISK_EVICT_TARGET
+        :param written: 本次写入的向量字节数，用于更新总大小的估计值
+        """
+        if self._disk_used is not None:
+            self._disk_used += written
+            if self._disk_used <= self.max_disk_bytes:
+                return
+        self._disk_used = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        overflow = self._disk_used - int(self.max_disk_bytes * DISK_EVICT_TARGET)
+        if self._disk_used <= self.max_disk_bytes or overflow <= 0:
+            return
+        # 按last_used累加size，删除累计值（不含本行）尚未达到overflow的行
+        self._db.execute("""
+            DELETE FROM embeddings WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, size, SUM(size) OVER (ORDER BY last_used ROWS UNBOUNDED PRECEDING) AS running
+                    FROM embeddings
+                ) WHERE running - size < ?
+            )""", (overflow,))
+        self._disk_used = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+
+def _frozen(vector) -> np.ndarray:
+    """转换为独立（不引用批量结果的其余部分）、只读的float32数组"""
+    vector = np.array(vector, dtype=np.float32)
+    vector.flags.writeable = False
+    return vector
+
+
+def create_embedding_cache(model_path: str, dim: int, backend_name: str) -> Optional[EmbeddingCache]:
+    """
+    按环境变量创建嵌入缓存
+    EMBEDDING_CACHE=0 关闭缓存；EMBEDDING_CACHE_PATH 为空字符串时只使用内存层
+    EMBEDDING_CACHE_MEMORY_MB 内存层容量（MB，默认64），EMBEDDING_CACHE_MAX_MB 磁盘层容量（MB，默认1024）
+    """
+    if os.getenv("EMBEDDING_CACHE", "1") != "1":
+        return None
+    namespace = f"{os.path.abspath(model_path)}|{dim}|{backend_name}"
+    return EmbeddingCache(namespace, dim,
+                          memory_bytes=int(float(os.getenv("EMBEDDING_CACHE_MEMORY_MB", 64)) * 1024 * 1024),
+                          db_path=os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH),
+                          max_disk_bytes=int(float(os.getenv("EMBEDDING_CACHE_MAX_MB", 1024)) * 1024 * 1024))
@@ -1,8 +1,18 @@
+import os
+import time
+from functools import lru_cache
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
 import PIL.Image
 import cv2
+import fitz
 import numpy as np
 from PIL import Image
 
+from service.PdfService import PARALLEL_MIN_PAGES, PDF_ZOOM
+from service.WorkerPool import imap_ordered, parallel_worthwhile, shared_file
+from workers.pdf_render import open_document, render_page
+
 
 def toRGB(image):
     new_image = image.copy()
@@ -83,6 +93,298 @@ def resize_image_if_large(
     # 应用缩放
     return img.resize((new_width, new_height), resample=resample)
 
+# 印章红色的HSV取值范围（色相跨越0度，分为两段）
+RED_HSV_RANGES = ((np.array([0, 43, 46]), np.array([10, 255, 255])),
+                  (np.array([156, 43, 46]), np.array([180, 255, 255])))
+# 定位前图像宽度上限、四周扩充宽度、每页最多提取的印章数、印章裁剪图边长
+SEAL_MAX_WIDTH = 1024
+SEAL_PADDING = 50
+MAX_SEALS = 4
+SEAL_SIZE = 300
+# 形态学结构元素只创建一次：3x3去噪，100x100闭运算把印章的环形文字连成整块
+OPEN_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+CLOSE_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (100, 100))
+# 由粗到精定位：先在缩小SEAL_COARSE_SCALE倍的掩码上用等比缩小的核找出候选区域，
+# 再只在候选区域内做全分辨率闭运算；为1时整幅做闭运算。候选区域总面积超过整幅的该比例时也整幅处理
+SEAL_COARSE_SCALE = int(os.getenv("SEAL_COARSE_SCALE", 4))
+SEAL_COARSE_MAX_AREA = float(os.getenv("SEAL_COARSE_MAX_AREA", 0.6))
+# 子进程首次运行印章任务时导入service包的耗时估计（见benchmarks/bench_seal_batch.py）
+SEAL_WORKER_STARTUP_SECONDS = float(os.getenv("SEAL_WORKER_STARTUP_SECONDS", 1.0))
+
+
+class SealCrop(NamedTuple):
+    """单个印章：bbox为(x, y, 宽, 高)，图片输入时为原图像素坐标，PDF输入时为页面坐标（pt）；image为SEAL_SIZE见方的裁剪图"""
+    bbox: Tuple[float, float, float, float]
+    image: Image.Image
+
+
+class SealPage(NamedTuple):
+    """一张图片（或PDF一页）的提取结果，seals按外接矩形面积从大到小排列；overlay为标出轮廓的整页图，未要求时为None"""
+    page: int
+    seals: List[SealCrop]
+    overlay: Optional[Image.Image]
+
+
+def red_seal_layer(image):
+    """
+    印章图层：两段红色色相范围合并为一张掩码，红色像素保留原图，其余置为透明白色
+    :param image: BGR格式的numpy数组
+    :return: 与image同尺寸的4通道数组
+    """
+    img_png = cv2.cvtColor(image, cv2.COLOR_RGB2RGBA)
+    hue_image = cv2.cvtColor(img_png, cv2.COLOR_BGR2HSV)
+    red_mask = cv2.inRange(hue_image, RED_HSV_RANGES[0][0], RED_HSV_RANGES[0][1])
+    cv2.bitwise_or(red_mask, cv2.inRange(hue_image, RED_HSV_RANGES[1][0], RED_HSV_RANGES[1][1]), dst=red_mask)
+    img_real = np.empty_like(img_png)
+    img_real[:] = (255, 255, 255, 0)
+    cv2.copyTo(img_png, red_mask, img_real)
+    return img_real
+
+
+def _locate_seals(image, max_seals):
+    # 返回(缩放后的图像, 四周扩充后的图像, 面积最大的若干轮廓, 全部轮廓)
+    img_w = SEAL_MAX_WIDTH if image.shape[1] > SEAL_MAX_WIDTH else image.shape[1]
+    image = cv2.resize(image, (img_w, int(img_w * image.shape[0] / image.shape[1])),
+                       interpolation=cv2.INTER_AREA if img_w > SEAL_MAX_WIDTH else cv2.INTER_CUBIC)
+    img_real = red_seal_layer(image)
+
+    # 扩充图片防止截取部分
+    pad = SEAL_PADDING
+    img4png = cv2.copyMakeBorder(img_real, pad, pad, pad, pad, cv2.BORDER_CONSTANT, value=[255, 255, 255, 0])
+    img5png = cv2.copyMakeBorder(image, pad, pad, pad, pad, cv2.BORDER_CONSTANT, value=[255, 255, 255, 0])
+    img2gray = cv2.cvtColor(img4png, cv2.COLOR_RGBA2GRAY)
+    retval, gray_first = cv2.threshold(img2gray, 253, 255, cv2.THRESH_BINARY_INV)
+
+    # 形态学去噪，cv2.MORPH_OPEN先腐蚀再膨胀，cv2.MORPH_CLOSE先膨胀再腐蚀
+    img_real = cv2.morphologyEx(gray_first, cv2.MORPH_OPEN, OPEN_KERNEL, iterations=1)
+    img_real = close_seal_mask(img_real)
+
+    c_canny_img = cv2.Canny(img_real, 10, 10)
+
+    contours, hierarchy = cv2.findContours(c_canny_img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    areas = []
+    for i, cnt in enumerate(contours):
+        x, y, w, h = cv2.boundingRect(cnt)
+        areas.append([w * h, i])
+    areas = sorted(areas, reverse=True)
+    return image, img5png, [contours[i] for _, i in areas[:max_seals]], contours
+
+
+@lru_cache(maxsize=8)
+def _coarse_kernel(scale):
+    # 偶数尺寸的核锚点不在中心，闭运算可能丢掉前景，取奇数
+    size = max(3, CLOSE_KERNEL.shape[0] // scale | 1)
+    return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+
+
+def _group_rects(rects, gap):
+    # 间距小于gap的矩形(x0, y0, x1, y1)归为一组（并查集），返回[(组外接矩形, 组内矩形列表)]
+    parent = list(range(len(rects)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, a in enumerate(rects):
+        for j in range(i + 1, len(rects)):
+            b = rects[j]
+            if a[0] - gap < b[2] and b[0] - gap < a[2] and a[1] - gap < b[3] and b[1] - gap < a[3]:
+                parent[find(i)] = find(j)
+    groups = {}
+    for i, rect in enumerate(rects):
+        groups.setdefault(find(i), []).append(rect)
+    return [((min(r[0] for r in members), min(r[1] for r in members),
+              max(r[2] for r in members), max(r[3] for r in members)), members) for members in groups.values()]
+
+
+def close_seal_mask(mask, coarse_scale=None):
+    """
+    印章掩码的闭运算（CLOSE_KERNEL），结果与整幅cv2.morphologyEx(mask, MORPH_CLOSE, CLOSE_KERNEL)逐像素一致
+    由粗到精：缩小的掩码（缩小像素对应的原像素中有前景即为前景）经等比缩小的核闭运算得到候选区域，
+    其外接矩形覆盖全部前景；间距不足两倍核半径的区域归为一组。不同组的膨胀结果互不相交，闭运算互不影响，
+    因此每组只需在外扩两倍核半径的范围内（只保留本组前景）做全分辨率闭运算，拼起来即为整幅结果
+    :param mask: 二值掩码（0/255）
+    :param coarse_scale: 缩小倍数，默认SEAL_COARSE_SCALE，为1时直接整幅计算
+    """
+    if coarse_scale is None:
+        coarse_scale = SEAL_COARSE_SCALE
+    height, width = mask.shape
+    if coarse_scale <= 1 or min(height, width) < coarse_scale * 8:
+        return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, CLOSE_KERNEL, iterations=1)
+
+    # 补齐到缩小倍数的整数倍，INTER_AREA按整块取平均，块内有一个前景像素结果即大于0
+    padded = cv2.copyMakeBorder(mask, 0, -height % coarse_scale, 0, -width % coarse_scale, cv2.BORDER_CONSTANT, value=0)
+    coarse = cv2.resize(padded, (padded.shape[1] // coarse_scale, padded.shape[0] // coarse_scale),
+                        interpolation=cv2.INTER_AREA)
+    cv2.threshold(coarse, 0, 255, cv2.THRESH_BINARY, dst=coarse)
+    # 候选区域必须覆盖全部前景，闭运算后再并上缩小的掩码
+    cv2.bitwise_or(coarse, cv2.morphologyEx(coarse, cv2.MORPH_CLOSE, _coarse_kernel(coarse_scale)), dst=coarse)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(coarse, connectivity=8)
+    rects = [(x * coarse_scale, y * coarse_scale, min(width, (x + w) * coarse_scale), min(height, (y + h) * coarse_scale))
+             for x, y, w, h, _ in stats[1:count]]
+
+    radius = max(CLOSE_KERNEL.shape) // 2 + 1
+    regions = []
+    for (x0, y0, x1, y1), members in _group_rects(rects, 2 * radius):
+        region = (max(0, x0 - 2 * radius), max(0, y0 - 2 * radius),
+                  min(width, x1 + 2 * radius), min(height, y1 + 2 * radius))
+        regions.append((region, members))
+    if sum((x1 - x0) * (y1 - y0) for (x0, y0, x1, y1), _ in regions) > SEAL_COARSE_MAX_AREA * width * height:
+        return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, CLOSE_KERNEL, iterations=1)
+
+    closed = np.zeros_like(mask)
+    for (x0, y0, x1, y1), members in regions:
+        roi = np.zeros((y1 - y0, x1 - x0), np.uint8)
+        for mx0, my0, mx1, my1 in members:
+            roi[my0 - y0:my1 - y0, mx0 - x0:mx1 - x0] = mask[my0:my1, mx0:mx1]
+        cv2.morphologyEx(roi, cv2.MORPH_CLOSE, CLOSE_KERNEL, dst=roi, iterations=1)
+        target = closed[y0:y1, x0:x1]
+        cv2.bitwise_or(target, roi, dst=target)
+    return closed
+
+
+def _crop_seal(padded, cnt):
+    # 外接矩形四周各扩10像素后补成正方形，缩放到SEAL_SIZE；返回(扩充前图像中的矩形, 裁剪图)
+    x, y, w, h = cv2.boundingRect(cnt)
+    x = max(0, x - 10)
+    y = max(0, y - 10)
+    w = w + 20
+    h = h + 20
+    temp = padded[y:(y + h), x:(x + w)]
+    if temp.shape[0] < temp.shape[1]:
+        zh = int((temp.shape[1] - temp.shape[0]) / 2)
+        temp = cv2.copyMakeBorder(temp, zh, zh, 0, 0, cv2.BORDER_CONSTANT, value=[255, 255, 255, 0])
+    else:
+        zh = int((temp.shape[0] - temp.shape[1]) / 2)
+        temp = cv2.copyMakeBorder(temp, 0, 0, zh, zh, cv2.BORDER_CONSTANT, value=[255, 255, 255, 0])
+    dst = cv2.resize(temp, (SEAL_SIZE, SEAL_SIZE),
+                     interpolation=cv2.INTER_AREA if x > SEAL_SIZE or y > SEAL_SIZE else cv2.INTER_CUBIC)
+    # 去掉扩充边并裁到图像范围内
+    height, width = padded.shape[0] - 2 * SEAL_PADDING, padded.shape[1] - 2 * SEAL_PADDING
+    x0, y0 = min(max(0, x - SEAL_PADDING), width), min(max(0, y - SEAL_PADDING), height)
+    x1, y1 = min(max(0, x + w - SEAL_PADDING), width), min(max(0, y + h - SEAL_PADDING), height)
+    return (x0, y0, x1 - x0, y1 - y0), dst
+
+
+def _decode(image):
+    if isinstance(image, np.ndarray):
+        return image
+    image = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("无法解码的图像")
+    return image
+
+
+def extract_seals(image, max_seals=MAX_SEALS, with_overlay=False, page=0) -> SealPage:
+    """
+    提取一张图片中的红色印章（只能提取出黑白颜色底的红色印章）
+    :param image: 图像文件字节或BGR格式的numpy数组
+    :param max_seals: 最多提取的印章数，按外接矩形面积从大到小
+    :param with_overlay: 是否返回标出印章轮廓的整页图
+    :param page: 写入结果的页码
+    :return: SealPage，bbox为输入图像的像素坐标
+    """
+    image = _decode(image)
+    resized, padded, located, contours = _locate_seals(image, max_seals)
+    scale = image.shape[1] / resized.shape[1]
+    seals = []
+    for cnt in located:
+        (x, y, w, h), crop = _crop_seal(padded, cnt)
+        seals.append(SealCrop((x * scale, y * scale, w * scale, h * scale), toRGB(crop)))
+    overlay = toRGB(cv2.drawContours(padded.copy(), contours, -1, (0, 255, 0), 5)) if with_overlay else None
+    return SealPage(page, seals, overlay)
+
+
+def _extract_page(doc, pg, zoom, max_seals, with_overlay):
+    # 渲染PDF一页并提取印章，bbox换算为页面坐标（pt）
+    image = cv2.cvtColor(render_page(doc, pg, zoom, SEAL_MAX_WIDTH, None), cv2.COLOR_RGB2BGR)
+    result = extract_seals(image, max_seals, with_overlay, pg)
+    scale = doc[pg].rect.width / image.shape[1]
+    seals = [SealCrop(tuple(v * scale for v in seal.bbox), seal.image) for seal in result.seals]
+    return result._replace(seals=seals)
+
+
+def _extract_pdf_page_task(path, pg, zoom, max_seals, with_overlay):
+    # 子进程按路径打开（并缓存）父进程写出的PDF临时文件
+    return _extract_page(open_document(path), pg, zoom, max_seals, with_overlay)
+
+
+def _workers(workers, count):
+    if workers is None:
+        workers = int(os.getenv("SEAL_EXTRACT_WORKERS", os.cpu_count() or 1))
+    return min(workers, count)
+
+
+def _iter_until_parallel(count, extract, workers):
+    """
+    在当前进程逐项处理，按实测的单项耗时估算剩余项的串行耗时，分给多个进程节省的时间超过进程池启动
+    与子进程导入本模块的开销时（见WorkerPool.parallel_worthwhile）停止，剩余项交给共享进程池
+    :param extract: extract(i)处理第i项
+    :return: 在当前进程处理的项数
+    """
+    done = 0
+    while done < count:
+        start = time.perf_counter()
+        result = extract(done)
+        elapsed = time.perf_counter() - start
+        yield result
+        done += 1
+        remaining = count - done
+        if (workers > 1 and remaining >= PARALLEL_MIN_PAGES
+                and parallel_worthwhile(elapsed * remaining, workers, "seal_extract", SEAL_WORKER_STARTUP_SECONDS)):
+            break
+    return done
+
+
+def _imap_seals(task, args_list, workers):
+    results = imap_ordered(task, args_list, workers, "seal_extract")
+    try:
+        yield from results
+    finally:
+        results.close()
+
+
+def iter_extract_seals(images: Sequence, max_seals=MAX_SEALS, with_overlay=False, workers=None) -> Iterator[SealPage]:
+    """
+    批量提取多张图片中的印章，按输入顺序流式返回，SealPage.page为图片在列表中的序号
+    先在当前进程处理，剩余图片足够多、并行能抵消开销时交给共享进程池（见_iter_until_parallel）
+    :param images: 图像文件字节或BGR格式numpy数组的列表
+    :param workers: 进程数，默认读取SEAL_EXTRACT_WORKERS环境变量或CPU核数，为1时不使用进程池
+    """
+    images = list(images)
+    workers = _workers(workers, len(images))
+    done = yield from _iter_until_parallel(
+        len(images), lambda i: extract_seals(images[i], max_seals, with_overlay, i), workers)
+    if done < len(images):
+        yield from _imap_seals(extract_seals, ((images[i], max_seals, with_overlay, i)
+                                               for i in range(done, len(images))), workers)
+
+
+def iter_pdf_seals(pdf, pages=None, zoom=PDF_ZOOM, max_seals=MAX_SEALS, with_overlay=False,
+                   workers=None) -> Iterator[SealPage]:
+    """
+    提取PDF各页的印章，按页码顺序流式返回
+    先在当前进程处理，剩余页面足够多、并行能抵消开销时交给共享进程池，页面在子进程中渲染，只有裁剪结果回传
+    :param pdf: PDF文件的字节数据
+    :param pages: 只处理这些页码（按给定顺序），默认全部页面
+    :param zoom: 渲染缩放比例，渲染结果宽度不超过SEAL_MAX_WIDTH
+    :return: SealPage生成器，bbox为页面坐标（pt）
+    """
+    with fitz.open("pdf", pdf) as doc:
+        page_list = list(range(doc.page_count)) if pages is None else list(pages)
+        workers = _workers(workers, len(page_list))
+        done = yield from _iter_until_parallel(
+            len(page_list), lambda i: _extract_page(doc, page_list[i], zoom, max_seals, with_overlay), workers)
+    if done == len(page_list):
+        return
+    # PDF只写出一次临时文件，任务只传页码
+    with shared_file(pdf, ".pdf") as path:
+        yield from _imap_seals(_extract_pdf_page_task, ((path, pg, zoom, max_seals, with_overlay)
+                                                        for pg in page_list[done:]), workers)
+
+
 class ExtractSealService(object):
     def __init__(self, img_bits):
         self.img_bits = img_bits
@@ -91,80 +393,18 @@ class ExtractSealService(object):
         """
         红章的提取出来生成图片（只能提取出黑白颜色底的红色印章）
         """
-        arr = np.frombuffer(self.img_bits, dtype=np.uint8)
-        image = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-        img_w = 1024 if image.shape[1] > 1024 else image.shape[1]
-        image = cv2.resize(image, (img_w, int(img_w * image.shape[0] / image.shape[1])),
-                           interpolation=cv2.INTER_AREA if img_w > 1024 else cv2.INTER_CUBIC)
-        img_png = cv2.cvtColor(image, cv2.COLOR_RGB2RGBA)
-        hue_image = cv2.cvtColor(img_png, cv2.COLOR_BGR2HSV)
-
-        img_real = None
-        mask_ranges = [[np.array([0, 43, 46]), np.array([10, 255, 255])]
-            , [np.array([156, 43, 46]), np.array([180, 255, 255])]]
-        for img_range in mask_ranges:
-            th = cv2.inRange(hue_image, img_range[0], img_range[1])
-            element = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 1))
-            th = cv2.dilate(th, element)
-            index1 = th == 255
-            mask = np.zeros(img_png.shape, np.uint8)
-            mask[:, :, :] = (255, 255, 255, 0)
-            mask[index1] = img_png[index1]
-            if img_real is None:
-                img_real = mask
-            else:
-                img_real = cv2.add(img_real, mask)
-
-        white_px = np.asarray([255, 255, 255, 255])
-        (row, col, _) = img_real.shape
-        for r in range(row):
-            for c in range(col):
-                px = img_real[r][c]
-                if all(px == white_px):
-                    img_real[r][c] = img_png[r][c]
-
-        # 扩充图片防止截取部分
-        img4png = cv2.copyMakeBorder(img_real, 50, 50, 50, 50, cv2.BORDER_CONSTANT, value=[255, 255, 255, 0])
-        img5png = cv2.copyMakeBorder(image, 50, 50, 50, 50, cv2.BORDER_CONSTANT, value=[255, 255, 255, 0])
-        img2gray = cv2.cvtColor(img4png, cv2.COLOR_RGBA2GRAY)
-        retval, gray_first = cv2.threshold(img2gray, 253, 255, cv2.THRESH_BINARY_INV)
-
-        # 形态学去噪，cv2.MORPH_OPEN先腐蚀再膨胀，cv2.MORPH_CLOSE先膨胀再腐蚀
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
-        img_real = cv2.morphologyEx(gray_first, cv2.MORPH_OPEN, kernel, iterations=1)
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (100, 100))
-        img_real = cv2.morphologyEx(img_real, cv2.MORPH_CLOSE, kernel, iterations=1)
-
-        c_canny_img = cv2.Canny(img_real, 10, 10)
-
-        contours, hierarchy = cv2.findContours(c_canny_img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
-        cnt_img = cv2.drawContours(img5png.copy(), contours, -1, (0, 255, 0), 5)
-        areas = []
-        for i, cnt in enumerate(contours):
-            x, y, w, h = cv2.boundingRect(cnt)
-            area = w * h
-            ars = [area, i]
-            areas.append(ars)
-        areas = sorted(areas, reverse=True)
-        print(areas)
-        stamps = []
-        for item in areas[:4]:
-            max_ares = item
-            print(item)
-            x, y, w, h = cv2.boundingRect(contours[max_ares[1]])
-            x = x - 10
-            y = y - 10
-            w = w + 20
-            h = h + 20
-            temp = img5png[y:(y + h), x:(x + w)]
-            print(temp.shape)
-            if temp.shape[0] < temp.shape[1]:
-                zh = int((temp.shape[1] - temp.shape[0]) / 2)
-                temp = cv2.copyMakeBorder(temp, zh, zh, 0, 0, cv2.BORDER_CONSTANT, value=[255, 255, 255, 0])
-            else:
-                zh = int((temp.shape[0] - temp.shape[1]) / 2)
-                temp = cv2.copyMakeBorder(temp, 0, 0, zh, zh, cv2.BORDER_CONSTANT, value=[255, 255, 255, 0])
-            dst = cv2.resize(temp, (300, 300), interpolation=cv2.INTER_AREA if x > 300 or y > 300 else cv2.INTER_CUBIC)
-            stamps.append(dst)
-        all_stamp = cv2.hconcat(stamps)
-        return toRGB(cnt_img), None if all_stamp is None else toRGB(all_stamp)
+        image = _decode(self.img_bits)
+        resized, padded, located, contours = _locate_seals(image, MAX_SEALS)
+        cnt_img = cv2.drawContours(padded.copy(), contours, -1, (0, 255, 0), 5)
+        stamps = [_crop_seal(padded, cnt)[1] for cnt in located]
+        return toRGB(cnt_img), toRGB(cv2.hconcat(stamps)) if stamps else None
+
+    @staticmethod
+    def pick_seal_images(images: Sequence, max_seals=MAX_SEALS, workers=None) -> List[SealPage]:
+        """批量提取多张图片的印章，见iter_extract_seals"""
+        return list(iter_extract_seals(images, max_seals, workers=workers))
+
+    @staticmethod
+    def pick_pdf_seals(pdf, pages=None, max_seals=MAX_SEALS, workers=None) -> List[SealPage]:
+        """提取PDF各页的印章，见iter_pdf_seals"""
+        return list(iter_pdf_seals(pdf, pages, max_seals=max_seals, workers=workers))
@@ -0,0 +1,113 @@
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 连接失败、网关错误时重试的状态码
+RETRY_STATUS = (502, 503, 504)
+
+_lock = threading.Lock()
+_sessions = {}
+_endpoint_limits = {}
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def default_timeout():
+    """(连接超时, 读取超时)，单位秒，可通过HTTP_CONNECT_TIMEOUT/HTTP_READ_TIMEOUT配置"""
+    return _env_float("HTTP_CONNECT_TIMEOUT", 5), _env_float("HTTP_READ_TIMEOUT", 120)
+
+
+def long_timeout():
+    """耗时较长的接口（如合同大模型审查）使用的超时，读取超时可通过HTTP_LONG_READ_TIMEOUT配置"""
+    return _env_float("HTTP_CONNECT_TIMEOUT", 5), _env_float("HTTP_LONG_READ_TIMEOUT", 600)
+
+
+def max_retries():
+    """单次请求的最大重试次数，可通过HTTP_RETRIES配置"""
+    return _env_int("HTTP_RETRIES", 2)
+
+
+def endpoint_concurrency():
+    """单个接口地址默认的最大并发请求数，可通过HTTP_ENDPOINT_CONCURRENCY配置"""
+    return _env_int("HTTP_ENDPOINT_CONCURRENCY", 8)
+
+
+def _create_session(idempotent):
+    retries = max_retries()
+    # 非幂等请求只重试连接阶段的失败（请求尚未发出），幂等请求还会重试读超时和网关错误
+    retry = Retry(total=retries,
+                  connect=retries,
+                  read=retries if idempotent else 0,
+                  status=retries if idempotent else 0,
+                  other=0,
+                  allowed_methods=None if idempotent else Retry.DEFAULT_ALLOWED_METHODS,
+                  status_forcelist=RETRY_STATUS,
+                  backoff_factor=_env_float("HTTP_RETRY_BACKOFF", 0.5),
+                  raise_on_status=False)
+    pool_size = _env_int("HTTP_POOL_SIZE", 16)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(idempotent=True):
+    """
+    获取进程内共享的Session（按主机维护连接池并保持长连接）
+    :param idempotent: 是否用于幂等请求，决定重试策略
+    """
+    session = _sessions.get(idempotent)
+    if session is None:
+        with _lock:
+            session = _sessions.get(idempotent)
+            if session is None:
+                session = _sessions[idempotent] = _create_session(idempotent)
+    return session
+
+
+def _endpoint_key(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+def set_endpoint_limit(url, limit):
+    """设置某个接口地址的最大并发请求数"""
+    with _lock:
+        _endpoint_limits[_endpoint_key(url)] = threading.BoundedSemaphore(limit)
+
+
+def _endpoint_limit(url):
+    key = _endpoint_key(url)
+    limit = _endpoint_limits.get(key)
+    if limit is None:
+        with _lock:
+            limit = _endpoint_limits.get(key)
+            if limit is None:
+                limit = _endpoint_limits[key] = threading.BoundedSemaphore(endpoint_concurrency())
+    return limit
+
+
+def http_post(url, idempotent=True, timeout=None, **kwargs):
+    """
+    通过共享连接池发送POST请求
+    :param url: 接口地址
+    :param idempotent: 重复调用无副作用时为True（如识别、预处理接口），上传等接口应为False
+    :param timeout: 超时设置，默认见default_timeout
+    :param kwargs: 透传给requests的参数（json/data/files/headers等）
+    :return: requests.Response
+    """
+    if not url:
+        raise ValueError("请求地址不能为空")
+    with _endpoint_limit(url):
+        return get_session(idempotent).post(url, timeout=timeout or default_timeout(), **kwargs)
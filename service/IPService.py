@@ -3,126 +3,111 @@ import io
 import os
 from typing import Tuple, List, Dict
 
-import requests
 from PIL import Image
 
+from service.HttpClient import http_post
+from service.ImageCodec import to_base64
+
+
+def _api_url(env_name):
+    api_url = os.getenv(env_name)  # 服务URL
+    if not api_url:
+        raise ValueError(f"{env_name} environment variable not set")
+    return api_url
+
+
+def _encode_image(image_bytes):
+    # 原始格式可接受时直接透传，同一文件的base64只计算一次
+    return to_base64(image_bytes, "ips")
+
+
+def _tool_options(tool: Tuple[float, bool, bool]) -> Dict:
+    return {"init_confidence": tool[0],
+            "resize": tool[1],
+            "back_ground": tool[2]
+            }
+
+
+def _check_status(status_code, text):
+    # 处理接口返回数据
+    if status_code != 200:
+        error_msg = f"IPS服务调用失败！状态码：{status_code}，响应：{text[:500]}"
+        raise ConnectionError(error_msg)  # 触发可捕获的异常
+
 
 class IPService:
     def seal_preprocess(self, image_bytes, file_type:str = "image", return_seal_image: bool = True, return_ocr_text: bool = True,
                         tool: Tuple[float, bool, bool] = (0.5, True, True)) -> List[Dict]:
-        API_URL = os.getenv("IPS_SEAL_PREPROCESS")  # 服务URL
-        if not API_URL:
-            raise ValueError("IPS_SEAL_PREPROCESS environment variable not set")
-        image_data = base64.b64encode(image_bytes).decode("utf-8")
-        payload = {
-            "image_base64": image_data,
-            "file_type": file_type,
-            "return_seal_image": return_seal_image,
-            "return_ocr_text": return_ocr_text,
-            "tool": {"init_confidence": tool[0],
-                     "resize": tool[1],
-                     "back_ground": tool[2]
-                     }
-        }
-        # 调用API
-        response = requests.post(API_URL, json=payload)
-        # 处理接口返回数据
-        if response.status_code != 200:
-            error_msg = f"IPS服务调用失败！状态码：{response.status_code}，响应：{response.text[:500]}"
-            raise ConnectionError(error_msg)  # 触发可捕获的异常
-        return response.json()
+        api_url = _api_url("IPS_SEAL_PREPROCESS")
+        payload = self._seal_payload(_encode_image(image_bytes), file_type, return_seal_image, return_ocr_text, tool)
+        return self._call(api_url, payload)
 
-    def invoice_preprocess(self, image_bytes, file_type:str, return_corp_image: bool = True, return_ocr_text: bool = True,
+    def invoice_preprocess(self, image_bytes, file_type:str = "image", return_corp_image: bool = True, return_ocr_text: bool = True,
                            tool: Tuple[float, bool, bool] = (0.5, True, False)) -> List[Dict]:
-        API_URL = os.getenv("IPS_INVOICE_PREPROCESS")  # 服务URL
-        if not API_URL:
-            raise ValueError("IPS_INVOICE_PREPROCESS environment variable not set")
-        image_data = base64.b64encode(image_bytes).decode("utf-8")
-        payload = {
+        api_url = _api_url("IPS_INVOICE_PREPROCESS")
+        payload = self._invoice_payload(_encode_image(image_bytes), file_type, return_corp_image, return_ocr_text, tool)
+        return self._call(api_url, payload)
+
+    def idcard_preprocess(self, image_bytes, return_corp_image: bool = True, return_ocr_text: bool = False,
+                          tool: Tuple[float, bool, bool] = (0.5, True, False)) -> List[Dict]:
+        api_url = _api_url("IPS_IDCARD_PREPROCESS")
+        payload = self._card_payload(_encode_image(image_bytes), return_corp_image, return_ocr_text, tool)
+        return self._call(api_url, payload)
+
+    def bizlic_preprocess(self, image_bytes, return_corp_image: bool = True, return_ocr_text: bool = True,
+                          tool: Tuple[float, bool, bool] = (0.8, True, False)) -> List[Dict]:
+        api_url = _api_url("IPS_BIZLIC_PREPROCESS")
+        payload = self._card_payload(_encode_image(image_bytes), return_corp_image, return_ocr_text, tool)
+        return self._call(api_url, payload)
+
+    def card_det(self, image_bytes, return_corp_image: bool = True) -> Dict:
+        """
+        Card detection method that calls the /ips/api/v2/card/det endpoint
+        :param image_bytes: The image data as bytes
+        :param return_corp_image: Whether to return the cropped image
+        :return: Dictionary containing corp_image_base64, card_info, and fork status
+        """
+        api_url = _api_url("IPS_CARD_DET")
+        payload = self._card_det_payload(_encode_image(image_bytes), return_corp_image)
+        return self._call(api_url, payload)
+
+    def _seal_payload(self, image_data, file_type, return_seal_image, return_ocr_text, tool) -> Dict:
+        return {
             "image_base64": image_data,
             "file_type": file_type,
-            "return_corp_image": return_corp_image,
+            "return_seal_image": return_seal_image,
             "return_ocr_text": return_ocr_text,
-            "tool": {"init_confidence": tool[0],
-                     "resize": tool[1],
-                     "back_ground": tool[2]
-                     }
+            "tool": _tool_options(tool)
         }
-        # 调用API
-        response = requests.post(API_URL, json=payload)
-        # 处理接口返回数据
-        if response.status_code != 200:
-            error_msg = f"IPS服务调用失败！状态码：{response.status_code}，响应：{response.text[:500]}"
-            raise ConnectionError(error_msg)  # 触发可捕获的异常
-        return response.json()
 
-    def idcard_preprocess(self, image_bytes, return_corp_image: bool = True, return_ocr_text: bool = False,
-                          tool: Tuple[float, bool, bool] = (0.5, True, False)) -> List[Dict]:
-        API_URL = os.getenv("IPS_IDCARD_PREPROCESS")  # 服务URL
-        if not API_URL:
-            raise ValueError("IPS_IDCARD_PREPROCESS environment variable not set")
-        image_data = base64.b64encode(image_bytes).decode("utf-8")
-        payload = {
+    def _invoice_payload(self, image_data, file_type, return_corp_image, return_ocr_text, tool) -> Dict:
+        return {
             "image_base64": image_data,
+            "file_type": file_type,
             "return_corp_image": return_corp_image,
             "return_ocr_text": return_ocr_text,
-            "tool": {"init_confidence": tool[0],
-                     "resize": tool[1],
-                     "back_ground": tool[2]
-                     }
+            "tool": _tool_options(tool)
         }
-        # 调用API
-        response = requests.post(API_URL, json=payload)
-        # 处理接口返回数据
-        if response.status_code != 200:
-            error_msg = f"IPS服务调用失败！状态码：{response.status_code}，响应：{response.text[:500]}"
-            raise ConnectionError(error_msg)  # 触发可捕获的异常
-        return response.json()
 
-    def bizlic_preprocess(self, image_bytes, return_corp_image: bool = True, return_ocr_text: bool = True,
-                          tool: Tuple[float, bool, bool] = (0.8, True, False)) -> List[Dict]:
-        API_URL = os.getenv("IPS_BIZLIC_PREPROCESS")  # 服务URL
-        if not API_URL:
-            raise ValueError("IPS_BIZLIC_PREPROCESS environment variable not set")
-        image_data = base64.b64encode(image_bytes).decode("utf-8")
-        payload = {
+    def _card_payload(self, image_data, return_corp_image, return_ocr_text, tool) -> Dict:
+        # 身份证与营业执照接口参数一致
+        return {
             "image_base64": image_data,
             "return_corp_image": return_corp_image,
             "return_ocr_text": return_ocr_text,
-            "tool": {"init_confidence": tool[0],
-                     "resize": tool[1],
-                     "back_ground": tool[2]
-                     }
+            "tool": _tool_options(tool)
         }
-        # 调用API
-        response = requests.post(API_URL, json=payload)
-        # 处理接口返回数据
-        if response.status_code != 200:
-            error_msg = f"IPS服务调用失败！状态码：{response.status_code}，响应：{response.text[:500]}"
-            raise ConnectionError(error_msg)  # 触发可捕获的异常
-        return response.json()
 
-    def card_det(self, image_bytes, return_corp_image: bool = True) -> Dict:
-        """
-        Card detection method that calls the /ips/api/v2/card/det endpoint
-        :param image_bytes: The image data as bytes
-        :param return_corp_image: Whether to return the cropped image
-        :return: Dictionary containing corp_image_base64, card_info, and fork status
-        """
-        API_URL = os.getenv("IPS_CARD_DET")  # 服务URL
-        if not API_URL:
-            raise ValueError("IPS_CARD_DET environment variable not set")
-        image_data = base64.b64encode(image_bytes).decode("utf-8")
-        payload = {
+    def _card_det_payload(self, image_data, return_corp_image) -> Dict:
+        return {
             "image_base64": image_data,
             "return_corp_image": return_corp_image
         }
+
+    def _call(self, api_url, payload):
         # 调用API
-        response = requests.post(API_URL, json=payload)
-        # 处理接口返回数据
-        if response.status_code != 200:
-            error_msg = f"IPS服务调用失败！状态码：{response.status_code}，响应：{response.text[:500]}"
-            raise ConnectionError(error_msg)  # 触发可捕获的异常
+        response = http_post(api_url, json=payload)
+        _check_status(response.status_code, response.text)
         return response.json()
 
     def convert_seal_type(self, seal_code):
@@ -0,0 +1,268 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import cached_property
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+# 可直接编码的像素模式，其余模式（如CMYK）先转为RGB
+ENCODABLE_MODES = ("RGB", "RGBA", "L", "LA", "P")
+# EXIF方向标签
+_EXIF_ORIENTATION = 0x0112
+# PNG压缩级别：1比默认的6快数倍，仍为无损
+PNG_COMPRESS_LEVEL = int(os.getenv("IMAGE_PNG_COMPRESS_LEVEL", 1))
+
+_MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "BMP": "image/bmp", "WEBP": "image/webp"}
+
+
+class ImageBudget(NamedTuple):
+    """接口的图像编码预算"""
+    # 可原样透传的原始格式
+    formats: Tuple[str, ...] = ("PNG", "JPEG")
+    # 需要重新编码时使用的格式
+    encode_format: str = "PNG"
+    # JPEG编码质量
+    quality: int = 90
+    # 编码结果的字节数上限，超出时改用JPEG编码，0表示不限
+    max_bytes: int = 0
+    # 长边像素上限，超出时等比缩小后编码，0表示不限
+    max_side: int = 0
+
+
+# 各接口的默认预算：视觉大模型的token数随像素增长，默认缩小到长边1600并使用JPEG；
+# IPS/OCR接口默认不缩放，可通过环境变量开启
+DEFAULT_BUDGETS = {
+    "vlm": ImageBudget(encode_format="JPEG", quality=85, max_side=1600),
+}
+
+
+def get_budget(endpoint: str) -> ImageBudget:
+    """
+    读取接口的编码预算，环境变量前缀为IMAGE_<接口名>_，如IMAGE_VLM_MAX_SIDE、IMAGE_VLM_QUALITY、
+    IMAGE_IPS_MAX_BYTES、IMAGE_OCR_ENCODE_FORMAT、IMAGE_PADDLE_FORMATS（逗号分隔）
+    """
+    prefix = f"IMAGE_{endpoint.upper()}_"
+    default = DEFAULT_BUDGETS.get(endpoint, ImageBudget())
+    formats = os.getenv(prefix + "FORMATS")
+    return ImageBudget(
+        formats=tuple(f.strip().upper() for f in formats.split(",") if f.strip()) if formats else default.formats,
+        encode_format=os.getenv(prefix + "ENCODE_FORMAT", default.encode_format).upper(),
+        quality=int(os.getenv(prefix + "QUALITY", default.quality)),
+        max_bytes=int(os.getenv(prefix + "MAX_BYTES", default.max_bytes)),
+        max_side=int(os.getenv(prefix + "MAX_SIDE", default.max_side)))
+
+
+class EncodedImage:
+    """编码后的图像（或原样透传的文件），base64形式只计算一次"""
+
+    def __init__(self, data: bytes, image_format: Optional[str], size: Optional[Tuple[int, int]],
+                 passthrough: bool, encode_seconds: float = 0.0):
+        self.data = data
+        self.format = image_format
+        self.size = size
+        self.passthrough = passthrough
+        self.encode_seconds = encode_seconds
+
+    @cached_property
+    def base64(self) -> str:
+        return base64.b64encode(self.data).decode("ascii")
+
+    @property
+    def mime(self) -> str:
+        return _MIME_TYPES.get(self.format, "application/octet-stream")
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime};base64,{self.base64}"
+
+    def __len__(self):
+        return len(self.data)
+
+
+class _Stats:
+    def __init__(self):
+        self.passthrough = 0
+        self.encoded = 0
+        self.cache_hits = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.encode_seconds = 0.0
+
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_bytes = 0
+_stats = _Stats()
+
+
+def _cache_limit() -> int:
+    return int(os.getenv("IMAGE_CODEC_CACHE_BYTES", 64 * 1024 * 1024))
+
+
+def encode_image(source, endpoint: str = "default", mode: Optional[str] = None) -> EncodedImage:
+    """
+    按接口预算编码图像：原始文件格式可接受时原样透传，否则只解码、编码一次
+    :param source: 文件字节、Streamlit上传文件（或其他带getvalue的对象）、PIL图像、RGB数组或EncodedImage
+    :param endpoint: 接口名，决定编码预算（见get_budget）
+    :param mode: 需要的像素模式（如"L"），为空时保持原模式
+    :return: EncodedImage；非图像文件（如PDF）原样透传
+    """
+    if isinstance(source, EncodedImage):
+        return source
+    if hasattr(source, "getvalue"):
+        source = source.getvalue()
+    budget = get_budget(endpoint)
+    if isinstance(source, np.ndarray):
+        source = Image.fromarray(source)
+    if isinstance(source, Image.Image):
+        # 解码后的图像没有稳定的缓存键，直接编码
+        return _record(_encode_pil(source, budget, mode), 0)
+
+    data = bytes(source)
+    key = (hashlib.blake2b(data, digest_size=16).digest(), budget, mode)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+            _stats.cache_hits += 1
+            return entry[0]
+    encoded = _record(_encode_bytes(data, budget, mode), len(data))
+    _remember(key, encoded)
+    return encoded
+
+
+def to_base64(source, endpoint: str = "default", mode: Optional[str] = None) -> str:
+    """encode_image的base64形式"""
+    return encode_image(source, endpoint, mode).base64
+
+
+def decode_base64_image(data: str) -> bytes:
+    """base64字符串（可带data URL前缀）解码为文件字节"""
+    if "," in data:
+        data = data.split(",", 1)[1]
+    return base64.b64decode(data)
+
+
+def crop_or_original(image, corp_image_base64: Optional[str] = None):
+    """已有IPS返回的裁剪图（corp_image_base64）时使用裁剪图，否则使用原图"""
+    return decode_base64_image(corp_image_base64) if corp_image_base64 else image
+
+
+def codec_stats() -> dict:
+    """透传/编码次数、缓存命中次数、输入输出字节数与编码耗时"""
+    with _lock:
+        return {
+            "passthrough": _stats.passthrough,
+            "encoded": _stats.encoded,
+            "cache_hits": _stats.cache_hits,
+            "bytes_in": _stats.bytes_in,
+            "bytes_out": _stats.bytes_out,
+            "encode_seconds": round(_stats.encode_seconds, 3),
+            "cache_entries": len(_cache),
+            "cache_bytes": _cache_bytes,
+        }
+
+
+def clear_cache():
+    global _cache_bytes
+    with _lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+
+def _record(encoded: EncodedImage, bytes_in: int) -> EncodedImage:
+    with _lock:
+        if encoded.passthrough:
+            _stats.passthrough += 1
+        else:
+            _stats.encoded += 1
+        _stats.bytes_in += bytes_in
+        _stats.bytes_out += len(encoded.data)
+        _stats.encode_seconds += encoded.encode_seconds
+    return encoded
+
+
+def _remember(key, encoded: EncodedImage):
+    global _cache_bytes
+    # base64约为原始字节的4/3，两者都会驻留内存
+    size = len(encoded.data) * 7 // 3
+    limit = _cache_limit()
+    if size > limit:
+        return
+    with _lock:
+        if key in _cache:
+            return
+        _cache[key] = (encoded, size)
+        _cache_bytes += size
+        while _cache_bytes > limit:
+            _, (_, evicted) = _cache.popitem(last=False)
+            _cache_bytes -= evicted
+
+
+def _encode_bytes(data: bytes, budget: ImageBudget, mode: Optional[str]) -> EncodedImage:
+    try:
+        # 只读取文件头，不解码像素
+        image = Image.open(io.BytesIO(data))
+    except (UnidentifiedImageError, OSError):
+        return EncodedImage(data, None, None, passthrough=True)
+    if _can_pass_through(image, budget, mode, len(data)):
+        return EncodedImage(data, image.format, image.size, passthrough=True)
+    if budget.max_side and image.format == "JPEG":
+        # JPEG在解码时按1/2、1/4、1/8缩小（DCT缩放），大图缩小时省去大部分解码耗时
+        image.draft(mode or image.mode, _fit(image.size, budget.max_side))
+    return _encode_pil(image, budget, mode)
+
+
+def _can_pass_through(image: Image.Image, budget: ImageBudget, mode: Optional[str], size: int) -> bool:
+    if image.format not in budget.formats or image.mode not in ENCODABLE_MODES:
+        return False
+    if mode and image.mode != mode:
+        return False
+    if budget.max_bytes and size > budget.max_bytes:
+        return False
+    if budget.max_side and max(image.size) > budget.max_side:
+        return False
+    # 带旋转标记的图像重新编码（不保留EXIF），与此前转PNG后服务端看到的像素一致
+    return image.getexif().get(_EXIF_ORIENTATION, 1) == 1
+
+
+def _encode_pil(image: Image.Image, budget: ImageBudget, mode: Optional[str]) -> EncodedImage:
+    start = time.perf_counter()
+    if mode:
+        image = image.convert(mode)
+    elif image.mode not in ENCODABLE_MODES:
+        image = image.convert("RGB")
+    if budget.max_side and max(image.size) > budget.max_side:
+        image = image.resize(_fit(image.size, budget.max_side), Image.LANCZOS, reducing_gap=3.0)
+    image_format = budget.encode_format
+    data = _save(image, image_format, budget.quality)
+    if budget.max_bytes and len(data) > budget.max_bytes and image_format != "JPEG":
+        image_format = "JPEG"
+        data = _save(image, image_format, budget.quality)
+    return EncodedImage(data, image_format, image.size, passthrough=False,
+                        encode_seconds=time.perf_counter() - start)
+
+
+def _fit(size: Tuple[int, int], max_side: int) -> Tuple[int, int]:
+    """等比缩放到长边不超过max_side"""
+    scale = max_side / max(size)
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def _save(image: Image.Image, image_format: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(buffer, format="JPEG", quality=quality)
+    elif image_format == "PNG":
+        image.save(buffer, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+    else:
+        image.save(buffer, format=image_format)
+    return buffer.getvalue()
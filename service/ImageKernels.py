@@ -0,0 +1,163 @@
+from functools import lru_cache
+from typing import Optional, Sequence
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+@lru_cache(maxsize=64)
+def scale_lut(factor: float) -> np.ndarray:
+    """x -> min(255, round(x * factor)) 的256项查找表，与PIL的point(lambda x: min(255, x * factor))一致"""
+    # PIL对浮点结果按四舍六入五成双取整，与np.round一致
+    lut = np.round(np.arange(256, dtype=np.float64) * factor)
+    lut = np.clip(lut, 0, 255).astype(np.uint8)
+    lut.flags.writeable = False
+    return lut
+
+
+def to_rgb_array(img, alpha: bool = False) -> np.ndarray:
+    """
+    PIL图像或数组转为可原地修改的RGB（alpha为True时RGBA）uint8数组，只复制一次
+    :param img: PIL图像或HxWx3/HxWx4数组（RGB顺序）
+    """
+    if isinstance(img, np.ndarray):
+        channels = img.shape[2] if img.ndim == 3 else 1
+        if channels == 1:
+            return cv2.cvtColor(img, cv2.COLOR_GRAY2RGBA if alpha else cv2.COLOR_GRAY2RGB)
+        if channels == 3:
+            return cv2.cvtColor(img, cv2.COLOR_RGB2RGBA) if alpha else img.copy()
+        return img.copy() if alpha else cv2.cvtColor(img, cv2.COLOR_RGBA2RGB)
+    mode = "RGBA" if alpha else "RGB"
+    return np.array(img if img.mode == mode else img.convert(mode))
+
+
+class KernelContext:
+    """
+    一串内核共享的状态：同一个像素缓冲区，以及按需计算、可被后续内核复用的亮度（各通道最大值，即HSV的V）
+    """
+
+    def __init__(self, arr: np.ndarray):
+        self.arr = arr
+        self._value = None
+
+    @property
+    def rgb(self) -> np.ndarray:
+        return self.arr[..., :3]
+
+    def value(self) -> np.ndarray:
+        """各像素RGB的最大值，计算一次后缓存"""
+        if self._value is None:
+            rgb = self.rgb
+            self._value = np.maximum(rgb[..., 0], rgb[..., 1])
+            np.maximum(self._value, rgb[..., 2], out=self._value)
+        return self._value
+
+    def set_value(self, value: Optional[np.ndarray]):
+        self._value = value
+
+    def black_mask(self, threshold: int) -> np.ndarray:
+        """三个通道均小于阈值的像素，等价于亮度小于阈值（uint8掩码，0/255，可直接作为OpenCV的mask）"""
+        return cv2.compare(self.value(), threshold, cv2.CMP_LT)
+
+    def fill(self, mask: np.ndarray, color: Sequence[int], value: int):
+        """掩码内的像素原地填充为color（RGB或RGBA，RGBA缓冲区只给RGB时透明度不变），亮度缓存同步更新"""
+        channels = self.arr.shape[2]
+        color = tuple(color) + (0,) * (channels - len(color))
+        keep = (0,) * len(color) + (255,) * (channels - len(color))
+        # 掩码内先按位与清零（保留未指定的通道），再按位或写入颜色，不产生整幅临时数组
+        cv2.bitwise_and(self.arr, keep, dst=self.arr, mask=mask)
+        cv2.bitwise_or(self.arr, color, dst=self.arr, mask=mask)
+        if self._value is not None:
+            cv2.bitwise_and(self._value, 0, dst=self._value, mask=mask)
+            cv2.bitwise_or(self._value, value, dst=self._value, mask=mask)
+
+
+class BoostSaturation:
+    """按系数放大HSV饱和度（红色印章等彩色区域更醒目），亮度不变"""
+    needs_alpha = False
+
+    def __init__(self, factor: float = 1.5):
+        self.lut = scale_lut(factor).tolist()
+
+    def __call__(self, ctx: KernelContext):
+        # HSV转换沿用PIL：OpenCV的H、S量化与取整方式不同，红色印章像素上最多相差14级（见tests/test_image_kernels.py），
+        # 且PIL的整幅转换并不比cv2.cvtColor慢（见benchmarks/bench_image_kernels.py）
+        arr = ctx.arr
+        rgb = arr if arr.shape[2] == 3 else np.ascontiguousarray(ctx.rgb)
+        h, s, v = Image.fromarray(rgb, "RGB").convert("HSV").split()
+        boosted = Image.merge("HSV", (h, s.point(self.lut), v)).convert("RGB")
+        ctx.rgb[...] = np.asarray(boosted)
+        # 只改S通道，V即各通道最大值，留给后续去黑内核直接使用
+        ctx.set_value(np.array(v))
+
+
+class ReplaceBlack:
+    """三通道均小于阈值的黑色像素替换为指定颜色（默认白色）"""
+    needs_alpha = False
+
+    def __init__(self, threshold: int = 50, color: Sequence[int] = (255, 255, 255)):
+        self.threshold = threshold
+        self.color = tuple(int(c) for c in color)
+
+    def __call__(self, ctx: KernelContext):
+        ctx.fill(ctx.black_mask(self.threshold), self.color, max(self.color))
+
+
+class BlackToTransparent:
+    """三通道均小于阈值的黑色像素设为完全透明（0, 0, 0, 0）"""
+    needs_alpha = True
+
+    def __init__(self, threshold: int = 30):
+        self.threshold = threshold
+
+    def __call__(self, ctx: KernelContext):
+        ctx.fill(ctx.black_mask(self.threshold), (0, 0, 0, 0), 0)
+
+
+class SmoothBlack:
+    """三通道均小于阈值的黑色像素替换为左右相邻像素的平均值"""
+    needs_alpha = False
+
+    _KERNEL = np.array([[0.5, 0, 0.5]])
+
+    def __init__(self, threshold: int = 30):
+        self.threshold = threshold
+
+    def __call__(self, ctx: KernelContext):
+        mask = ctx.black_mask(self.threshold)
+        if not cv2.countNonZero(mask):
+            return
+        arr = ctx.arr
+        if arr.shape[2] == 3:
+            convolved = cv2.filter2D(arr, -1, self._KERNEL, borderType=cv2.BORDER_REPLICATE)
+            cv2.copyTo(convolved, mask, arr)
+        else:
+            rgb = ctx.rgb
+            convolved = cv2.filter2D(np.ascontiguousarray(rgb), -1, self._KERNEL, borderType=cv2.BORDER_REPLICATE)
+            np.copyto(rgb, convolved, where=mask.astype(bool)[..., None])
+        ctx.set_value(None)
+
+
+class KernelChain:
+    """
+    按顺序组合多个内核，整条链只做一次PIL→数组转换并在同一缓冲区上原地处理，
+    饱和度内核顺带得到的亮度通道由后续去黑内核直接复用，不再重新计算
+    例：KernelChain(BoostSaturation(1.5), ReplaceBlack(50)).apply(img)
+    """
+
+    def __init__(self, *kernels):
+        self.kernels = kernels
+        self.needs_alpha = any(kernel.needs_alpha for kernel in kernels)
+
+    def run(self, arr: np.ndarray) -> np.ndarray:
+        """在RGB/RGBA数组上原地执行"""
+        ctx = KernelContext(arr)
+        for kernel in self.kernels:
+            kernel(ctx)
+        return arr
+
+    def apply(self, img) -> Image.Image:
+        """处理PIL图像（或RGB数组），返回新的PIL图像"""
+        arr = self.run(to_rgb_array(img, self.needs_alpha))
+        return Image.fromarray(arr, "RGBA" if self.needs_alpha else "RGB")
@@ -0,0 +1,246 @@
+import io
+import time
+from abc import ABC, abstractmethod
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+# 像素表示：RGB/BGR/RGBA为HxWx3(4)，GRAY为HxW，均为uint8
+RGB, BGR, RGBA, GRAY = "RGB", "BGR", "RGBA", "GRAY"
+
+_CONVERSIONS = {
+    (RGB, BGR): cv2.COLOR_RGB2BGR, (BGR, RGB): cv2.COLOR_BGR2RGB,
+    (RGB, GRAY): cv2.COLOR_RGB2GRAY, (BGR, GRAY): cv2.COLOR_BGR2GRAY,
+    (GRAY, RGB): cv2.COLOR_GRAY2RGB, (GRAY, BGR): cv2.COLOR_GRAY2BGR,
+    (RGB, RGBA): cv2.COLOR_RGB2RGBA, (RGBA, RGB): cv2.COLOR_RGBA2RGB,
+    (BGR, RGBA): cv2.COLOR_BGR2RGBA, (RGBA, BGR): cv2.COLOR_RGBA2BGR,
+    (GRAY, RGBA): cv2.COLOR_GRAY2RGBA, (RGBA, GRAY): cv2.COLOR_RGBA2GRAY,
+}
+_PIL_MODES = {RGB: "RGB", RGBA: "RGBA", GRAY: "L"}
+
+
+def convert(image: np.ndarray, src: str, dst: str) -> np.ndarray:
+    """像素表示之间的转换，相同时原样返回"""
+    if src == dst:
+        return image
+    return cv2.cvtColor(image, _CONVERSIONS[(src, dst)])
+
+
+class Stage(ABC):
+    """
+    流水线阶段：accepts为可直接处理的像素表示（按偏好排序），output为输出表示（None表示与输入相同）；
+    inplace为True的阶段会原地修改缓冲区，子类必须实现run
+    """
+    name = "stage"
+    accepts: Tuple[str, ...] = (RGB, BGR, RGBA, GRAY)
+    output: Optional[str] = None
+    inplace = False
+
+    @abstractmethod
+    def run(self, image: np.ndarray, space: str) -> np.ndarray:
+        """处理space表示的图像，返回处理后的数组（inplace阶段可返回原数组）"""
+
+
+class ExifTranspose(Stage):
+    """按EXIF方向标记旋转；必须是第一个阶段，在解码时完成（不单独遍历像素）"""
+    name = "exif_transpose"
+
+    def run(self, image, space):
+        return image
+
+
+class Orientation(Stage):
+    """RapidOrientation方向分类并旋转到正常方向（见OcrService.classify_orientations）"""
+    name = "orientation"
+    accepts = (BGR, GRAY)
+
+    def __init__(self, text_angle: Optional[int] = None):
+        self.text_angle = text_angle
+
+    def run(self, image, space):
+        from service.OcrService import classify_orientations, rotate_bound
+
+        angle = classify_orientations([image], [self.text_angle])[0]
+        return rotate_bound(image, angle) if angle > 0 else image
+
+
+class Rotate(Stage):
+    """按角度逆时针旋转，空白处填白色"""
+    name = "rotate"
+
+    def __init__(self, angle: float):
+        self.angle = angle
+
+    def run(self, image, space):
+        from service.OcrService import rotate_bound
+
+        return rotate_bound(image, self.angle) if self.angle else image
+
+
+class EnhanceText(Stage):
+    """文字清晰度增强并二值化（见OcrService.enhance_text_clarity），输出灰度"""
+    name = "enhance_text"
+    accepts = (GRAY,)
+    output = GRAY
+
+    def __init__(self, **params):
+        self.params = params
+
+    def run(self, image, space):
+        from service.OcrService import enhance_gray
+
+        return enhance_gray(image, **self.params)
+
+
+class Kernels(Stage):
+    """
+    ImageKernels中的颜色内核链（如BoostSaturation、ReplaceBlack），原地处理RGB缓冲区；
+    含需要透明通道的内核（如BlackToTransparent）时处理RGBA缓冲区，输出与KernelChain.apply相同
+    """
+    name = "kernels"
+    accepts = (RGB,)
+    inplace = True
+
+    def __init__(self, *kernels):
+        from service.ImageKernels import KernelChain
+
+        self.chain = KernelChain(*kernels)
+        self.accepts = (RGBA,) if self.chain.needs_alpha else (RGB,)
+        self.name = "kernels[" + ",".join(type(kernel).__name__ for kernel in kernels) + "]"
+
+    def run(self, image, space):
+        return self.chain.run(image)
+
+
+class StageTiming(NamedTuple):
+    name: str
+    seconds: float
+
+
+class PipelineResult:
+    """流水线输出：像素数组、像素表示与各阶段（含解码与表示转换）耗时"""
+
+    def __init__(self, image: np.ndarray, space: str, timings: List[StageTiming]):
+        self.image = image
+        self.space = space
+        self.timings = timings
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(timing.seconds for timing in self.timings)
+
+    def to_array(self, space: str) -> np.ndarray:
+        return convert(self.image, self.space, space)
+
+    def to_pil(self) -> Image.Image:
+        space = self.space if self.space in _PIL_MODES else RGB
+        return Image.fromarray(self.to_array(space), _PIL_MODES[space])
+
+    def to_bytes(self, image_format: str = ".png") -> bytes:
+        image = self.image if self.space in (BGR, GRAY) else self.to_array(BGR)
+        return cv2.imencode(image_format, image)[1].tobytes()
+
+    def report(self) -> str:
+        return "，".join(f"{timing.name} {timing.seconds * 1000:.1f}ms" for timing in self.timings)
+
+
+class ImagePipeline:
+    """
+    声明式图像预处理流水线：一个解码后的缓冲区依次经过各阶段，
+    按各阶段可接受的表示规划转换次数最少的方案（文件字节直接解码为所需的BGR或灰度），
+    阶段之间表示相同时不做转换，只有原地阶段且输入为调用方数组时才复制一次
+    例：ImagePipeline(ExifTranspose(), Orientation(), EnhanceText()).run(image_bytes)
+    """
+
+    def __init__(self, *stages: Stage):
+        self.exif = bool(stages) and isinstance(stages[0], ExifTranspose)
+        self.stages = stages[1:] if self.exif else stages
+        if any(isinstance(stage, ExifTranspose) for stage in self.stages):
+            raise ValueError("ExifTranspose必须是第一个阶段")
+
+    def plan(self, start_spaces: Sequence[str]) -> Tuple[str, List[Tuple[Optional[str], Stage]]]:
+        """
+        规划转换次数最少的方案：依次为每个阶段选择其可接受的表示，转换次数相同时取阶段偏好靠前的表示
+        :param start_spaces: 可作为起点的表示（文件字节可直接解码为BGR或灰度，其余输入只有一种）
+        :return: (起点表示, [(阶段前需要转换到的表示，不转换为None, 阶段)])
+        """
+        # best[表示] = (转换次数, 起点, 各阶段前转换到的表示)
+        best = {space: (0, space, []) for space in start_spaces}
+        for stage in self.stages:
+            nxt = {}
+            for target in stage.accepts:
+                cost, start, targets = min(
+                    ((cost + (space != target), start, targets + [None if space == target else target])
+                     for space, (cost, start, targets) in best.items()),
+                    key=lambda item: item[0])
+                out = stage.output or target
+                if out not in nxt or cost < nxt[out][0]:
+                    nxt[out] = (cost, start, targets)
+            best = nxt
+        _, start, targets = min(best.values(), key=lambda item: item[0])
+        return start, list(zip(targets, self.stages))
+
+    def run(self, source, space: str = RGB) -> PipelineResult:
+        """
+        :param source: 图像文件字节、PIL图像或数组（数组的像素表示由space指定）
+        :param space: source为数组时的像素表示
+        :return: PipelineResult
+        """
+        timings = []
+        start = time.perf_counter()
+        if hasattr(source, "getvalue"):
+            source = source.getvalue()
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            decoded, steps = self.plan((BGR, GRAY))
+        else:
+            decoded = None
+        image, space, owned = self._decode(source, space, decoded)
+        if decoded is None or space != decoded:
+            _, steps = self.plan((space,))
+        timings.append(StageTiming("decode", time.perf_counter() - start))
+
+        for target, stage in steps:
+            if target is not None:
+                start = time.perf_counter()
+                image, owned = convert(image, space, target), True
+                timings.append(StageTiming(f"{space}->{target}", time.perf_counter() - start))
+                space = target
+            start = time.perf_counter()
+            if stage.inplace and not owned:
+                image, owned = image.copy(), True
+            result = stage.run(image, space)
+            owned = owned or result is not image
+            image = result
+            space = stage.output or space
+            timings.append(StageTiming(stage.name, time.perf_counter() - start))
+        return PipelineResult(image, space, timings)
+
+    def _decode(self, source, space, decoded):
+        # 返回(数组, 像素表示, 缓冲区是否归流水线所有)；文件字节直接解码为规划的表示（BGR或灰度）
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            data = np.frombuffer(source, np.uint8)
+            # OpenCV解码时默认按EXIF方向旋转，不需要时关闭
+            flags = cv2.IMREAD_GRAYSCALE if decoded == GRAY else cv2.IMREAD_COLOR
+            if not self.exif:
+                flags |= cv2.IMREAD_IGNORE_ORIENTATION
+            image = cv2.imdecode(data, flags)
+            if image is None:
+                # OpenCV不支持的格式交给PIL
+                return self._decode(Image.open(io.BytesIO(bytes(source))), space, None)
+            return image, decoded, True
+        if isinstance(source, Image.Image):
+            if self.exif:
+                source = ImageOps.exif_transpose(source)
+            if source.mode not in ("RGB", "RGBA", "L"):
+                source = source.convert("RGBA" if "A" in source.getbands() else "RGB")
+            return np.asarray(source), {"RGB": RGB, "RGBA": RGBA, "L": GRAY}[source.mode], False
+        if self.exif:
+            raise ValueError("数组没有EXIF信息，不能使用ExifTranspose")
+        return source, space, False
+
+
+def preprocess(source, stages: Sequence[Stage], space: str = RGB) -> PipelineResult:
+    """ImagePipeline(*stages).run(source, space)的简写"""
+    return ImagePipeline(*stages).run(source, space)
@@ -1,15 +1,109 @@
-from io import BytesIO
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from math import fabs, sin, radians, cos
-import base64
 import os
-import requests
+import threading
+import time
+from typing import Iterator, List, NamedTuple, Optional
 
 import cv2
-import fitz
 import numpy as np
 from PIL import ImageOps, Image
-from rapid_orientation import RapidOrientation
-from rapidocr_onnxruntime import RapidOCR
+
+from service.HttpClient import http_post
+from service.ImageCodec import to_base64
+from service.ImagePipeline import ImagePipeline, PipelineResult
+from service.PdfService import classify_pdf_text_layers, iter_pdf_pages
+from service.ResourceRegistry import get_orientation_engine
+from service.TextEnhancer import enhance_text
+
+# 方向分类每批送入模型的图像数
+ORIENTATION_BATCH_SIZE = int(os.getenv("ORIENTATION_BATCH_SIZE", 16))
+# 灰度标准差低于该值的图像视为空白页，方向无需分类
+ORIENTATION_BLANK_STD = float(os.getenv("ORIENTATION_BLANK_STD", 4.0))
+# 方向模型前两名的概率差小于该值时，参考宽高比在两者间取舍（见_pick_orientation）
+ORIENTATION_TIE_MARGIN = float(os.getenv("ORIENTATION_TIE_MARGIN", 0.1))
+# 宽高比超过该值的图像视为横向（或纵向）文字条
+ORIENTATION_STRIP_ASPECT = 3.0
+
+# 进程内OCR请求的累计耗时与次数，文档中没有需要OCR的页面时用于估算节省的耗时
+_ocr_timing_lock = threading.Lock()
+_ocr_timing = [0.0, 0]
+
+
+def pdf_ocr_concurrency():
+    """PDF逐页OCR同时在途的请求数，可通过OCR_PDF_CONCURRENCY配置，1表示逐页串行"""
+    return int(os.getenv("OCR_PDF_CONCURRENCY", 4))
+
+
+def _record_ocr_seconds(seconds):
+    with _ocr_timing_lock:
+        _ocr_timing[0] += seconds
+        _ocr_timing[1] += 1
+
+
+def _mean_ocr_seconds():
+    with _ocr_timing_lock:
+        return _ocr_timing[0] / _ocr_timing[1] if _ocr_timing[1] else None
+
+
+class PdfPageOcr(NamedTuple):
+    """
+    PDF单页识别结果，识别失败时lines为空列表、error为异常
+    source为text_layer（直接取自PDF文字层）或ocr；文字层页面未渲染时image为None
+    """
+    page: int
+    total: int
+    image: Optional[Image.Image]
+    lines: List[str]
+    error: Optional[Exception]
+    source: str = "ocr"
+
+
+class PdfOcrStats:
+    """单个PDF的识别统计：文字层直出与OCR的页数、耗时，以及跳过OCR节省的耗时估算"""
+
+    def __init__(self, concurrency=1):
+        self.concurrency = concurrency
+        self.pages = 0
+        self.text_layer_pages = 0
+        self.ocr_pages = 0
+        self.failed_pages = 0
+        # 需要OCR的原因：no_text、garbled、image、low_coverage、disabled
+        self.ocr_reasons = Counter()
+        self.classify_seconds = 0.0
+        self.ocr_seconds = 0.0
+        self.elapsed = 0.0
+
+    @property
+    def saved_seconds(self) -> Optional[float]:
+        """
+        跳过OCR节省的耗时：跳过页数 × 单页OCR平均耗时 ÷ 并发数 − 文字层判定耗时
+        单页OCR耗时取本文档的平均值，本文档没有OCR页面时取进程内的平均值，都没有时返回None
+        """
+        succeeded = self.ocr_pages - self.failed_pages
+        per_page = self.ocr_seconds / succeeded if succeeded else _mean_ocr_seconds()
+        if per_page is None:
+            return None
+        return max(0.0, self.text_layer_pages * per_page / self.concurrency - self.classify_seconds)
+
+    def __str__(self):
+        saved = self.saved_seconds
+        saved = f"{saved:.2f}s" if saved is not None else "未知"
+        return (f"共 {self.pages} 页，文字层直出 {self.text_layer_pages} 页，OCR {self.ocr_pages} 页"
+                f"（失败 {self.failed_pages} 页），耗时 {self.elapsed:.2f}s，跳过OCR约节省 {saved}")
+
+
+class PdfOcrResult(dict):
+    """
+    PDF识别结果：{页码: (页面图像, 文本行列表)}，按页码顺序排列
+    识别失败的页面文本行为空列表，失败原因记录在errors中（{页码: 错误信息}）
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.errors = {}
+        self.stats = None
 
 
 def rotate_image_by_exif(image_pil):
@@ -44,20 +138,82 @@ def rotate_bound(image, angle):
     return cv2.warpAffine(image, M, (newW, newH), borderValue=(255, 255, 255))
 
 
-def orientation(image_cv):
+def orientation_precheck(image_cv, text_angle=None):
+    """
+    不运行模型即可确定方向时返回角度：已知文字层方向（见PdfTextLayer.angle）或空白页
+    :param image_cv: cv 图像
+    :param text_angle: PDF文字层给出的方向
+    :return: 角度，需要模型分类时返回None
+    """
+    if text_angle is not None:
+        return text_angle
+    # 隔行隔列抽样（约128×128个像素）统计标准差，大图也只需亚毫秒
+    step = max(1, max(image_cv.shape[:2]) // 128)
+    if image_cv[::step, ::step].std() < ORIENTATION_BLANK_STD:
+        return 0
+    return None
+
+
+def _pick_orientation(labels, score, image_cv):
+    """
+    取方向模型概率最高的方向；前两名相差不到ORIENTATION_TIE_MARGIN、且只有第二名与文字条的宽高比相符时取第二名
+    宽高比不能排除任何方向（竖长的小票、窄列表格正放时也是纵向），只在模型难以取舍时参考
+    """
+    best, second = np.argsort(score)[::-1][:2].tolist()
+    if score[best] - score[second] < ORIENTATION_TIE_MARGIN:
+        h, w = image_cv.shape[:2]
+        if w >= h * ORIENTATION_STRIP_ASPECT:
+            preferred = {0, 180}
+        elif h >= w * ORIENTATION_STRIP_ASPECT:
+            preferred = {90, 270}
+        else:
+            preferred = None
+        if preferred and int(labels[best]) not in preferred and int(labels[second]) in preferred:
+            best = second
+    return int(labels[best])
+
+
+def _orientation_input(engine, image_cv):
+    # 与RapidOrientation相同的预处理（短边缩放到256、中心裁剪224、归一化），
+    # 原实现重复生成3个相同的裁剪后投票，这里只取一个
+    image = engine.load_img(image_cv)
+    image = engine.preprocess.resize_img(image)
+    image = engine.preprocess.crop_img(image)
+    image = engine.preprocess.normal_img(image)
+    return engine.preprocess.cvt_channel(image)
+
+
+def classify_orientations(images, text_angles=None):
+    """
+    批量判断文档图像的方向，预检（orientation_precheck）能确定的图像不运行模型，其余分批一次推理
+    :param images: cv 图像列表
+    :param text_angles: 与images对应的文字层方向列表（未知为None），可为空
+    :return: 各图像需逆时针旋转的角度列表（0/90/180/270）
+    """
+    text_angles = text_angles or [None] * len(images)
+    angles = [orientation_precheck(image, text_angle) for image, text_angle in zip(images, text_angles)]
+    todo = [i for i, angle in enumerate(angles) if angle is None]
+    if not todo:
+        return angles
+    engine = get_orientation_engine()
+    for start in range(0, len(todo), ORIENTATION_BATCH_SIZE):
+        batch = todo[start:start + ORIENTATION_BATCH_SIZE]
+        inputs = np.stack([_orientation_input(engine, images[i]) for i in batch]).astype(np.float32)
+        scores = engine.session(inputs)[0]
+        for i, score in zip(batch, scores):
+            angles[i] = _pick_orientation(engine.labels, score, images[i])
+    return angles
+
+
+def orientation(image_cv, text_angle=None):
     """
     对含有文字信息的文档图像进行旋转
     :param image_cv: cv 图像
+    :param text_angle: PDF文字层给出的方向，已知时不运行模型
     :return: 处理完的正常方向图像
     """
-    orientation_engine = RapidOrientation()
-    orientation_res, elapse = orientation_engine(image_cv)
-    print(orientation_res)
-    angle = int(orientation_res)
-    if angle > 0:
-        return rotate_bound(image_cv, angle)
-    else:
-        return image_cv
+    angle = classify_orientations([image_cv], [text_angle])[0]
+    return rotate_bound(image_cv, angle) if angle > 0 else image_cv
 
 
 def enhance_text_clarity(pil_image,
@@ -80,67 +236,63 @@ def enhance_text_clarity(pil_image,
     """
     # 转换为OpenCV格式（自动处理色彩空间）
     if pil_image.mode == 'RGB':
-        np_image = np.array(pil_image)
-        opencv_image = cv2.cvtColor(np_image, cv2.COLOR_RGB2BGR)
-        gray = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
+        gray = cv2.cvtColor(np.asarray(pil_image), cv2.COLOR_RGB2GRAY)
     else:
-        gray = np.array(pil_image)
+        gray = np.asarray(pil_image)
 
-    # 1. 未锐化掩模技术（核心文字增强）
-    if use_unsharp_mask:
-        blurred = cv2.GaussianBlur(gray, (0, 0), 3.0)
-        unsharp = cv2.addWeighted(gray, 1.5, blurred, -0.5, 0)
-        enhanced = unsharp
-    else:
-        enhanced = gray
-
-    # 2. 对比度增强（强化文字与背景差异）
-    if use_contrast:
-        enhanced = cv2.convertScaleAbs(enhanced, alpha=contrast_factor, beta=0)
-
-    # 3. 锐化加强（可选：针对小字号文本）
-    if sharpen_strength > 1.0:
-        kernel = np.array([[0, -1, 0],
-                           [-1, 5 * sharpen_strength, -1],
-                           [0, -1, 0]])
-        enhanced = cv2.filter2D(enhanced, -1, kernel)
-
-    # 4. 二值化优化（增强黑白对比）
-    _, binary = cv2.threshold(
-        enhanced,
-        0,
-        255,
-        cv2.THRESH_BINARY + cv2.THRESH_OTSU  # 自动计算最佳阈值
-    )
+    binary = enhance_gray(gray, sharpen_strength, contrast_factor, use_unsharp_mask, use_contrast)
 
     # 转回PIL格式
     return Image.fromarray(binary, 'L')
 
 
+def enhance_gray(gray,
+                 sharpen_strength=1.8,
+                 contrast_factor=1.5,
+                 use_unsharp_mask=True,
+                 use_contrast=True,
+                 tiled=None,
+                 out=None):
+    """
+    enhance_text_clarity的灰度数组版本，供预处理流水线（ImagePipeline.EnhanceText）直接使用
+    未锐化掩模、对比度增强、锐化与Otsu二值化融合执行，大图分块并行（见TextEnhancer.enhance_text）
+
+    参数:
+        tiled: 是否分块并行，默认按图像大小自动选择
+        out: 预先分配的输出数组，为空时新建
+
+    返回:
+        二值化后的灰度数组
+    """
+    return enhance_text(gray, sharpen_strength, contrast_factor, use_unsharp_mask, use_contrast, tiled, out)
+
+
 class OcrService:
     def __init__(self):
         self.api_url = os.getenv("IPS_OCR_PREPROCESS")
         if not self.api_url:
             raise ValueError("IPS_OCR_PREPROCESS environment variable not set")
 
+    def preprocess(self, image, *stages) -> PipelineResult:
+        """
+        按声明的阶段预处理图像，例如：preprocess(image_bytes, ExifTranspose(), Orientation(), EnhanceText())
+        :param image: 图像文件字节、PIL图像或RGB数组
+        :return: PipelineResult，to_pil()后可直接交给detect_from_image，timings为各阶段耗时
+        """
+        return ImagePipeline(*stages).run(image)
+
     def detect_from_image_path(self, image_path):
-        image = Image.open(image_path)
-        result = self.detect_from_image(image)
+        with open(image_path, "rb") as f:
+            result = self.detect_from_image(f.read())
         return result
 
     def detect_from_image(self, image):
         """
         识别图像文本
-        :param image: PIL图像
+        :param image: PIL图像或图像文件字节（格式可接受时原样发送，不重新编码）
         :return: 识别结果列表
         """
-        # 将PIL图像转换为字节
-        img_byte_arr = BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        img_byte_arr = img_byte_arr.getvalue()
-        
-        # 将图像转换为base64
-        image_base64 = base64.b64encode(img_byte_arr).decode('utf-8')
+        image_base64 = to_base64(image, "ocr")
         
         # 调用OCR接口
         payload = {
@@ -148,7 +300,7 @@ class OcrService:
             "return_ocr_text": True
         }
         
-        response = requests.post(self.api_url, json=payload)
+        response = http_post(self.api_url, json=payload)
         
         if response.status_code != 200:
             raise Exception(f"OCR API调用失败，状态码: {response.status_code}, 响应: {response.text}")
@@ -165,31 +317,107 @@ class OcrService:
             error_details = f"API响应: {result_data}" if not result_data.get('msg') else ""
             raise Exception(f"OCR识别失败: {error_msg}. {error_details}")
 
-    def detect_from_pdf_path(self, pdf_bits):
+    def detect_from_pdf_path(self, pdf_bits, concurrency=None, raise_on_error=True):
         """
-        处理PDF文件，将其转换为图片后调用OCR接口
+        处理PDF文件：有可用文字层的页面直接提取文字，其余页面转换为图片后调用OCR接口
+        多个页面的OCR请求并发进行，等待结果的同时继续渲染后续页面
         :param pdf_bits: PDF文件的字节数据
-        :return: 包含每页识别结果的字典
+        :param concurrency: 同时在途的OCR请求数，默认见pdf_ocr_concurrency
+        :param raise_on_error: 为True时任一页识别失败即抛出该页的异常；为False时保留其余页面的结果，
+                               失败页面记录在errors中，全部失败时才抛出异常
+        :return: PdfOcrResult，包含每页识别结果的字典及统计（stats）
         """
-        pdf_text = {}
-        pdf_doc = fitz.open("pdf", pdf_bits)
-        total_pages = pdf_doc.page_count
-        
-        print(f"开始处理PDF，共 {total_pages} 页")
-        
-        for i in range(total_pages):
-            print(f"正在处理第 {i+1}/{total_pages} 页...")
-            page = pdf_doc[i]
-            zoom_x = 1.33333333
-            zoom_y = 1.33333333
-            mat = fitz.Matrix(zoom_x, zoom_y)
-            pix = page.get_pixmap(matrix=mat, dpi=None, colorspace='rgb', alpha=False)
-            img_bits = pix.tobytes()
-            img = Image.open(BytesIO(img_bits))
-            result = self.detect_from_image(img)
-            pdf_text[i] = (img, result)
-            print(f"第 {i+1}/{total_pages} 页处理完成，识别到 {len(result)} 个文本块")
+        pdf_text = PdfOcrResult()
+        pdf_text.stats = PdfOcrStats()
+        first_error = None
+        for page in self.iter_pdf_ocr(pdf_bits, concurrency, stats=pdf_text.stats, raise_on_error=raise_on_error):
+            if page.error is not None:
+                first_error = first_error or page.error
+                pdf_text.errors[page.page] = str(page.error)
+            pdf_text[page.page] = (page.image, page.lines)
         
-        pdf_doc.close()
-        print(f"PDF处理完成，共处理 {total_pages} 页")
+        if pdf_text and len(pdf_text.errors) == len(pdf_text):
+            raise first_error
         return pdf_text
+
+    def iter_pdf_ocr(self, pdf_bits, concurrency=None, render_text_pages=True,
+                     stats: PdfOcrStats = None, raise_on_error=True) -> Iterator[PdfPageOcr]:
+        """
+        逐页流式返回PDF识别结果，每页完成即返回，调用方无需等待整个文档
+        先逐页判定文字层（见classify_text_layer），文字层可用的页面直接返回其文字，只有扫描页等才渲染并OCR；
+        主线程渲染页面，线程池并发调用OCR接口，按页码顺序返回；在途页面数有上限，内存不随页数增长
+        :param pdf_bits: PDF文件的字节数据
+        :param concurrency: 同时在途的OCR请求数，默认见pdf_ocr_concurrency
+        :param render_text_pages: 文字层页面是否也渲染页面图像，不需要显示图像时传False
+        :param stats: 传入时填充本文档的识别统计（PdfOcrStats）
+        :param raise_on_error: 为True时某页识别失败即抛出该页的异常（已返回的页面不受影响）；
+                               为False时失败页面照常返回（lines为空列表，error为异常），由调用方处理
+        :return: PdfPageOcr生成器
+        """
+        start = time.perf_counter()
+        concurrency = max(1, concurrency or pdf_ocr_concurrency())
+        stats = stats if stats is not None else PdfOcrStats()
+        stats.concurrency = concurrency
+        layers = classify_pdf_text_layers(pdf_bits)
+        total_pages = len(layers)
+        stats.pages = total_pages
+        stats.classify_seconds = sum(layer.seconds for layer in layers)
+        render_pages = [layer.page for layer in layers if render_text_pages or not layer.usable]
+        print(f"开始处理PDF，共 {total_pages} 页，其中 {total_pages - sum(layer.usable for layer in layers)} 页需要OCR")
+
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="pdf-ocr")
+        pending = deque()
+        in_flight = 0
+        images = iter_pdf_pages(pdf_bits, pages=render_pages)
+        try:
+            for layer in layers:
+                img = None
+                if render_text_pages or not layer.usable:
+                    _, page_image = next(images)
+                    img = Image.fromarray(page_image)
+                if layer.usable:
+                    pending.append((layer.page, img, layer))
+                else:
+                    stats.ocr_reasons[layer.reason] += 1
+                    pending.append((layer.page, img, executor.submit(self._timed_detect, img)))
+                    in_flight += 1
+                # 渲染最多领先concurrency个OCR请求；队首为文字层页面时可立即返回
+                while pending and (in_flight > concurrency or not isinstance(pending[0][2], Future)):
+                    in_flight -= isinstance(pending[0][2], Future)
+                    yield self._checked(self._page_result(total_pages, stats, *pending.popleft()), raise_on_error)
+            while pending:
+                yield self._checked(self._page_result(total_pages, stats, *pending.popleft()), raise_on_error)
+        finally:
+            images.close()
+            executor.shutdown(wait=False, cancel_futures=True)
+        stats.elapsed = time.perf_counter() - start
+        print(f"PDF处理完成，{stats}")
+
+    def _timed_detect(self, image):
+        start = time.perf_counter()
+        lines = self.detect_from_image(image)
+        return lines, time.perf_counter() - start
+
+    @staticmethod
+    def _checked(page: PdfPageOcr, raise_on_error) -> PdfPageOcr:
+        if raise_on_error and page.error is not None:
+            raise page.error
+        return page
+
+    @staticmethod
+    def _page_result(total_pages, stats, i, img, source) -> PdfPageOcr:
+        if not isinstance(source, Future):
+            stats.text_layer_pages += 1
+            print(f"第 {i+1}/{total_pages} 页使用文字层，共 {len(source.lines)} 行")
+            return PdfPageOcr(i, total_pages, img, source.lines, None, "text_layer")
+        stats.ocr_pages += 1
+        try:
+            lines, seconds = source.result()
+        except Exception as e:
+            stats.failed_pages += 1
+            print(f"第 {i+1}/{total_pages} 页识别失败: {e}")
+            return PdfPageOcr(i, total_pages, img, [], e)
+        stats.ocr_seconds += seconds
+        _record_ocr_seconds(seconds)
+        print(f"第 {i+1}/{total_pages} 页处理完成，识别到 {len(lines)} 个文本块")
+        return PdfPageOcr(i, total_pages, img, lines, None)
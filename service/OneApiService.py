@@ -1,9 +1,10 @@
-import base64
 import os
 
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from service.ImageCodec import encode_image, crop_or_original
+
 
 class OneApiService:
     def __init__(self, model_name):
@@ -141,7 +142,11 @@ class OneApiService:
         print(chat_completion)
         return chat_completion.choices[0].message.content
 
-    def ocr_idcard_vl(self, image_bytes):
+    def ocr_idcard_vl(self, image_bytes, corp_image_base64=None):
+        """
+        :param image_bytes: 图像文件字节（或ImageCodec.EncodedImage）
+        :param corp_image_base64: IPS返回的裁剪图，提供时只发送裁剪区域
+        """
         prompt = '''
         你是一个身份证识别专用模型，请严格按以下规则处理：
         1.仅返回JSON格式数据，绝对不要包含任何解释、额外文字或Markdown代码块
@@ -167,7 +172,8 @@ class OneApiService:
         "valid_period": ""
         }
         '''
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        # 按vlm预算缩放、压缩（见ImageCodec.get_budget），data URL使用实际的图像类型
+        image_url = encode_image(crop_or_original(image_bytes, corp_image_base64), "vlm").data_url
         chat_completion = self.client.chat.completions.create(
             model=self.model_name,
             messages=[
@@ -190,7 +196,7 @@ class OneApiService:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
+                                "url": image_url
                             }
                         }
                     ]
@@ -205,7 +211,11 @@ class OneApiService:
         print(chat_completion)
         return chat_completion.choices[0].message.content
 
-    def ocr_business_vl(self, image_bytes):
+    def ocr_business_vl(self, image_bytes, corp_image_base64=None):
+        """
+        :param image_bytes: 图像文件字节（或ImageCodec.EncodedImage）
+        :param corp_image_base64: IPS返回的裁剪图，提供时只发送裁剪区域
+        """
         prompt = '''
         你是一个企业营业执照识别专用模型，请严格按以下规则处理：
         1.仅返回JSON格式数据，绝对不要包含任何解释、额外文字或Markdown代码块
@@ -221,7 +231,8 @@ class OneApiService:
           - 成功：{ "code": 200, "name": "", "org_code": "", ...  } 
           - 失败：{ "code": 500, "msg": "请重新上传更清晰的图片" }  
         '''
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        # 按vlm预算缩放、压缩（见ImageCodec.get_budget），data URL使用实际的图像类型
+        image_url = encode_image(crop_or_original(image_bytes, corp_image_base64), "vlm").data_url
         chat_completion = self.client.chat.completions.create(
             model=self.model_name,
             messages=[
@@ -244,7 +255,7 @@ class OneApiService:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
+                                "url": image_url
                             }
                         }
                     ]
@@ -259,13 +270,18 @@ class OneApiService:
         print(chat_completion)
         return chat_completion.choices[0].message.content
 
-    def ocr_invoice_vl(self, image_bytes):
+    def ocr_invoice_vl(self, image_bytes, corp_image_base64=None):
+        """
+        :param image_bytes: 图像文件字节（或ImageCodec.EncodedImage）
+        :param corp_image_base64: IPS返回的裁剪图，提供时只发送裁剪区域
+        """
         prompt = '''
         你是一个发票识别专用模型,请根据图片内的文本信息提取下面关键信息：
         发票号码,发票代码,发票类型,校验码,开票日期,购货方公司名称,销售方公司名称,发票金额,发票总金额 
         结果以JSON格式返回,注意：无法判断的信息直接返回空。      
         '''
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        # 按vlm预算缩放、压缩（见ImageCodec.get_budget），data URL使用实际的图像类型
+        image_url = encode_image(crop_or_original(image_bytes, corp_image_base64), "vlm").data_url
         chat_completion = self.client.chat.completions.create(
             model=self.model_name,
             messages=[
@@ -279,7 +295,7 @@ class OneApiService:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
+                                "url": image_url
                             }
                         }
                     ]
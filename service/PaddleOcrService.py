@@ -1,71 +1,59 @@
-import base64
 import os
+import time
 
-import numpy as np
-import requests
-from PIL import Image
 from dotenv import load_dotenv
 
+from service.HttpClient import http_post
+from service.ImageCodec import to_base64
+from service.ImageKernels import BlackToTransparent, BoostSaturation, KernelChain, ReplaceBlack, SmoothBlack
+from service.ImagePipeline import ImagePipeline, Kernels, Stage
+from service.PdfService import classify_pdf_text_layers, select_pdf_pages
+
 
 class PaddleOcrService:
 
     # 增强红色饱和度
     def boost_red(self, img, saturation_factor=1.5):
-        img = img.convert('RGB')
-        # 转换到HSV空间，单独增强饱和度
-        hsv_img = img.convert('HSV')
-        h, s, v = hsv_img.split()
-        s = s.point(lambda x: min(255, x * saturation_factor))  # 红色区域饱和度倍增
-        enhanced_img = Image.merge('HSV', (h, s, v)).convert('RGB')
-        return enhanced_img
+        return KernelChain(BoostSaturation(saturation_factor)).apply(img)
 
     def replace_black_with_white(self, img, threshold=50):
         """将黑色像素替换为白色（支持JPG/PNG）"""
-        arr = np.array(img.convert("RGB"))  # 确保RGB格式
-        # 检测黑色像素（三通道同时满足条件）
-        black_mask = (arr[:, :, 0] < threshold) & \
-                     (arr[:, :, 1] < threshold) & \
-                     (arr[:, :, 2] < threshold)
-        # 替换为白色
-        arr[black_mask] = [255, 255, 255]
-        return Image.fromarray(arr)
+        return KernelChain(ReplaceBlack(threshold)).apply(img)
 
     def remove_black_to_transparent(self, img, threshold=30):
         """将黑色像素替换为透明（需保存为PNG）"""
-        img = img.convert("RGBA")  # 转换为RGBA模式
-        arr = np.array(img)
-        r, g, b, a = arr[:, :, 0], arr[:, :, 1], arr[:, :, 2], arr[:, :, 3]
-
-        # 创建黑色像素掩码（RGB值均小于阈值）
-        black_mask = (r < threshold) & (g < threshold) & (b < threshold)
-
-        # 将黑色区域设为透明
-        arr[black_mask] = [0, 0, 0, 0]  # RGBA: 最后一个0表示完全透明
-        return Image.fromarray(arr)
+        return KernelChain(BlackToTransparent(threshold)).apply(img)
 
     def remove_black_pixels(self, img, threshold=30):
         """用相邻像素平均值替换黑色（平滑过渡）"""
-        import cv2
-        arr = np.array(img.convert("RGB"))
-        # 创建黑色像素掩码
-        black_mask = np.all(arr < threshold, axis=-1)
+        return KernelChain(SmoothBlack(threshold)).apply(img)
 
-        # 使用卷积计算左右像素平均值
-        kernel = np.array([0.5, 0, 0.5]).reshape(1, 3)  # 水平方向卷积核
-        convolved = cv2.filter2D(arr, -1, kernel, borderType=cv2.BORDER_REPLICATE)
-
-        # 仅替换黑色区域
-        result = np.where(black_mask[..., None], convolved, arr)
-        return Image.fromarray(result.astype('uint8'))
+    def preprocess(self, img, *stages):
+        """
+        按声明的阶段预处理图像，相邻的颜色内核合并为一个阶段在同一缓冲区内完成，例如先摆正方向、增强红色再去除黑色：
+        preprocess(img, Orientation(), BoostSaturation(1.5), ReplaceBlack(50))
+        :return: PIL图像；各阶段耗时见日志
+        """
+        grouped = []
+        for stage in stages:
+            if isinstance(stage, Stage):
+                grouped.append(stage)
+            elif grouped and isinstance(grouped[-1], Kernels):
+                grouped[-1] = Kernels(*grouped[-1].chain.kernels, stage)
+            else:
+                grouped.append(Kernels(stage))
+        result = ImagePipeline(*grouped).run(img)
+        print(f"图像预处理: {result.report()}")
+        return result.to_pil()
 
     def ocr_seal(self, image_bytes, file_type=1):
         load_dotenv()
         API_URL = os.getenv("PADDLE_SEAL_URL")  # 服务URL
-        image_data = base64.b64encode(image_bytes).decode("ascii")
+        image_data = to_base64(image_bytes, "paddle")
         payload = {
             "file": image_data, "fileType": file_type}  # Base64编码的文件内容或者图像URL
         # 调用API
-        response = requests.post(API_URL, json=payload)
+        response = http_post(API_URL, json=payload)
         # 处理接口返回数据
         if response.status_code != 200:
             error_msg = f"OCR服务调用失败！状态码：{response.status_code}，响应：{response.text[:500]}"
@@ -103,20 +91,52 @@ class PaddleOcrService:
         global result_text
         load_dotenv()
         API_URL = os.getenv("PADDLE_OCR_URL")
-        file_data = base64.b64encode(file_bytes).decode("ascii")
+        if file_type == 0:
+            page_texts = self._ocr_pdf_pages(API_URL, file_bytes)
+        else:
+            page_texts = self._request_pages(API_URL, file_bytes, file_type)
+        # 每页内容之间加两个换行符
+        return "".join('\n'.join(texts) + '\n\n' for texts in page_texts)
+
+    def _request_pages(self, api_url, file_bytes, file_type):
+        """调用OCR接口，返回每页的rec_texts"""
+        # PDF等非图像文件原样传递
+        file_data = to_base64(file_bytes, "paddle")
         payload = {
             "file": file_data, "fileType": file_type}  # Base64编码的文件内容或者图像URL
         # 调用API
-        response = requests.post(API_URL, json=payload)
+        response = http_post(api_url, json=payload)
         # 处理接口返回数据
         assert response.status_code == 200
         result = response.json()["result"]
-        # 提取rec_texts并组合成一段字符串
-        combined_text = ""
-        for page in result['ocrResults']:
-            combined_text += '\n'.join(page['prunedResult']['rec_texts']) + '\n\n'  # 每页内容之间加两个换行符
+        return [page['prunedResult']['rec_texts'] for page in result['ocrResults']]
 
-        return combined_text
+    def _ocr_pdf_pages(self, api_url, pdf_bytes):
+        """
+        PDF中有可用文字层的页面直接提取文字，只把其余页面组成新的PDF发送OCR接口
+        OCR接口返回的页数与发送的页数不一致时抛出异常（无法确定结果与页面的对应关系）
+        """
+        start = time.perf_counter()
+        layers = classify_pdf_text_layers(pdf_bytes)
+        # 不可用的文字层（乱码、覆盖率过低等）不作为识别结果，由OCR结果填充
+        page_texts = [layer.lines if layer.usable else [] for layer in layers]
+        ocr_pages = [layer.page for layer in layers if not layer.usable]
+        ocr_seconds = 0.0
+        if ocr_pages:
+            pdf = pdf_bytes if len(ocr_pages) == len(layers) else select_pdf_pages(pdf_bytes, ocr_pages)
+            ocr_start = time.perf_counter()
+            results = self._request_pages(api_url, pdf, 0)
+            if len(results) != len(ocr_pages):
+                raise Exception(f"OCR接口返回 {len(results)} 页结果，与发送的 {len(ocr_pages)} 页不一致")
+            for page, texts in zip(ocr_pages, results):
+                page_texts[page] = texts
+            ocr_seconds = time.perf_counter() - ocr_start
+        skipped = len(layers) - len(ocr_pages)
+        # 按本次OCR的单页平均耗时估算节省的时间
+        saved = f"{skipped * ocr_seconds / len(ocr_pages):.2f}s" if ocr_pages else "未知"
+        print(f"PDF共 {len(layers)} 页，文字层直出 {skipped} 页，OCR {len(ocr_pages)} 页，"
+              f"耗时 {time.perf_counter() - start:.2f}s，跳过OCR约节省 {saved}")
+        return page_texts
 
 
 
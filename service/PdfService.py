@@ -1,41 +1,447 @@
 # coding:utf-8
 
+import math
+import os
+import re
+import time
+import unicodedata
+from io import BytesIO
+from collections import Counter
+from typing import List, NamedTuple, Optional
+
 import cv2
 import fitz
 import numpy as np
 
+from service.WorkerPool import imap_ordered, parallel_worthwhile, shared_file
+from workers.pdf_render import render_page, render_page_task
+
+PDF_ZOOM = 1.33333333
+# 剩余页数少于该值时直接在当前进程渲染，不交给进程池
+PARALLEL_MIN_PAGES = 4
+# 目标大小压缩：JPEG质量搜索区间、估算抽样页数、单页PDF结构开销估计
+COMPRESS_MIN_QUALITY = 10
+COMPRESS_MAX_QUALITY = 80
+COMPRESS_SAMPLE_PAGES = 16
+COMPRESS_PAGE_OVERHEAD = 512
+
+# 文字层判定：有效字符数下限、乱码字符比例上限、文字覆盖率下限、图片覆盖率上限
+TEXT_LAYER_MIN_CHARS = int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", 20))
+TEXT_LAYER_MAX_GARBLED = float(os.getenv("PDF_TEXT_LAYER_MAX_GARBLED", 0.1))
+TEXT_LAYER_MIN_COVERAGE = float(os.getenv("PDF_TEXT_LAYER_MIN_COVERAGE", 0.02))
+TEXT_LAYER_MAX_IMAGE_COVERAGE = float(os.getenv("PDF_TEXT_LAYER_MAX_IMAGE_COVERAGE", 0.5))
+# 替换字符、私用区、未分配码位、控制字符：缺少ToUnicode映射的字体提取出的典型乱码
+_GARBLED_CATEGORIES = {"Co", "Cn", "Cc", "Cs"}
+# 无法映射到Unicode的字形提取为替换字符（而非CID值），便于识别乱码
+_TEXT_LAYER_FLAGS = fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_CID_FOR_UNKNOWN_UNICODE
+# PDF对象中的间接引用（"12 0 R"）与指向父节点的/Parent引用
+_XREF_REFERENCE = re.compile(r"(\d+) \d+ R\b")
+_PARENT_REFERENCE = re.compile(r"/Parent\s+\d+ \d+ R")
+
+
+# JPEG未声明分辨率时按96dpi换算页面尺寸（与MuPDF打开图片时的约定一致）
+JPEG_DEFAULT_DPI = 96
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_JPEG_COLORSPACES = {1: b"/DeviceGray", 3: b"/DeviceRGB", 4: b"/DeviceCMYK"}
+
+
+def _jpeg_info(data):
+    """
+    只解析JPEG头部，不解码像素
+    :return: (宽, 高, 通道数, 水平dpi, 垂直dpi)
+    """
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("不是有效的JPEG数据")
+    xdpi = ydpi = JPEG_DEFAULT_DPI
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("JPEG数据损坏")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            pos += 2
+            continue
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        if marker == 0xE0 and data[pos + 4:pos + 9] == b"JFIF\x00":
+            units = data[pos + 11]
+            xd = int.from_bytes(data[pos + 12:pos + 14], "big")
+            yd = int.from_bytes(data[pos + 14:pos + 16], "big")
+            if units in (1, 2) and xd and yd:
+                factor = 1 if units == 1 else 2.54
+                xdpi, ydpi = xd * factor, yd * factor
+        elif marker in _JPEG_SOF_MARKERS:
+            height = int.from_bytes(data[pos + 5:pos + 7], "big")
+            width = int.from_bytes(data[pos + 7:pos + 9], "big")
+            return width, height, data[pos + 9], xdpi, ydpi
+        pos += 2 + length
+    raise ValueError("JPEG数据中未找到图像尺寸")
+
+
+class JpegPdfWriter(object):
+    """
+    将JPEG逐页写入PDF：JPEG数据以DCTDecode原样嵌入，不重新编码；
+    每页写完即落盘，内存占用不随页数增长
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.pos = 0
+        # 1号对象为Catalog，2号对象为Pages，在close时写出
+        self.offsets = [None, None]
+        self.page_ids = []
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+
+    def _write(self, data):
+        self.fp.write(data)
+        self.pos += len(data)
+
+    def _reserve(self):
+        self.offsets.append(None)
+        return len(self.offsets)
+
+    def _write_obj(self, obj_id, body, stream=None):
+        self.offsets[obj_id - 1] = self.pos
+        self._write(b"%d 0 obj\n" % obj_id + body)
+        if stream is not None:
+            self._write(b"\nstream\n")
+            self._write(stream)
+            self._write(b"\nendstream")
+        self._write(b"\nendobj\n")
+
+    def add_page(self, jpeg):
+        width, height, components, xdpi, ydpi = _jpeg_info(jpeg)
+        if components not in _JPEG_COLORSPACES:
+            raise ValueError(f"不支持的JPEG通道数: {components}")
+        page_w = width * 72 / xdpi
+        page_h = height * 72 / ydpi
+        image_id, content_id, page_id = self._reserve(), self._reserve(), self._reserve()
+
+        image_dict = (b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s "
+                      b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d" %
+                      (width, height, _JPEG_COLORSPACES[components], len(jpeg)))
+        if components == 4:
+            # Adobe CMYK JPEG按惯例为反相存储
+            image_dict += b" /Decode [1 0 1 0 1 0 1 0]"
+        self._write_obj(image_id, image_dict + b" >>", jpeg)
+
+        content = b"q %.4f 0 0 %.4f 0 0 cm /Im0 Do Q" % (page_w, page_h)
+        self._write_obj(content_id, b"<< /Length %d >>" % len(content), content)
+        self._write_obj(page_id, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.4f %.4f] "
+                                 b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>" %
+                        (page_w, page_h, image_id, content_id))
+        self.page_ids.append(page_id)
+
+    def close(self):
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self.page_ids)
+        self._write_obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids)))
+        self._write_obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref_pos = self.pos
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(self.offsets) + 1))
+        self._write(b"".join(b"%010d 00000 n \n" % offset for offset in self.offsets))
+        self._write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" %
+                    (len(self.offsets) + 1, xref_pos))
+
 
 def pic_to_pdf(images):
-    doc = fitz.open()
-    for img in images:
-        img_doc = fitz.open("jpg", img)
-        pdf_bytes = img_doc.convert_to_pdf()
-        img_pdf = fitz.open("pdf", pdf_bytes)
-        doc.insert_pdf(img_pdf)
+    buffer = BytesIO()
+    with JpegPdfWriter(buffer) as writer:
+        for img in images:
+            writer.add_page(img)
+    return buffer.getvalue()
 
-    return doc.write()
 
+class PdfTextLayer(NamedTuple):
+    """
+    PDF单页文字层的判定结果
+    usable为True时lines可直接作为识别结果，否则reason说明需要OCR的原因：
+    no_text（无文字层）、garbled（乱码）、image（以图片为主，如扫描件）、low_coverage（文字覆盖率过低）
+    """
+    page: int
+    lines: List[str]
+    usable: bool
+    reason: str
+    chars: int
+    garbled_ratio: float
+    text_coverage: float
+    image_coverage: float
+    seconds: float
+    # 渲染后页面中文字需逆时针旋转的角度（0/90/180/270，与RapidOrientation的结果含义一致），无文字时为None
+    angle: Optional[int] = None
 
-def pdf_to_pic(pdf, ratio=50):
+
+def text_layer_enabled():
+    """是否优先使用PDF自带的文字层，可通过PDF_TEXT_LAYER=0关闭"""
+    return os.getenv("PDF_TEXT_LAYER", "1") == "1"
+
+
+def _garbled_ratio(chars):
+    if not chars:
+        return 0.0
+    garbled = 0
+    for c in chars:
+        # 拉丁-1补充字母在中文文档中多为编码错误产生的乱码（如“ÐÂÎÅ”）
+        if c == "\ufffd" or unicodedata.category(c) in _GARBLED_CATEGORIES or "\u00c0" <= c <= "\u00ff":
+            garbled += 1
+    return garbled / len(chars)
+
+
+def _covered_ratio(rects, page_rect):
+    # 各矩形与页面相交面积之和占页面面积的比例（重叠部分重复计算，结果截断到1）
+    page_area = abs(page_rect)
+    if not page_area:
+        return 0.0
+    area = sum(abs(fitz.Rect(rect) & page_rect) for rect in rects)
+    return min(1.0, area / page_area)
+
+
+def _text_angle(page, line_dirs):
+    # 文字方向按字符数加权取多数，叠加页面自身的旋转（/Rotate为顺时针显示）
+    if not line_dirs:
+        return None
+    votes = Counter()
+    for (dx, dy), chars in line_dirs:
+        votes[round(math.degrees(math.atan2(dy, dx)) / 90) * 90 % 360] += chars
+    return (votes.most_common(1)[0][0] + page.rotation) % 360
+
+
+def classify_text_layer(page) -> PdfTextLayer:
+    """
+    判断PDF页面的文字层能否代替OCR：统计有效字符数、乱码字符比例、文字与图片的页面覆盖率
+    :param page: fitz页面
+    :return: PdfTextLayer
+    """
+    start = time.perf_counter()
+    text = page.get_text("dict", flags=_TEXT_LAYER_FLAGS, sort=True)
+    lines = []
+    line_rects = []
+    line_dirs = []
+    for block in text["blocks"]:
+        for line in block.get("lines", ()):
+            content = "".join(span["text"] for span in line["spans"]).strip()
+            if content:
+                lines.append(content)
+                line_rects.append(line["bbox"])
+                line_dirs.append((line["dir"], len(content)))
+    chars = [c for line in lines for c in line if not c.isspace()]
+    garbled = _garbled_ratio(chars)
+    text_coverage = _covered_ratio(line_rects, page.rect)
+    image_coverage = _covered_ratio([info["bbox"] for info in page.get_image_info()], page.rect)
+
+    if len(chars) < TEXT_LAYER_MIN_CHARS:
+        reason = "no_text"
+    elif garbled > TEXT_LAYER_MAX_GARBLED:
+        reason = "garbled"
+    elif image_coverage >= TEXT_LAYER_MAX_IMAGE_COVERAGE:
+        reason = "image"
+    elif text_coverage < TEXT_LAYER_MIN_COVERAGE:
+        reason = "low_coverage"
+    else:
+        reason = ""
+    return PdfTextLayer(page.number, lines, not reason, reason, len(chars), garbled, text_coverage, image_coverage,
+                        time.perf_counter() - start, _text_angle(page, line_dirs))
+
+
+def classify_pdf_text_layers(pdf) -> List[PdfTextLayer]:
+    """
+    逐页判定PDF的文字层，未开启文字层优先（见text_layer_enabled）时所有页面均判定为需要OCR
+    :param pdf: PDF文件的字节数据
+    :return: 按页码排列的PdfTextLayer列表
+    """
+    doc = fitz.open("pdf", pdf)
+    try:
+        if not text_layer_enabled():
+            return [PdfTextLayer(pg, [], False, "disabled", 0, 0.0, 0.0, 0.0, 0.0) for pg in range(doc.page_count)]
+        return [classify_text_layer(page) for page in doc]
+    finally:
+        doc.close()
+
+
+def select_pdf_pages(pdf, pages):
+    """
+    抽取PDF的部分页面组成新的PDF
+    :param pdf: PDF文件的字节数据
+    :param pages: 页码列表（从0开始）
+    :return: 新PDF的字节数据
+    """
+    doc = fitz.open("pdf", pdf)
+    try:
+        doc.select(list(pages))
+        return doc.tobytes(garbage=1)
+    finally:
+        doc.close()
+
+
+def iter_pdf_pages(pdf, zoom=PDF_ZOOM, max_width=None, jpeg_quality=None, workers=None, pages=None):
+    """
+    逐页渲染PDF，按页码顺序流式返回
+    先在当前进程逐页渲染，按实测的单页耗时估算剩余页面的串行耗时，分给多个进程节省的时间超过进程池启动开销时
+    （见WorkerPool.parallel_worthwhile），剩余页面交给共享进程池渲染；页数少或页面简单时始终在当前进程完成
+    :param pdf: PDF文件的字节数据
+    :param zoom: 渲染缩放比例
+    :param max_width: 页面宽度上限，超出时等比缩小；None表示不缩放
+    :param jpeg_quality: 指定时返回JPEG字节，否则返回RGB格式的numpy数组
+    :param workers: 渲染进程数，默认读取PDF_RENDER_WORKERS环境变量或CPU核数，为1时不使用进程池
+    :param pages: 只渲染这些页码（按给定顺序），默认渲染全部页面
+    :return: (页码, 页面图像) 生成器
+    """
     doc = fitz.open("pdf", pdf)
-    fitz.paper_size("a4")
-    pages_count = doc.page_count
-    pic_list = []
-
-    for pg in range(pages_count):
-        page = doc[pg]
-        zoom_x = 1.33333333
-        zoom_y = 1.33333333
-        mat = fitz.Matrix(zoom_x, zoom_y)
-        pm = page.get_pixmap(matrix=mat, dpi=None, colorspace='rgb', alpha=False)
-        img_bits = pm.tobytes()
-        np_array = np.frombuffer(img_bits, np.uint8)
-        image = cv2.imdecode(np_array, cv2.IMREAD_COLOR)
-        resize_w = 1024 if image.shape[1] > 1024 else image.shape[1]
-        dsize = (resize_w, int(resize_w * image.shape[0] / image.shape[1]))
-        image = cv2.resize(image, dsize=dsize, fx=1, fy=1, interpolation=cv2.INTER_LINEAR)
-        params = [cv2.IMWRITE_JPEG_QUALITY, ratio]  # ratio:0~100
-        image = cv2.imencode(".jpg", image, params)[1]
-        image = (np.array(image)).tobytes()
-        pic_list.append(image)
-    return pic_list
+    page_list = list(range(doc.page_count)) if pages is None else list(pages)
+    pages_count = len(page_list)
+    if workers is None:
+        workers = int(os.getenv("PDF_RENDER_WORKERS", os.cpu_count() or 1))
+    workers = min(workers, pages_count)
+
+    done = 0
+    try:
+        while done < pages_count:
+            pg = page_list[done]
+            start = time.perf_counter()
+            image = render_page(doc, pg, zoom, max_width, jpeg_quality)
+            elapsed = time.perf_counter() - start
+            yield pg, image
+            done += 1
+            remaining = pages_count - done
+            if (workers > 1 and remaining >= PARALLEL_MIN_PAGES
+                    and parallel_worthwhile(elapsed * remaining, workers, "pdf_render")):
+                break
+    finally:
+        doc.close()
+    if done == pages_count:
+        return
+
+    # PDF只写出一次临时文件，子进程按路径打开并缓存，任务只传页码
+    rest = page_list[done:]
+    with shared_file(pdf, ".pdf") as path:
+        results = imap_ordered(render_page_task, [(path, pg, zoom, max_width, jpeg_quality) for pg in rest],
+                               workers, "pdf_render")
+        try:
+            yield from zip(rest, results)
+        finally:
+            results.close()
+
+
+def iter_pdf_pic(pdf, ratio=50, workers=None):
+    for _, image in iter_pdf_pages(pdf, max_width=1024, jpeg_quality=ratio, workers=workers):
+        yield image
+
+
+def pdf_to_pic(pdf, ratio=50):
+    return list(iter_pdf_pic(pdf, ratio))
+
+
+def _page_raw_size(doc, pg):
+    # 页面引用的全部对象（内容流、图片、字体及字体文件、表单等）的原始字节数，用于判断该页是否本来就足够小；
+    # 不沿/Parent向上，也不进入其他页面（如链接注释的跳转目标）
+    page_xref = doc[pg].xref
+    seen = {page_xref}
+    stack = [page_xref]
+    size = 0
+    while stack:
+        xref = stack.pop()
+        obj = doc.xref_object(xref, compressed=True)
+        size += len(obj)
+        if doc.xref_is_stream(xref):
+            size += len(doc.xref_stream_raw(xref))
+        for ref in _XREF_REFERENCE.findall(_PARENT_REFERENCE.sub("", obj)):
+            ref = int(ref)
+            if ref in seen or not 0 < ref < doc.xref_length():
+                continue
+            seen.add(ref)
+            if doc.xref_get_key(ref, "Type") == ("name", "/Page"):
+                continue
+            stack.append(ref)
+    return size
+
+
+def _scale_image(image, scale):
+    if scale >= 1.0:
+        return image
+    dsize = (max(1, int(image.shape[1] * scale)), max(1, int(image.shape[0] * scale)))
+    return cv2.resize(image, dsize=dsize, interpolation=cv2.INTER_AREA)
+
+
+def _encode_jpeg(image, quality):
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def _estimate_size(images, raw_sizes, sample, quality):
+    # 按抽样页的编码大小推算全文档大小，已足够小的页按原始大小计
+    sampled = sum(min(len(_encode_jpeg(images[pg], quality)), raw_sizes[pg]) for pg in sample)
+    return sampled * len(images) / len(sample) + COMPRESS_PAGE_OVERHEAD * len(images)
+
+
+def _search_quality(images, raw_sizes, sample, target_size, min_quality, max_quality):
+    # 二分查找估算大小不超过目标的最高质量，最低质量也不满足时返回None
+    if _estimate_size(images, raw_sizes, sample, min_quality) > target_size:
+        return None
+    lo, hi = min_quality, max_quality
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if _estimate_size(images, raw_sizes, sample, mid) <= target_size:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _assemble_pdf(src, images, raw_sizes, quality):
+    with fitz.open() as doc:
+        for pg, image in enumerate(images):
+            jpeg = _encode_jpeg(image, quality)
+            if len(jpeg) >= raw_sizes[pg]:
+                doc.insert_pdf(src, from_page=pg, to_page=pg)
+            else:
+                page = doc.new_page(width=src[pg].rect.width, height=src[pg].rect.height)
+                page.insert_image(page.rect, stream=jpeg)
+        return doc.tobytes(garbage=3, deflate=True)
+
+
+def compress_pdf(pdf, target_size, max_width=1024, min_quality=COMPRESS_MIN_QUALITY,
+                 max_quality=COMPRESS_MAX_QUALITY, min_scale=0.5, workers=None):
+    """
+    将PDF压缩到目标大小以内：每页只渲染一次并缓存像素，通过抽样估算+二分查找确定JPEG质量，
+    最低质量仍超出时逐级降低分辨率；原本就比JPEG更小的页面原样保留
+    :param pdf: PDF文件的字节数据
+    :param target_size: 目标大小（字节）
+    :param max_width: 渲染页面的宽度上限
+    :param min_quality: JPEG质量下限
+    :param max_quality: JPEG质量上限
+    :param min_scale: 分辨率最低缩放比例
+    :param workers: 渲染进程数，见iter_pdf_pages
+    :return: 压缩后的PDF字节数据；无法达到目标时返回能得到的最小结果；没有页面时原样返回
+    """
+    with fitz.open("pdf", pdf) as src:
+        if src.page_count == 0:
+            return pdf
+        raw_sizes = [_page_raw_size(src, pg) for pg in range(src.page_count)]
+        pages = [cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+                 for _, image in iter_pdf_pages(pdf, max_width=max_width, workers=workers)]
+        sample = range(0, len(pages), max(1, len(pages) // COMPRESS_SAMPLE_PAGES))
+
+        scale = 1.0
+        while True:
+            images = [_scale_image(image, scale) for image in pages]
+            quality = _search_quality(images, raw_sizes, sample, target_size, min_quality, max_quality)
+            if quality is None:
+                if scale > min_scale:
+                    scale = max(min_scale, scale * 0.75)
+                    continue
+                quality = min_quality
+            pdf_bits = _assemble_pdf(src, images, raw_sizes, quality)
+            # 估算存在误差，以实际大小为准逐步降低质量
+            while len(pdf_bits) > target_size and quality > min_quality:
+                quality = max(min_quality, quality - 5)
+                pdf_bits = _assemble_pdf(src, images, raw_sizes, quality)
+            if len(pdf_bits) <= target_size or scale <= min_scale:
+                return pdf_bits
+            scale = max(min_scale, scale * 0.75)
@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 资源状态
+STATUS_LOADING = "loading"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+class ResourceRegistry:
+    """
+    进程级资源注册表：每个资源在进程内只创建一次，供所有Streamlit会话与线程共享
+    同一资源并发获取时只有一个线程执行创建，其余线程等待其结果；创建失败后下次获取会重试
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resources = {}
+        self._locks = {}
+        self._states = {}
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        获取资源，不存在时调用factory创建
+        :param key: 资源键
+        :param factory: 创建资源的无参函数
+        """
+        if key in self._resources:
+            return self._resources[key]
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key in self._resources:
+                return self._resources[key]
+            started = time.time()
+            self._states[key] = {"status": STATUS_LOADING, "started_at": started}
+            try:
+                resource = factory()
+            except Exception as e:
+                self._states[key] = {"status": STATUS_FAILED, "error": str(e), "started_at": started}
+                raise
+            self._resources[key] = resource
+            self._states[key] = {"status": STATUS_READY, "started_at": started,
+                                 "load_seconds": round(time.time() - started, 3)}
+            return resource
+
+    def warm_up(self, key: Hashable, factory: Callable[[], Any]) -> threading.Thread:
+        """在后台线程中提前创建资源，不阻塞调用方"""
+        thread = threading.Thread(target=self._warm_up, args=(key, factory), daemon=True,
+                                  name=f"warm-up-{key}")
+        thread.start()
+        return thread
+
+    def _warm_up(self, key, factory):
+        try:
+            self.get(key, factory)
+        except Exception as e:
+            print(f"资源预热失败 {key}: {e}")
+
+    def is_ready(self, key: Hashable) -> bool:
+        return key in self._resources
+
+    def health(self) -> Dict[str, Dict]:
+        """各资源的状态（loading / ready / failed）、加载耗时与错误信息"""
+        return {str(key): dict(state) for key, state in self._states.items()}
+
+    def release(self, key: Hashable):
+        """移除资源，下次获取时重新创建"""
+        with self._lock:
+            self._resources.pop(key, None)
+            self._states.pop(key, None)
+
+
+registry = ResourceRegistry()
+
+
+def get_qdrant_client(url: str = None):
+    """进程内共享的QdrantClient"""
+    from qdrant_client import QdrantClient
+
+    url = url or os.getenv("QDRANT_URL", "http://localhost:6333")
+    return registry.get(("qdrant", url), lambda: QdrantClient(url=url))
+
+
+def _load_embedding_backend(model_path: str):
+    from service.EmbeddingBackend import create_embedding_backend
+
+    if not model_path:
+        raise ValueError("EMBEDDING_MODEL_PATH环境变量未设置")
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"嵌入模型路径不存在: {model_path}")
+    print(f"正在加载嵌入模型: {model_path}")
+    backend = create_embedding_backend(model_path)
+    print(f"嵌入模型加载成功（后端: {backend.name}）")
+    return backend
+
+
+def get_embedding_backend(model_path: str = None):
+    """进程内共享的嵌入推理后端（模型只加载一次）"""
+    model_path = model_path or os.getenv("EMBEDDING_MODEL_PATH")
+    return registry.get(("embedding", model_path), lambda: _load_embedding_backend(model_path))
+
+
+def get_embedding_cache(model_path: str, dim: int, backend_name: str):
+    """进程内共享的嵌入缓存（内存层在会话间共享）"""
+    from service.EmbeddingCache import create_embedding_cache
+
+    return registry.get(("embedding_cache", model_path, dim, backend_name),
+                        lambda: create_embedding_cache(model_path, dim, backend_name))
+
+
+def get_orientation_engine():
+    """进程内共享的RapidOrientation方向分类引擎（ONNX模型只加载一次，推理会话可多线程并发调用）"""
+    from rapid_orientation import RapidOrientation
+
+    return registry.get(("rapid_orientation",), RapidOrientation)
+
+
+def warm_up_embedding(model_path: str = None) -> threading.Thread:
+    """后台预加载嵌入模型"""
+    model_path = model_path or os.getenv("EMBEDDING_MODEL_PATH")
+    return registry.warm_up(("embedding", model_path), lambda: _load_embedding_backend(model_path))
+
+
+def embedding_ready(model_path: str = None) -> bool:
+    """嵌入模型是否已加载完成"""
+    return registry.is_ready(("embedding", model_path or os.getenv("EMBEDDING_MODEL_PATH")))
@@ -0,0 +1,120 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+import cv2
+import numpy as np
+
+# 分块执行时每块的行数
+ENHANCE_TILE_ROWS = int(os.getenv("ENHANCE_TILE_ROWS", 256))
+# 像素数达到该值时默认分块并行执行
+ENHANCE_TILE_MIN_PIXELS = int(os.getenv("ENHANCE_TILE_MIN_PIXELS", 4_000_000))
+# 分块执行的线程数（OpenCV运算期间释放GIL，线程即可并行）
+ENHANCE_WORKERS = int(os.getenv("ENHANCE_WORKERS", os.cpu_count() or 1))
+# 未锐化掩模的高斯模糊sigma
+UNSHARP_SIGMA = 3.0
+
+_local = threading.local()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ENHANCE_WORKERS, thread_name_prefix="enhance-text")
+        return _executor
+
+
+def _scratch(name: str, shape) -> np.ndarray:
+    """线程内复用的临时缓冲区：宽度相同且行数足够时取其前若干行，不重新分配"""
+    buffers = getattr(_local, "buffers", None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape[1:] != shape[1:] or buffer.shape[0] < shape[0]:
+        buffer = buffers[name] = np.empty(shape, np.uint8)
+    return buffer[:shape[0]]
+
+
+@lru_cache(maxsize=16)
+def _sharpen_kernel(sharpen_strength: float) -> np.ndarray:
+    kernel = np.array([[0, -1, 0],
+                       [-1, 5 * sharpen_strength, -1],
+                       [0, -1, 0]])
+    kernel.flags.writeable = False
+    return kernel
+
+
+def _halo(use_unsharp_mask: bool, sharpen: bool) -> int:
+    # 块上下需要额外读取的行数：高斯核半径（8位图像核大小为round(6σ+1)取奇数）加锐化核半径
+    radius = (int(round(UNSHARP_SIGMA * 6 + 1)) | 1) // 2 if use_unsharp_mask else 0
+    return radius + (1 if sharpen else 0)
+
+
+def _enhance_rows(gray, out, y0, y1, sharpen_strength, contrast_factor, use_unsharp_mask, use_contrast):
+    # 处理[y0, y1)行，结果（二值化前）写入out；读取范围向上下扩展halo行，保证块边界处与整幅处理结果一致
+    sharpen = sharpen_strength > 1.0
+    halo = _halo(use_unsharp_mask, sharpen)
+    top, bottom = max(0, y0 - halo), min(gray.shape[0], y1 + halo)
+    src = gray[top:bottom]
+    shape = src.shape
+
+    work = src
+    # 1. 未锐化掩模技术（核心文字增强）
+    if use_unsharp_mask:
+        blurred = _scratch("blurred", shape)
+        cv2.GaussianBlur(src, (0, 0), UNSHARP_SIGMA, dst=blurred)
+        work = _scratch("work", shape)
+        cv2.addWeighted(src, 1.5, blurred, -0.5, 0, dst=work)
+    # 2. 对比度增强（强化文字与背景差异），在未锐化掩模结果上原地进行
+    if use_contrast:
+        dst = work if work is not src else _scratch("work", shape)
+        cv2.convertScaleAbs(work, dst=dst, alpha=contrast_factor, beta=0)
+        work = dst
+    # 3. 锐化加强（针对小字号文本）
+    if sharpen:
+        sharpened = _scratch("sharpened", shape)
+        cv2.filter2D(work, -1, _sharpen_kernel(sharpen_strength), dst=sharpened)
+        work = sharpened
+    out[y0:y1] = work[y0 - top:y1 - top]
+
+
+def enhance_text(gray: np.ndarray,
+                 sharpen_strength=1.8,
+                 contrast_factor=1.5,
+                 use_unsharp_mask=True,
+                 use_contrast=True,
+                 tiled: Optional[bool] = None,
+                 out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    文字清晰度增强并按Otsu阈值二值化，结果与逐步整幅处理一致（见OcrService.enhance_gray）
+    各步骤在同一块上依次完成、临时缓冲区按线程复用，只分配输出数组；
+    大图按行分块（上下带重叠行）在线程池中并行处理，Otsu阈值仍按整幅直方图计算
+    :param gray: 灰度数组
+    :param tiled: 是否分块并行，默认像素数达到ENHANCE_TILE_MIN_PIXELS时分块
+    :param out: 预先分配的输出数组（与gray同尺寸的uint8），为空时新建
+    :return: 二值化后的灰度数组
+    """
+    height, width = gray.shape[:2]
+    if out is None:
+        out = np.empty((height, width), np.uint8)
+    if tiled is None:
+        tiled = height * width >= ENHANCE_TILE_MIN_PIXELS and height > ENHANCE_TILE_ROWS * 2
+    args = (sharpen_strength, contrast_factor, use_unsharp_mask, use_contrast)
+
+    if tiled:
+        starts = range(0, height, ENHANCE_TILE_ROWS)
+        futures = [_get_executor().submit(_enhance_rows, gray, out, y0, min(height, y0 + ENHANCE_TILE_ROWS), *args)
+                   for y0 in starts]
+        for future in futures:
+            future.result()
+    else:
+        _enhance_rows(gray, out, 0, height, *args)
+
+    # 4. 二值化：按整幅直方图自动计算最佳阈值，原地二值化
+    cv2.threshold(out, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=out)
+    return out
@@ -2,10 +2,15 @@ import os
 import json
 from typing import List, Dict, Any
 
-from qdrant_client import QdrantClient
+import numpy as np
+
 from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
 
 from dotenv import load_dotenv
+
+from service.EmbeddingCache import text_key
+from service.ResourceRegistry import get_qdrant_client, get_embedding_backend, get_embedding_cache
+
 load_dotenv()
 
 class VectorDBService:
@@ -15,8 +20,8 @@ class VectorDBService:
         self.qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
         self.embedding_model_path = os.getenv("EMBEDDING_MODEL_PATH")
         
-        # 初始化向量数据库客户端
-        self.qdrant_client = QdrantClient(url=self.qdrant_url)
+        # 向量数据库客户端（进程内共享）
+        self.qdrant_client = get_qdrant_client(self.qdrant_url)
         
         # 固定知识库名称
         self.collection_name = "Simple_KB"
@@ -24,6 +29,9 @@ class VectorDBService:
         # 固定向量维度为512
         self.vector_size = int(os.getenv("EMBEDDING_MODEL_DIM", 512))
         
+        # 批量编码的每批文本数
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+        
         # 加载嵌入模型
         self._load_embedding_model()
         
@@ -31,38 +39,13 @@ class VectorDBService:
         self._ensure_collection_exists()
     
     def _load_embedding_model(self):
-        """加载嵌入模型（单例模式）"""
-        # 检查是否已经加载过
-        if hasattr(self, '_model_loaded') and self._model_loaded:
-            return
-            
-        try:
-            if not self.embedding_model_path:
-                raise ValueError("EMBEDDING_MODEL_PATH环境变量未设置")
-            
-            # 使用transformers加载预训练模型
-            from transformers import AutoTokenizer, AutoModel
-            import torch
-            
-            print(f"正在加载嵌入模型: {self.embedding_model_path}")
-            
-            # 检查模型路径是否存在
-            if not os.path.exists(self.embedding_model_path):
-                raise FileNotFoundError(f"嵌入模型路径不存在: {self.embedding_model_path}")
-            
-            self.tokenizer = AutoTokenizer.from_pretrained(self.embedding_model_path, trust_remote_code=True)
-            self.embedding_model = AutoModel.from_pretrained(self.embedding_model_path, trust_remote_code=True)
-            
-            # 设置为评估模式
-            self.embedding_model.eval()
-            
-            # 标记为已加载
-            self._model_loaded = True
-            print("嵌入模型加载成功")
-            
-        except Exception as e:
-            print(f"加载嵌入模型失败: {e}")
-            raise e
+        """获取嵌入模型（进程内只加载一次，所有会话共享）"""
+        # 按EMBEDDING_BACKEND选择推理后端（torch / onnx）
+        self.embedding_backend = get_embedding_backend(self.embedding_model_path)
+        
+        # 嵌入缓存按（模型路径、维度、推理后端）区分
+        self.embedding_cache = get_embedding_cache(self.embedding_model_path, self.vector_size,
+                                                   self.embedding_backend.name)
     
     def _ensure_collection_exists(self):
         """确保向量数据库集合存在"""
@@ -103,34 +86,84 @@ class VectorDBService:
     
     def encode_text(self, text: str) -> List[float]:
         """将文本编码为向量"""
-        import torch
+        return self.encode_texts([text])[0]
+    
+    def encode_texts(self, texts: List[str], batch_size: int = None) -> List[List[float]]:
+        """
+        批量将文本编码为向量，已缓存的文本不再经过模型
         
-        # 对文本进行编码
-        inputs = self.tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512)
+        Args:
+            texts: 文本列表
+            batch_size: 每批文本数，默认取EMBEDDING_BATCH_SIZE环境变量（32）
+            
+        Returns:
+            与输入顺序一致的向量列表
+        """
+        if not texts:
+            return []
         
-        with torch.no_grad():
-            outputs = self.embedding_model(**inputs)
-            # 取最后一层隐藏状态的平均值作为句子嵌入
-            embeddings = outputs.last_hidden_state.mean(dim=1).squeeze()
+        embeddings = [None] * len(texts)
+        cache = getattr(self, "embedding_cache", None)
+        if cache is not None:
+            for i, vector in cache.get_many(texts).items():
+                embeddings[i] = vector
         
-        return embeddings.tolist()
+        # 未命中的文本按规范化内容去重后编码
+        pending = {}
+        for i, text in enumerate(texts):
+            if embeddings[i] is None:
+                pending.setdefault(text_key(text), []).append(i)
+        if pending:
+            unique_texts = [texts[ids[0]] for ids in pending.values()]
+            vectors = self._encode_uncached(unique_texts, batch_size or self.embedding_batch_size)
+            for ids, vector in zip(pending.values(), vectors):
+                for i in ids:
+                    embeddings[i] = vector
+            if cache is not None:
+                cache.put_many(unique_texts, vectors)
+        
+        # 缓存与模型输出都是float32数组，只在返回时转换一次为浮点数列表
+        return [vector.tolist() for vector in embeddings]
+    
+    def _encode_uncached(self, texts: List[str], batch_size: int) -> List[np.ndarray]:
+        """调用模型编码，返回float32向量（数组的行）"""
+        # 按长度排序后分批，同一批文本长度相近，减少padding带来的无效计算
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings = [None] * len(texts)
+        
+        for start in range(0, len(order), batch_size):
+            batch_ids = order[start:start + batch_size]
+            pooled = self.embedding_backend.encode_batch([texts[i] for i in batch_ids])
+            for i, vector in zip(batch_ids, pooled.astype(np.float32, copy=False)):
+                embeddings[i] = vector
+        
+        return embeddings
+    
+    def get_embedding_cache_stats(self) -> Dict:
+        """嵌入缓存命中统计"""
+        cache = getattr(self, "embedding_cache", None)
+        return cache.stats() if cache is not None else {}
     
-    def store_document_chunks(self, document_id: str, text_chunks: List[str], metadata: Dict = None) -> int:
-        """存储文档分块到向量数据库"""
+    def store_document_chunks(self, document_id: str, text_chunks: List[str], metadata: Dict = None,
+                              start_index: int = 0, total_chunks: int = None) -> int:
+        """
+        存储文档分块到向量数据库
+        分批写入同一文档时，start_index为本批第一块在文档中的序号，文档总块数待全部写入后由set_total_chunks更新
+        """
         if not text_chunks:
             return 0
         
+        # 批量生成嵌入向量
+        embeddings = self.encode_texts(text_chunks)
+        
         points = []
-        for i, chunk in enumerate(text_chunks):
-            # 生成嵌入向量
-            embedding = self.encode_text(chunk)
-            
+        for i, (chunk, embedding) in enumerate(zip(text_chunks, embeddings)):
             # 创建点结构
             payload = {
                 "text": chunk,
-                "chunk_index": i,
+                "chunk_index": start_index + i,
                 "document_id": document_id,
-                "total_chunks": len(text_chunks)
+                "total_chunks": total_chunks or len(text_chunks)
             }
             
             # 添加额外元数据
@@ -228,6 +261,18 @@ class VectorDBService:
         except Exception as e:
             return {"error": str(e)}
     
+    def set_total_chunks(self, document_id: str, total_chunks: int):
+        """分批写入完成后更新文档所有块的总块数"""
+        self.qdrant_client.set_payload(
+            collection_name=self.collection_name,
+            payload={"total_chunks": total_chunks},
+            points=Filter(must=[FieldCondition(key="document_id", match=MatchValue(value=document_id))])
+        )
+    
+    def streaming_chunker(self, chunk_size: int = 1000, overlap: int = 200) -> "StreamingChunker":
+        """流式分块器，见StreamingChunker"""
+        return StreamingChunker(self, chunk_size, overlap)
+    
     def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
         """
         优化文本分块策略，防止信息割裂
@@ -351,4 +396,37 @@ class VectorDBService:
         # 添加最后一个块
         merged_chunks.append(current_chunk)
         
-        return merged_chunks
\ No newline at end of file
+        return merged_chunks
+
+
+class StreamingChunker:
+    """
+    流式分块：逐段追加文本（如PDF逐页OCR结果），已确定的块立即返回，最后一块在finish时返回；
+    块的切分规则与chunk_text相同；留在缓冲区的最后一块会与后续文本一起重新切分，
+    因此块边界可能与对整个文本一次性调用chunk_text略有差异
+    """
+    
+    def __init__(self, vector_db_service: VectorDBService, chunk_size: int = 1000, overlap: int = 200):
+        self.vector_db_service = vector_db_service
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self._buffer = ""
+    
+    def feed(self, text: str) -> List[str]:
+        """追加一段文本，返回已确定的块"""
+        if not text.strip():
+            return []
+        self._buffer = f"{self._buffer} {text}" if self._buffer else text
+        # 缓冲区积累到两块以上再切分，减少重复分块
+        if len(self._buffer) <= self.chunk_size * 2:
+            return []
+        chunks = self.vector_db_service.chunk_text(self._buffer, self.chunk_size, self.overlap)
+        # 最后一块（含与前一块的重叠部分）留在缓冲区，与后续文本一起切分
+        self._buffer = chunks[-1]
+        return chunks[:-1]
+    
+    def finish(self) -> List[str]:
+        """输入结束，返回剩余的块"""
+        chunks = self.vector_db_service.chunk_text(self._buffer, self.chunk_size, self.overlap) if self._buffer else []
+        self._buffer = ""
+        return chunks
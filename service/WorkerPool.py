@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import tempfile
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from service.ResourceRegistry import registry
+from workers.pdf_render import init_worker
+
+# 共享进程池的进程数
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", os.cpu_count() or 1))
+# 进程池冷启动的耗时估计：spawn子进程并导入cv2、fitz、numpy（见benchmarks/bench_pdf_render.py）
+WORKER_POOL_STARTUP_SECONDS = float(os.getenv("WORKER_POOL_STARTUP_SECONDS", 0.5))
+# 并行至少要节省的时间，抵消任务序列化与进程间传输
+PARALLEL_MIN_SAVING_SECONDS = float(os.getenv("WORKER_POOL_MIN_SAVING_SECONDS", 0.1))
+
+_POOL_KEY = ("worker_pool",)
+# 已在进程池中运行过的任务种类，不再计入首次运行的开销
+_warm_kinds = set()
+
+
+def _create_pool() -> ProcessPoolExecutor:
+    # OpenCV线程池在fork出的子进程中会死锁，统一使用spawn；子进程首次提交任务时启动，之后一直复用
+    return ProcessPoolExecutor(max_workers=WORKER_POOL_SIZE, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_worker)
+
+
+def get_worker_pool() -> ProcessPoolExecutor:
+    """进程内共享的进程池，PDF渲染、印章提取等CPU密集任务共用，避免每次调用都重新启动子进程"""
+    return registry.get(_POOL_KEY, _create_pool)
+
+
+def parallel_worthwhile(serial_seconds: float, workers: int, kind: str, startup_seconds: float = 0.0,
+                        transfer_seconds: float = 0.0) -> bool:
+    """
+    估计的串行耗时分给workers个进程后节省的时间，是否超过进程池启动与任务首次运行的开销
+    :param serial_seconds: 剩余任务在当前进程串行执行的预计耗时（按实测单个任务耗时估算）
+    :param kind: 任务种类，该种类在进程池中运行过后只计传输开销
+    :param startup_seconds: 该种类任务在子进程中首次运行的额外开销（如导入service包）
+    :param transfer_seconds: 每次交给进程池都要付出的开销（如序列化并在子进程中加载共享数据），不因进程池已启动而免除
+    """
+    # 进程数超过CPU核数时并行不会更快，按两者较小值估算
+    workers = min(workers, WORKER_POOL_SIZE, os.cpu_count() or 1)
+    if workers <= 1:
+        return False
+    cost = PARALLEL_MIN_SAVING_SECONDS + transfer_seconds
+    if kind not in _warm_kinds:
+        cost += startup_seconds
+        if not registry.is_ready(_POOL_KEY):
+            cost += WORKER_POOL_STARTUP_SECONDS
+    return serial_seconds * (1 - 1 / workers) > cost
+
+
+def imap_ordered(func, args_list, workers: int, kind: str):
+    """
+    在共享进程池中执行func(*args)，按提交顺序流式返回结果；同时在途的任务不超过2*workers，内存不随任务数增长
+    生成器关闭时取消尚未开始的任务；进程池损坏（子进程异常退出）时丢弃，下次获取时重新创建
+    """
+    pool = get_worker_pool()
+    workers = max(1, min(workers, WORKER_POOL_SIZE))
+    pending = deque()
+    try:
+        for args in args_list:
+            pending.append(pool.submit(func, *args))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+        _warm_kinds.add(kind)
+    except BrokenProcessPool:
+        registry.release(_POOL_KEY)
+        _warm_kinds.clear()
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+@contextmanager
+def shared_file(data: bytes, suffix: str = ""):
+    """
+    数据写入临时文件，子进程按路径读取（大文件不随每个任务重复序列化），退出时删除
+    文件名带随机UUID，子进程按路径缓存的文档不会与之后的文件混淆
+    """
+    fd, path = tempfile.mkstemp(prefix=f"worker-{uuid.uuid4().hex}-", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
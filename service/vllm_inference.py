@@ -6,6 +6,8 @@ from typing import Optional
 import requests
 from openai import OpenAI
 
+from service.ImageCodec import encode_image
+
 def image_inference_with_vllm(
         prompt,
         images=None,
@@ -46,7 +48,7 @@ def image_inference_with_vllm(
     for image in image_list:
         content.append({
             "type": "image_url",
-            "image_url": {"url": PILimage_to_base64(image)},
+            "image_url": {"url": encode_image(image, "vlm").data_url},
         })
     
     # Add text prompt with image placeholders if images exist
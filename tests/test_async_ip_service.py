@@ -0,0 +1,159 @@
+"""AsyncIPService：基于httpx.MockTransport的桩服务，验证取消、截止时间与单接口并发上限"""
+import asyncio
+import importlib
+import io
+import json
+import time
+
+import httpx
+import pytest
+from PIL import Image
+
+from service import ImageCodec
+from service.AsyncIPService import AsyncIPService
+
+URLS = {
+    "IPS_SEAL_PREPROCESS": "http://ips.test/seal",
+    "IPS_INVOICE_PREPROCESS": "http://ips.test/invoice",
+    "IPS_IDCARD_PREPROCESS": "http://ips.test/idcard",
+    "IPS_BIZLIC_PREPROCESS": "http://ips.test/bizlic",
+    "IPS_CARD_DET": "http://ips.test/card_det",
+}
+
+
+@pytest.fixture(autouse=True)
+def ips_env(monkeypatch):
+    for name, url in URLS.items():
+        monkeypatch.setenv(name, url)
+    monkeypatch.setenv("HTTP_ENDPOINT_CONCURRENCY", "2")
+    ImageCodec.clear_cache()
+
+
+@pytest.fixture
+def image_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 30, 30)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class StubServer:
+    """按路径设定响应延迟，记录每个路径的请求体、最大并发数、完成与被取消的请求数"""
+
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.payloads = {}
+        self.active = {}
+        self.max_active = {}
+        self.completed = []
+        self.cancelled = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        self.payloads.setdefault(path, []).append(json.loads(request.content))
+        self.active[path] = self.active.get(path, 0) + 1
+        self.max_active[path] = max(self.max_active.get(path, 0), self.active[path])
+        try:
+            await asyncio.sleep(self.delays.get(path, 0.01))
+        except asyncio.CancelledError:
+            self.cancelled.append(path)
+            raise
+        finally:
+            self.active[path] -= 1
+        self.completed.append(path)
+        return httpx.Response(200, json=[{"path": path}])
+
+    def service(self):
+        return AsyncIPService(httpx.AsyncClient(transport=httpx.MockTransport(self)))
+
+
+def test_per_endpoint_concurrency_limit(image_bytes):
+    server = StubServer({"/seal": 0.05, "/idcard": 0.05})
+
+    async def run():
+        async with server.service() as ips:
+            calls = [ips.seal_preprocess(image_bytes) for _ in range(6)]
+            calls += [ips.idcard_preprocess(image_bytes) for _ in range(6)]
+            return await asyncio.gather(*calls)
+
+    results = asyncio.run(run())
+    assert len(results) == 12
+    # 每个接口地址同时在途的请求不超过HTTP_ENDPOINT_CONCURRENCY，不同接口互不占用名额
+    assert server.max_active == {"/seal": 2, "/idcard": 2}
+
+
+def test_deadline_cancels_slow_endpoint(image_bytes):
+    server = StubServer({"/seal": 5.0, "/idcard": 0.01})
+
+    async def run():
+        async with server.service() as ips:
+            return await ips.preprocess_many(image_bytes, ["seal", "idcard"], deadline=0.2)
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    assert time.perf_counter() - start < 2.0
+    assert results["idcard"] == [{"path": "/idcard"}]
+    assert isinstance(results["seal"], asyncio.TimeoutError)
+    assert server.cancelled == ["/seal"]
+
+
+def test_single_call_deadline(image_bytes):
+    server = StubServer({"/bizlic": 5.0})
+
+    async def run():
+        async with server.service() as ips:
+            await ips.bizlic_preprocess(image_bytes, deadline=0.1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+    assert server.cancelled == ["/bizlic"]
+
+
+def test_caller_cancellation_cancels_requests(image_bytes):
+    server = StubServer({"/seal": 5.0, "/idcard": 5.0, "/bizlic": 5.0})
+
+    async def run():
+        async with server.service() as ips:
+            task = asyncio.ensure_future(ips.preprocess_many(image_bytes))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(run())
+    assert server.completed == []
+    assert sorted(server.cancelled) == ["/bizlic", "/idcard", "/seal"]
+
+
+def test_preprocess_many_encodes_once_and_defaults_invoice_file_type(image_bytes, monkeypatch):
+    server = StubServer()
+    encoded = []
+    original = ImageCodec._encode_bytes
+    monkeypatch.setattr(ImageCodec, "_encode_bytes", lambda *args: encoded.append(1) or original(*args))
+
+    async def run():
+        async with server.service() as ips:
+            return await ips.preprocess_many(image_bytes, ["invoice", "seal", "card_det"])
+
+    results = asyncio.run(run())
+    assert results["invoice"] == [{"path": "/invoice"}]
+    assert server.payloads["/invoice"][0]["file_type"] == "image"
+    assert len(encoded) == 1
+    images = {payloads[0]["image_base64"] for payloads in server.payloads.values()}
+    assert len(images) == 1
+
+
+def test_encoding_past_deadline_reported_per_endpoint(image_bytes, monkeypatch):
+    server = StubServer()
+    ips_module = importlib.import_module("service.AsyncIPService")
+    encode_once = ips_module._encode_once
+    monkeypatch.setattr(ips_module, "_encode_once", lambda data: time.sleep(0.5) or encode_once(data))
+
+    async def run():
+        async with server.service() as ips:
+            return await ips.preprocess_many(image_bytes, ["seal", "idcard"], deadline=0.1)
+
+    results = asyncio.run(run())
+    # 编码超时与接口超时的返回形式相同，请求没有发出
+    assert sorted(results) == ["idcard", "seal"]
+    assert all(isinstance(error, asyncio.TimeoutError) for error in results.values())
+    assert server.payloads == {}
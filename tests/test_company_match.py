@@ -0,0 +1,85 @@
+"""
+公司名规范化：地区只在留下核心字号时去除；核心字号为空的查询按原始公司名匹配
+索引检索：结果与对全部公司名计算编辑距离后取前k个完全一致
+"""
+import Levenshtein
+import numpy as np
+import pytest
+
+from service.CompanyMatchService import CompanyMatchService
+from service.CompanyRegistry import CompanyRegistry
+from service.CompanyNameNormalizer import normalize_company_name
+
+
+@pytest.mark.parametrize("name, region, core, legal_form", [
+    ("北京市华瑞科技（上海）有限公司", "北京市/上海", "华瑞科技", "有限公司"),
+    ("上海市长宁区华瑞科技有限公司", "上海市长宁区", "华瑞科技", "有限公司"),
+    # 去除地区后核心为空时保留地区作为核心
+    ("北京有限公司", "", "北京", "有限公司"),
+    ("北京市朝阳区有限公司", "北京市", "朝阳区", "有限公司"),
+    ("北京市", "", "北京市", ""),
+    # 只有组织形式
+    ("有限公司", "", "", "有限公司"),
+    ("集团公司", "", "", "集团公司"),
+])
+def test_normalize_keeps_non_empty_core(name, region, core, legal_form):
+    normalized = normalize_company_name(name)
+    assert (normalized.region, normalized.core, normalized.legal_form) == (region, core, legal_form)
+
+
+def test_empty_core_query_falls_back_to_raw_names():
+    companies = ["北京华瑞科技有限公司", "上海有限公司", "有限公司", "深圳市华瑞科技有限公司", "股份有限公司"]
+    normalized = CompanyMatchService(normalize=True)
+    normalized.add_companies(companies)
+    raw = CompanyMatchService(normalize=False)
+    raw.add_companies(companies)
+
+    assert normalized.search_companies("有限公司", 3) == raw.search_companies("有限公司", 3)
+    assert normalized.search_companies("有限公司", 1)[0]["company_name"] == "有限公司"
+    # 有核心字号的查询仍按核心字号匹配
+    assert normalized.search_companies("华瑞科技", 2)[0]["core_name"] == "华瑞科技"
+
+
+# 小字母表：并列的距离多，大部分字符与二元组出现在超过STOP_GRAM_RATIO的公司名中（不查倒排表）
+ALPHABETS = ["ab", "abc", "甲乙丙丁", "华瑞科技有限公司"]
+
+
+def random_names(rng, alphabet, count, max_len=8):
+    return ["".join(rng.choice(list(alphabet), int(rng.integers(1, max_len + 1)))) for _ in range(count)]
+
+
+def linear_top_k(service, query, names, limit):
+    """全量匹配：对每个公司名计算编辑距离后取前limit个"""
+    return service._top_k(query, ((name, Levenshtein.distance(query, name)) for name in names), limit)
+
+
+@pytest.mark.parametrize("alphabet", ALPHABETS)
+def test_indexed_search_matches_linear_scan(alphabet):
+    rng = np.random.default_rng(len(alphabet))
+    for case in range(75):
+        names = random_names(rng, alphabet, int(rng.integers(1, 60)))
+        # 部分公司名带相同的高频后缀
+        names += [name + "有限公司" for name in random_names(rng, alphabet, int(rng.integers(0, 20)))]
+        service = CompanyMatchService(normalize=False)
+        service.add_companies(names)
+        for query in random_names(rng, alphabet + "x", 4, max_len=10) + [names[0]]:
+            limit = int(rng.integers(1, 12))
+            assert service.search_companies(query, limit) == linear_top_k(service, query, service.companies, limit), \
+                (case, query, limit)
+
+
+def test_registry_tombstones_excluded(tmp_path):
+    rng = np.random.default_rng(7)
+    registry = CompanyRegistry(str(tmp_path / "registry"), normalize=False)
+    for batch in range(3):
+        registry.add(random_names(rng, "甲乙丙", 40))
+    names = list(registry.load().live_names())
+    registry.remove(names[::3])
+    service = CompanyMatchService()
+    service.load_registry(registry)
+    live = list(registry.load().live_names())
+    assert 0 < len(live) < len(names)
+    for query in random_names(rng, "甲乙丙丁", 60, max_len=10) + names[::3][:10]:
+        limit = int(rng.integers(1, 12))
+        results = service.search_companies(query, limit)
+        assert results == linear_top_k(service, query, live, limit), (query, limit)
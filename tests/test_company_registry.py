@@ -0,0 +1,57 @@
+"""CompanyRegistry：同一目录的多个实例、多个进程并发写入不丢数据，清理旧版本时保留仍在使用的版本"""
+import gc
+import multiprocessing
+import os
+import threading
+
+from service.CompanyRegistry import CompanyRegistry
+
+BATCHES = 12
+BATCH_SIZE = 50
+
+
+def add_batches(root, prefix):
+    """每次新建实例，模拟页面每次重新运行都创建CompanyRegistry"""
+    for batch in range(BATCHES):
+        CompanyRegistry(root, normalize=False).add(f"{prefix}公司{batch}-{i}" for i in range(BATCH_SIZE))
+
+
+def test_concurrent_writers_from_threads_and_processes(tmp_path):
+    root = str(tmp_path / "registry")
+    CompanyRegistry(root, normalize=False)
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=add_batches, args=(root, f"进程{n}")) for n in range(2)]
+    threads = [threading.Thread(target=add_batches, args=(root, f"线程{n}")) for n in range(3)]
+    for worker in processes + threads:
+        worker.start()
+    for worker in processes + threads:
+        worker.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    snapshot = CompanyRegistry(root).load()
+    names = list(snapshot.live_names())
+    assert len(names) == len(set(names)) == 5 * BATCHES * BATCH_SIZE
+    # 每次追加生成一个版本，段数过多时另有合并生成的版本
+    assert snapshot.version >= 5 * BATCHES
+
+
+def test_pinned_version_survives_garbage_collection(tmp_path):
+    root = str(tmp_path / "registry")
+    registry = CompanyRegistry(root, keep_versions=1, normalize=False)
+    registry.add(["甲公司", "乙公司"])
+    snapshot = registry.load()
+    pinned = snapshot.version
+    for batch in range(4):
+        registry.add([f"丙公司{batch}"])
+
+    # 快照所在版本及其段仍在，可以重新加载（如批量匹配的子进程按版本号加载）
+    assert list(snapshot.companies) == ["甲公司", "乙公司"]
+    assert list(registry.load(pinned).companies) == ["甲公司", "乙公司"]
+    assert os.path.exists(os.path.join(root, "versions", f"{pinned:06d}.json"))
+
+    del snapshot
+    gc.collect()
+    registry.add(["丁公司"])
+    assert not os.path.exists(os.path.join(root, "versions", f"{pinned:06d}.json"))
+    assert sorted(os.listdir(os.path.join(root, "segments"))) == sorted(
+        segment_id for segment_id in registry.load().segment_ids)
@@ -0,0 +1,99 @@
+"""CompanyMatchService.search_many：按输入顺序返回、相同查询只计算一次、空白查询返回空结果，进程池结果与当前进程一致"""
+import importlib
+
+import numpy as np
+import pytest
+
+from service.CompanyMatchService import CompanyMatchService
+from service.CompanyRegistry import CompanyRegistry
+
+match_module = importlib.import_module("service.CompanyMatchService")
+
+CHARS = "华瑞恒信达通宏泰鑫源盛兴联创新远安康德利嘉和"
+FORMS = ["有限公司", "股份有限公司", "集团有限公司"]
+
+
+def company_names(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [f"{['北京', '上海', '深圳'][i % 3]}市"
+            + "".join(rng.choice(list(CHARS), int(rng.integers(2, 5)))) + f"科技{FORMS[i % len(FORMS)]}"
+            for i in range(count)]
+
+
+@pytest.fixture(scope="module")
+def names():
+    return company_names(400)
+
+
+@pytest.fixture(params=[True, False], ids=["normalized", "raw"])
+def service(request, names):
+    service = CompanyMatchService(normalize=request.param)
+    service.add_companies(names)
+    return service
+
+
+@pytest.fixture
+def always_parallel(monkeypatch):
+    """第一块之后即交给进程池，记录交给进程池的查询"""
+    pooled = []
+
+    def imap_ordered(func, args_list, workers, kind):
+        args_list = list(args_list)
+        pooled.extend(query for _, chunk, _ in args_list for query in chunk)
+        return pool_module.imap_ordered(func, args_list, workers, kind)
+
+    pool_module = importlib.import_module("service.WorkerPool")
+    monkeypatch.setattr(match_module, "parallel_worthwhile", lambda *args: True)
+    monkeypatch.setattr(match_module, "imap_ordered", imap_ordered)
+    monkeypatch.setattr(match_module, "SEARCH_CHUNK_SIZE", 4)
+    return pooled
+
+
+def batch_queries(names):
+    rng = np.random.default_rng(1)
+    queries = [names[i][:-2] + "公司" for i in rng.integers(len(names), size=20)] + company_names(10, seed=2)
+    # 重复的查询与空白、两端带空白的查询
+    return queries + queries[:5] + ["", None, "   ", f"  {names[3]}  ", names[3]]
+
+
+def test_order_dedup_and_blank_queries(service, names, monkeypatch):
+    calls = []
+    search = service.search_companies
+    monkeypatch.setattr(service, "search_companies", lambda query, limit: calls.append(query) or search(query, limit))
+    queries = batch_queries(names)
+    output = list(service.search_many(queries, limit=3, workers=1))
+
+    expected_keys = [query.strip() if query else "" for query in queries]
+    assert [query for query, _ in output] == expected_keys
+    assert sorted(calls) == sorted(set(query for query in expected_keys if query))
+    for query, results in output:
+        assert results == (search(query, 3) if query else [])
+
+
+def test_parallel_matches_serial(service, names, always_parallel):
+    queries = batch_queries(names)
+    serial = list(service.search_many(queries, limit=5, workers=1))
+    assert always_parallel == []
+    pooled = list(service.search_many(queries, limit=5, workers=2))
+    assert always_parallel
+    assert pooled == serial
+
+
+def test_parallel_with_registry_snapshot(tmp_path, names, always_parallel):
+    registry = CompanyRegistry(str(tmp_path / "registry"), normalize=True)
+    registry.add(names)
+    registry.remove(names[::4])
+    service = CompanyMatchService()
+    service.load_registry(registry)
+    queries = batch_queries(names)
+    serial = list(service.search_many(queries, limit=5, workers=1))
+    pooled = list(service.search_many(queries, limit=5, workers=2))
+    assert always_parallel
+    assert pooled == serial
+    assert all(result["company_name"] not in names[::4] for _, results in pooled for result in results)
+
+
+def test_small_batch_stays_in_process(service, names, monkeypatch):
+    # 单条查询耗时远小于子进程启动开销，不使用进程池
+    monkeypatch.setattr(match_module, "imap_ordered", None)
+    assert len(list(service.search_many(batch_queries(names), workers=4))) == len(batch_queries(names))
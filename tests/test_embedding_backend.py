@@ -0,0 +1,66 @@
+"""
+ONNX Runtime与transformers（PyTorch）两个嵌入后端对固定文本的编码一致性
+需要EMBEDDING_MODEL_PATH指向嵌入模型目录，并安装onnxruntime；与PyTorch比较及导出ONNX模型还需要torch，缺少时跳过
+"""
+import os
+
+import pytest
+
+from service.EmbeddingBackend import OnnxEmbeddingBackend, TorchEmbeddingBackend, cosine_parity
+
+TEXTS = [
+    "甲方应于合同签订后十五个工作日内支付首期款项。",
+    "乙方保证所交付的货物符合国家标准及双方约定的技术要求，如有质量问题，甲方有权要求退换。",
+    "争议由合同签订地人民法院管辖。",
+    "Party B shall deliver the goods within thirty days after receiving the advance payment.",
+    "发票金额：￥12,345.67，开票日期：2024年3月1日",
+    "短",
+]
+
+# fp32导出只有算子实现与图优化带来的数值误差；int8动态量化允许更大的偏差
+FP32_MIN_COSINE = 0.999
+INT8_MIN_COSINE = 0.98
+
+
+@pytest.fixture(scope="module")
+def model_path():
+    path = os.getenv("EMBEDDING_MODEL_PATH")
+    if not path or not os.path.isdir(path):
+        pytest.skip("未设置EMBEDDING_MODEL_PATH或目录不存在")
+    pytest.importorskip("onnxruntime")
+    return path
+
+
+@pytest.fixture(scope="module")
+def onnx_path(model_path, tmp_path_factory):
+    """优先使用已导出的ONNX模型，否则导出到临时目录，不改动模型目录"""
+    path = os.getenv("EMBEDDING_ONNX_PATH") or os.path.join(model_path, "model.onnx")
+    if os.path.exists(path):
+        return path
+    pytest.importorskip("torch")
+    return str(tmp_path_factory.mktemp("onnx") / "model.onnx")
+
+
+@pytest.fixture(scope="module")
+def torch_backend(model_path):
+    pytest.importorskip("torch")
+    return TorchEmbeddingBackend(model_path)
+
+
+def test_onnx_matches_torch(model_path, onnx_path, torch_backend):
+    onnx_backend = OnnxEmbeddingBackend(model_path, onnx_path=onnx_path)
+    assert cosine_parity(torch_backend, onnx_backend, TEXTS) > FP32_MIN_COSINE
+
+
+def test_onnx_int8_close_to_torch(model_path, onnx_path, torch_backend):
+    onnx_backend = OnnxEmbeddingBackend(model_path, onnx_path=onnx_path, quantize=True)
+    assert cosine_parity(torch_backend, onnx_backend, TEXTS) > INT8_MIN_COSINE
+
+
+def test_batch_matches_single(model_path, onnx_path):
+    """同一文本单独编码与混在不同长度的批次中编码结果一致（mean pooling不计padding位置）"""
+    onnx_backend = OnnxEmbeddingBackend(model_path, onnx_path=onnx_path)
+    single = [onnx_backend.encode_batch([text])[0] for text in TEXTS]
+    batched = onnx_backend.encode_batch(TEXTS)
+    for vector, expected in zip(batched, single):
+        assert vector == pytest.approx(expected, rel=1e-3, abs=1e-4)
@@ -0,0 +1,89 @@
+"""EmbeddingCache：float32数组缓存、内存层与磁盘层按字节数淘汰、旧版缓存文件的迁移"""
+import sqlite3
+
+import numpy as np
+
+from service.EmbeddingCache import MEMORY_ENTRY_OVERHEAD, EmbeddingCache, text_key
+
+DIM = 8
+ENTRY = DIM * 4
+
+
+def vectors(count, offset=0):
+    return [np.full(DIM, offset + i, dtype=np.float64) for i in range(count)]
+
+
+def test_vectors_are_readonly_float32(tmp_path):
+    cache = EmbeddingCache("ns", DIM, db_path=str(tmp_path / "cache.sqlite3"))
+    cache.put_many(["a", "b"], [[0.5] * DIM, np.arange(DIM)])
+    found = cache.get_many(["a", "b", "c"])
+    assert sorted(found) == [0, 1]
+    for vector in found.values():
+        assert vector.dtype == np.float32 and not vector.flags.writeable
+    assert found[1].tolist() == list(range(DIM))
+
+    # 新实例只有磁盘层命中
+    reopened = EmbeddingCache("ns", DIM, db_path=str(tmp_path / "cache.sqlite3"))
+    found = reopened.get_many(["a"])
+    assert found[0].dtype == np.float32 and found[0].tolist() == [0.5] * DIM
+    assert reopened.stats()["disk_hits"] == 1
+
+
+def test_rows_of_a_batch_are_copied():
+    cache = EmbeddingCache("ns", DIM, memory_bytes=1 << 20, db_path=None)
+    batch = np.zeros((64, DIM), dtype=np.float32)
+    cache.put_many(["a"], [batch[0]])
+    assert cache.get_many(["a"])[0].base is None
+    assert cache.stats()["memory_bytes"] == ENTRY + MEMORY_ENTRY_OVERHEAD
+
+
+def test_memory_evicts_by_bytes():
+    cache = EmbeddingCache("ns", DIM, memory_bytes=3 * (ENTRY + MEMORY_ENTRY_OVERHEAD), db_path=None)
+    texts = [f"t{i}" for i in range(5)]
+    cache.put_many(texts[:3], vectors(3))
+    cache.get_many(["t0"])  # t0变为最近使用
+    cache.put_many(texts[3:], vectors(2, 3))
+    assert sorted(cache.get_many(texts)) == [0, 3, 4]
+    assert cache.stats()["memory_bytes"] <= cache.memory_bytes
+
+    disabled = EmbeddingCache("ns", DIM, memory_bytes=0, db_path=None)
+    disabled.put_many(texts, vectors(5))
+    assert disabled.get_many(texts) == {} and disabled.stats()["memory_bytes"] == 0
+
+
+def test_disk_evicts_by_total_blob_size(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache("ns", DIM, memory_bytes=0, db_path=path, max_disk_bytes=10 * ENTRY)
+    for i in range(30):
+        cache.put_many([f"t{i}"], vectors(1, i))
+    db = sqlite3.connect(path)
+    total, count = db.execute("SELECT SUM(size), COUNT(*) FROM embeddings").fetchone()
+    assert total <= 10 * ENTRY
+    # 保留的是最近写入的向量
+    kept = cache.get_many([f"t{i}" for i in range(30)])
+    assert len(kept) == count and min(kept) >= 30 - count
+
+    # 容量在同一文件的所有命名空间间共享
+    other = EmbeddingCache("other", DIM, memory_bytes=0, db_path=path, max_disk_bytes=10 * ENTRY)
+    other.put_many([f"o{i}" for i in range(10)], vectors(10))
+    assert db.execute("SELECT SUM(size) FROM embeddings").fetchone()[0] <= 10 * ENTRY
+
+
+def test_migrates_cache_without_size_column(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    db = sqlite3.connect(path)
+    db.execute("""
+        CREATE TABLE embeddings (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        )""")
+    db.execute("INSERT INTO embeddings VALUES (?, ?, ?, ?)",
+               ("ns", text_key("a"), np.ones(DIM, dtype=np.float32).tobytes(), 0.0))
+    db.commit()
+
+    cache = EmbeddingCache("ns", DIM, db_path=path)
+    assert db.execute("SELECT size FROM embeddings").fetchone()[0] == ENTRY
+    assert cache.get_many(["a"])[0].tolist() == [1.0] * DIM
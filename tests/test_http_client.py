@@ -0,0 +1,141 @@
+"""HttpClient.http_post：本地桩服务验证长连接复用、幂等与非幂等请求的重试策略、单接口并发上限"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+import requests
+
+from service import HttpClient
+
+
+class StubServer(ThreadingHTTPServer):
+    """按路径设定前几次请求的响应（状态码或延迟秒数），记录每个路径的请求数、客户端地址与最大并发数"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.plans = {}
+        self.requests = {}
+        self.clients = []
+        self.active = {}
+        self.max_active = {}
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # 读超时的测试中客户端先断开，写回响应失败是预期的
+        pass
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_port}{path}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        path = urlsplit(self.path).path
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:
+            count = server.requests[path] = server.requests.get(path, 0) + 1
+            server.clients.append(self.client_address)
+            server.active[path] = server.active.get(path, 0) + 1
+            server.max_active[path] = max(server.max_active.get(path, 0), server.active[path])
+        plan = server.plans.get(path, [])
+        action = plan[count - 1] if count <= len(plan) else 200
+        try:
+            if isinstance(action, float):
+                time.sleep(action)
+                action = 200
+        finally:
+            with server.lock:
+                server.active[path] -= 1
+        body = f"{path} {count}".encode()
+        self.send_response(action)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_client(monkeypatch):
+    # 每个测试使用新的Session与并发上限，重试不等待
+    monkeypatch.setenv("HTTP_RETRIES", "2")
+    monkeypatch.setenv("HTTP_RETRY_BACKOFF", "0")
+    monkeypatch.setattr(HttpClient, "_sessions", {})
+    monkeypatch.setattr(HttpClient, "_endpoint_limits", {})
+
+
+def test_session_reused_with_keep_alive(server):
+    for _ in range(5):
+        assert HttpClient.http_post(server.url("/ocr"), json={"a": 1}).status_code == 200
+    # 同一个Session，所有请求走同一个TCP连接
+    assert HttpClient.get_session() is HttpClient.get_session(True)
+    assert HttpClient.get_session(False) is not HttpClient.get_session(True)
+    assert len(set(server.clients)) == 1
+
+
+def test_idempotent_retries_gateway_errors(server):
+    server.plans["/ocr"] = [503, 502]
+    response = HttpClient.http_post(server.url("/ocr"), json={})
+    assert (response.status_code, response.text) == (200, "/ocr 3")
+
+
+def test_non_idempotent_does_not_retry_gateway_errors(server):
+    server.plans["/upload"] = [503]
+    response = HttpClient.http_post(server.url("/upload"), idempotent=False, files={"file": ("a.txt", b"abc")})
+    assert response.status_code == 503
+    assert server.requests == {"/upload": 1}
+
+
+def test_read_timeout_retried_only_when_idempotent(server):
+    server.plans["/ocr"] = [0.5]
+    server.plans["/upload"] = [0.5]
+    response = HttpClient.http_post(server.url("/ocr"), timeout=(1, 0.2), json={})
+    assert (response.status_code, response.text) == (200, "/ocr 2")
+    # 请求已经发出，非幂等请求不能重发
+    with pytest.raises(requests.ReadTimeout):
+        HttpClient.http_post(server.url("/upload"), idempotent=False, timeout=(1, 0.2), data=b"x")
+    assert server.requests["/upload"] == 1
+
+
+def test_retries_exhausted_returns_last_response(server):
+    server.plans["/ocr"] = [503] * 5
+    response = HttpClient.http_post(server.url("/ocr"), json={})
+    assert response.status_code == 503
+    assert server.requests == {"/ocr": 3}
+
+
+def test_per_endpoint_concurrency_limit(server, monkeypatch):
+    monkeypatch.setenv("HTTP_ENDPOINT_CONCURRENCY", "2")
+    HttpClient.set_endpoint_limit(server.url("/seal"), 3)
+    paths = ["/ocr"] * 6 + ["/seal"] * 6
+    for path in set(paths):
+        server.plans[path] = [0.1] * 6
+    with ThreadPoolExecutor(len(paths)) as pool:
+        # 查询参数不同也算同一个接口地址
+        responses = list(pool.map(lambda i: HttpClient.http_post(server.url(paths[i]) + f"?i={i}", json={}),
+                                  range(len(paths))))
+    assert all(response.status_code == 200 for response in responses)
+    assert server.max_active == {"/ocr": 2, "/seal": 3}
+
+
+def test_empty_url_rejected():
+    with pytest.raises(ValueError):
+        HttpClient.http_post("")
@@ -0,0 +1,183 @@
+"""
+ImageCodec.encode_image：符合预算的JPEG/PNG原样透传，重复的字节命中缓存，格式或像素模式不符时重新编码；
+超出长边上限的图像缩小后编码（JPEG解码时先按DCT缩放），接口预算可由环境变量覆盖
+"""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, JpegImagePlugin
+
+from service import ImageCodec
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    for name in ("FORMATS", "ENCODE_FORMAT", "QUALITY", "MAX_BYTES", "MAX_SIDE"):
+        monkeypatch.delenv(f"IMAGE_IPS_{name}", raising=False)
+    ImageCodec.clear_cache()
+
+
+def image_file(image_format, mode="RGB", size=(120, 80), **save_args):
+    rng = np.random.default_rng(size[0])
+    image = Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)).convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **save_args)
+    return buffer.getvalue()
+
+
+def decoded(encoded):
+    return Image.open(io.BytesIO(encoded.data))
+
+
+@pytest.mark.parametrize("image_format, mode", [("JPEG", "RGB"), ("JPEG", "L"), ("PNG", "RGB"), ("PNG", "RGBA"),
+                                                ("PNG", "L"), ("PNG", "P")])
+def test_compliant_file_passes_through(image_format, mode):
+    data = image_file(image_format, mode)
+    encoded = ImageCodec.encode_image(data, "ips")
+    assert encoded.passthrough
+    assert encoded.data == data
+    assert (encoded.format, encoded.size) == (image_format, (120, 80))
+    assert encoded.base64 == ImageCodec.to_base64(data, "ips")
+    assert ImageCodec.decode_base64_image(encoded.data_url) == data
+
+
+def test_repeated_bytes_hit_cache(monkeypatch):
+    data = image_file("BMP")
+    encodes = []
+    encode_bytes = ImageCodec._encode_bytes
+    monkeypatch.setattr(ImageCodec, "_encode_bytes", lambda *args: encodes.append(1) or encode_bytes(*args))
+    hits = ImageCodec.codec_stats()["cache_hits"]
+
+    first = ImageCodec.encode_image(data, "ips")
+    # 内容相同的另一份字节（如Streamlit每次重新运行读出的上传文件）
+    second = ImageCodec.encode_image(bytearray(data), "ips")
+    assert second is first
+    assert len(encodes) == 1
+    assert ImageCodec.codec_stats()["cache_hits"] == hits + 1
+    # base64只计算一次
+    assert second.base64 is first.base64
+
+    # 预算或像素模式不同时分别编码
+    ImageCodec.encode_image(data, "vlm")
+    ImageCodec.encode_image(data, "ips", mode="L")
+    assert len(encodes) == 3
+
+
+def test_cache_bounded_by_bytes(monkeypatch):
+    monkeypatch.setenv("IMAGE_CODEC_CACHE_BYTES", str(30 * 1024))
+    for seed in range(20):
+        ImageCodec.encode_image(image_file("PNG", size=(40 + seed, 40)), "ips")
+    assert 0 < ImageCodec.codec_stats()["cache_bytes"] <= 30 * 1024
+
+
+@pytest.mark.parametrize("image_format, mode", [("BMP", "RGB"), ("WEBP", "RGB"), ("TIFF", "RGB")])
+def test_other_formats_reencoded_as_png(image_format, mode):
+    data = image_file(image_format, mode)
+    encoded = ImageCodec.encode_image(data, "ips")
+    assert not encoded.passthrough
+    assert encoded.format == "PNG" and decoded(encoded).format == "PNG"
+    # 无损格式重新编码后像素不变
+    if image_format != "WEBP":
+        assert decoded(encoded).tobytes() == Image.open(io.BytesIO(data)).convert("RGB").tobytes()
+
+
+def test_requested_mode_reencoded():
+    data = image_file("PNG", "RGB")
+    encoded = ImageCodec.encode_image(data, "ips", mode="L")
+    assert not encoded.passthrough
+    assert decoded(encoded).mode == "L"
+    # 已是所需模式时透传
+    gray = image_file("PNG", "L")
+    assert ImageCodec.encode_image(gray, "ips", mode="L").data == gray
+
+
+def test_cmyk_jpeg_converted_to_rgb():
+    encoded = ImageCodec.encode_image(image_file("JPEG", "CMYK"), "ips")
+    assert not encoded.passthrough
+    assert decoded(encoded).mode == "RGB"
+
+
+def test_exif_rotated_jpeg_reencoded():
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    encoded = ImageCodec.encode_image(image_file("JPEG", exif=exif), "ips")
+    assert not encoded.passthrough
+
+
+def test_max_bytes_switches_to_jpeg(monkeypatch):
+    data = image_file("PNG", size=(300, 200))
+    monkeypatch.setenv("IMAGE_IPS_MAX_BYTES", str(len(data) // 2))
+    encoded = ImageCodec.encode_image(data, "ips")
+    assert (encoded.passthrough, encoded.format) == (False, "JPEG")
+
+
+def test_decoded_images_and_non_images():
+    array = np.zeros((30, 40, 3), np.uint8)
+    encoded = ImageCodec.encode_image(array, "ips")
+    assert (encoded.format, encoded.size) == ("PNG", (40, 30))
+    # 非图像文件（如PDF）原样透传
+    pdf = b"%PDF-1.4\n%%EOF\n"
+    encoded = ImageCodec.encode_image(pdf, "ips")
+    assert (encoded.passthrough, encoded.format, encoded.data) == (True, None, pdf)
+    assert ImageCodec.encode_image(encoded) is encoded
+
+
+def test_budget_defaults_and_env(monkeypatch):
+    assert ImageCodec.get_budget("vlm") == ImageCodec.ImageBudget(encode_format="JPEG", quality=85, max_side=1600)
+    assert ImageCodec.get_budget("ips") == ImageCodec.ImageBudget()
+    monkeypatch.setenv("IMAGE_VLM_MAX_SIDE", "1024")
+    monkeypatch.setenv("IMAGE_VLM_QUALITY", "70")
+    monkeypatch.setenv("IMAGE_IPS_FORMATS", "jpeg, webp,")
+    monkeypatch.setenv("IMAGE_IPS_ENCODE_FORMAT", "jpeg")
+    assert ImageCodec.get_budget("vlm")[2:] == (70, 0, 1024)
+    assert ImageCodec.get_budget("ips")[:2] == (("JPEG", "WEBP"), "JPEG")
+
+
+@pytest.mark.parametrize("image_format, size, expected", [
+    ("PNG", (2400, 1200), (1600, 800)),
+    ("PNG", (900, 3000), (480, 1600)),
+    ("JPEG", (1601, 1000), (1600, 999)),
+])
+def test_max_side_downscales(image_format, size, expected):
+    encoded = ImageCodec.encode_image(image_file(image_format, size=size), "vlm")
+    assert not encoded.passthrough
+    assert (encoded.format, encoded.size, decoded(encoded).size) == ("JPEG", expected, expected)
+
+
+def test_within_max_side_passes_through():
+    data = image_file("JPEG", size=(1600, 900))
+    assert ImageCodec.encode_image(data, "vlm").data == data
+
+
+def test_large_jpeg_decoded_with_draft(monkeypatch):
+    # 4000x3000的JPEG在解码时先按1/2缩小（不小于目标尺寸），再缩放到长边1600；结果接近整幅解码后缩放
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, 4000, dtype=np.float32)[None, :, None]
+    pixels = np.clip(gradient + rng.normal(0, 8, (3000, 1, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(np.broadcast_to(pixels, (3000, 4000, 3)).copy()).save(buffer, format="JPEG", quality=90)
+    data = buffer.getvalue()
+    # 记录draft之后解码器输出的尺寸
+    drafts = []
+    draft = JpegImagePlugin.JpegImageFile.draft
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, "draft",
+                        lambda self, mode, size: (draft(self, mode, size), drafts.append(self.size))[0])
+
+    encoded = ImageCodec.encode_image(data, "vlm")
+    assert encoded.size == (1600, 1200)
+    assert drafts == [(2000, 1500)]
+    reference = Image.open(io.BytesIO(data)).resize((1600, 1200), Image.LANCZOS)
+    difference = np.abs(np.asarray(decoded(encoded), np.int16) - np.asarray(reference, np.int16))
+    # 差异包括DCT缩放与JPEG q85重新编码
+    assert difference.mean() < 4
+
+
+def test_crop_or_original():
+    crop = image_file("PNG", size=(30, 20))
+    original = image_file("JPEG")
+    encoded = ImageCodec.encode_image(crop, "ips")
+    assert ImageCodec.crop_or_original(original, encoded.base64) == crop
+    assert ImageCodec.crop_or_original(original, encoded.data_url) == crop
+    assert ImageCodec.crop_or_original(original, None) is original
+    assert ImageCodec.crop_or_original(original, "") is original
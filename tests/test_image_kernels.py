@@ -0,0 +1,109 @@
+"""ImageKernels：各颜色内核及内核链与PaddleOcrService原PIL/numpy实现逐像素一致（容差为0），RGB/RGBA/L/P输入均覆盖"""
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from service.ImageKernels import BlackToTransparent, BoostSaturation, KernelChain, ReplaceBlack, SmoothBlack, scale_lut
+
+MODES = ["RGB", "RGBA", "L", "P"]
+
+
+def baseline_boost_red(img, saturation_factor=1.5):
+    img = img.convert("RGB")
+    h, s, v = img.convert("HSV").split()
+    s = s.point(lambda x: min(255, x * saturation_factor))
+    return Image.merge("HSV", (h, s, v)).convert("RGB")
+
+
+def baseline_replace_black(img, threshold=50):
+    arr = np.array(img.convert("RGB"))
+    black_mask = (arr[:, :, 0] < threshold) & (arr[:, :, 1] < threshold) & (arr[:, :, 2] < threshold)
+    arr[black_mask] = [255, 255, 255]
+    return Image.fromarray(arr)
+
+
+def baseline_black_to_transparent(img, threshold=30):
+    arr = np.array(img.convert("RGBA"))
+    black_mask = (arr[:, :, 0] < threshold) & (arr[:, :, 1] < threshold) & (arr[:, :, 2] < threshold)
+    arr[black_mask] = [0, 0, 0, 0]
+    return Image.fromarray(arr)
+
+
+def baseline_smooth_black(img, threshold=30):
+    arr = np.array(img.convert("RGB"))
+    black_mask = np.all(arr < threshold, axis=-1)
+    convolved = cv2.filter2D(arr, -1, np.array([0.5, 0, 0.5]).reshape(1, 3), borderType=cv2.BORDER_REPLICATE)
+    return Image.fromarray(np.where(black_mask[..., None], convolved, arr).astype("uint8"))
+
+
+def scan(mode, seed=0):
+    """带噪声的扫描件：黑色文字、红色印章、各色块，alpha随机"""
+    rng = np.random.default_rng(seed)
+    image = np.full((240, 320, 3), 250, np.uint8)
+    for y in range(20, 240, 24):
+        cv2.putText(image, "Contract 2024", (10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (15, 15, 15), 2)
+    cv2.circle(image, (220, 120), 70, (210, 40, 40), 6)
+    image[180:230, :] = rng.integers(0, 256, (50, 320, 3), dtype=np.uint8)
+    image = np.clip(image + rng.normal(0, 12, image.shape), 0, 255).astype(np.uint8)
+    rgba = np.dstack([image, rng.integers(0, 256, image.shape[:2], dtype=np.uint8)])
+    return Image.fromarray(rgba, "RGBA").convert(mode) if mode != "RGBA" else Image.fromarray(rgba, "RGBA")
+
+
+def assert_same(actual, expected):
+    assert actual.mode == expected.mode
+    assert np.array_equal(np.asarray(actual), np.asarray(expected))
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("kernel, baseline", [
+    (BoostSaturation(1.5), baseline_boost_red),
+    (ReplaceBlack(50), baseline_replace_black),
+    (BlackToTransparent(30), baseline_black_to_transparent),
+    (SmoothBlack(30), baseline_smooth_black),
+])
+def test_kernel_matches_baseline(mode, kernel, baseline):
+    img = scan(mode)
+    assert_same(KernelChain(kernel).apply(img), baseline(img))
+
+
+@pytest.mark.parametrize("factor", [0.5, 1.3, 1.5, 2.0])
+def test_boost_saturation_exact_on_every_colour(factor):
+    """全部2^24种颜色：HSV的量化与取整和PIL完全一致（OpenCV的HSV_FULL在红色印章像素上最多相差14级）"""
+    colours = np.arange(1 << 24, dtype=np.uint32)
+    rgb = np.stack([colours >> 16, (colours >> 8) & 255, colours & 255], axis=-1).astype(np.uint8)
+    img = Image.fromarray(rgb.reshape(4096, 4096, 3), "RGB")
+    assert_same(KernelChain(BoostSaturation(factor)).apply(img), baseline_boost_red(img, factor))
+
+
+def test_scale_lut_matches_point_lambda():
+    ramp = Image.fromarray(np.arange(256, dtype=np.uint8)[None])
+    for factor in (0.5, 0.75, 1.1, 1.25, 1.3, 1.5, 2.0):
+        expected = np.asarray(ramp.point(lambda x: min(255, x * factor)))[0]
+        assert np.array_equal(scale_lut(factor), expected)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_chain_matches_sequential_baselines(mode):
+    """
+    饱和度内核交给去黑内核的亮度缓存与重新计算的结果一致；
+    含去透明内核的链在RGBA缓冲区上进行、保留原透明度，而逐个调用时boost_red已丢弃透明度，只比较颜色与透明的像素
+    """
+    img = scan(mode, seed=1)
+    assert_same(KernelChain(BoostSaturation(1.5), ReplaceBlack(50)).apply(img),
+                baseline_replace_black(baseline_boost_red(img), 50))
+    chained = np.asarray(KernelChain(BoostSaturation(1.5), SmoothBlack(30), BlackToTransparent(30)).apply(img))
+    expected = np.asarray(baseline_black_to_transparent(baseline_smooth_black(baseline_boost_red(img), 30), 30))
+    assert np.array_equal(chained[..., :3], expected[..., :3])
+    transparent = expected[..., 3] == 0
+    assert np.all(chained[..., 3][transparent] == 0)
+    if mode in ("RGB", "L"):
+        assert np.array_equal(chained[..., 3] == 0, transparent)
+
+
+def test_rgba_alpha_kept_by_colour_kernels():
+    img = scan("RGBA")
+    alpha = np.asarray(img)[..., 3]
+    result = np.asarray(KernelChain(BoostSaturation(1.5), BlackToTransparent(30)).apply(img))
+    black = np.all(result == 0, axis=-1)
+    assert np.array_equal(result[..., 3][~black], alpha[~black])
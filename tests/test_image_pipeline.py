@@ -0,0 +1,206 @@
+"""
+ImagePipeline：各OCR服务的流水线输出与改动前逐步调用各函数的结果一致，
+plan()的表示规划与内核合并、缓冲区复制只在必要时发生、文件字节直接解码为灰度
+"""
+import importlib
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image, ImageOps
+
+from service.ImageKernels import BlackToTransparent, BoostSaturation, ReplaceBlack
+from service.PaddleOcrService import PaddleOcrService
+
+pipeline = importlib.import_module("service.ImagePipeline")
+ocr_module = importlib.import_module("service.OcrService")
+
+BGR, GRAY, RGB, RGBA = pipeline.BGR, pipeline.GRAY, pipeline.RGB, pipeline.RGBA
+
+
+def old_enhance_text_clarity(pil_image):
+    """改动前的enhance_text_clarity（默认参数）"""
+    if pil_image.mode == "RGB":
+        gray = cv2.cvtColor(cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR), cv2.COLOR_BGR2GRAY)
+    else:
+        gray = np.array(pil_image)
+    blurred = cv2.GaussianBlur(gray, (0, 0), 3.0)
+    enhanced = cv2.addWeighted(gray, 1.5, blurred, -0.5, 0)
+    enhanced = cv2.convertScaleAbs(enhanced, alpha=1.5, beta=0)
+    enhanced = cv2.filter2D(enhanced, -1, np.array([[0, -1, 0], [-1, 5 * 1.8, -1], [0, -1, 0]]))
+    _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return Image.fromarray(binary, "L")
+
+
+def old_pil2cv(image):
+    new_image = np.array(image, dtype=np.uint8)
+    if new_image.ndim == 3 and new_image.shape[2] == 3:
+        new_image = cv2.cvtColor(new_image, cv2.COLOR_RGB2BGR)
+    return new_image
+
+
+def old_ocr_steps(image_pil, angle):
+    """OcrService改动前的逐步预处理：EXIF旋转 -> 转为cv图像 -> 旋转到正常方向 -> 文字增强"""
+    image_cv = old_pil2cv(ImageOps.exif_transpose(image_pil))
+    image_cv = ocr_module.rotate_bound(image_cv, angle) if angle else image_cv
+    return old_enhance_text_clarity(Image.fromarray(cv2.cvtColor(image_cv, cv2.COLOR_BGR2RGB)))
+
+
+def document(seed=0, height=420, width=300):
+    """白底黑字、带红色印章与少量噪声的文档（RGB数组）"""
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 245, np.uint8)
+    for y in range(30, height - 10, 28):
+        cv2.putText(image, f"Clause {y} agreed", (12, y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (20, 20, 20), 2)
+    cv2.circle(image, (200, 260), 60, (200, 30, 30), 5)
+    return np.clip(image + rng.normal(0, 8, image.shape), 0, 255).astype(np.uint8)
+
+
+def encode(image_rgb, image_format, exif_orientation=None):
+    buffer = io.BytesIO()
+    img = Image.fromarray(image_rgb)
+    if exif_orientation:
+        exif = Image.Exif()
+        exif[0x0112] = exif_orientation
+        img.save(buffer, format=image_format, exif=exif)
+    else:
+        img.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def binary_diff(a, b):
+    a, b = np.asarray(a), np.asarray(b)
+    assert a.shape == b.shape
+    return np.count_nonzero(a != b) / a.size
+
+
+def ocr_pipeline(angle):
+    return pipeline.ImagePipeline(pipeline.ExifTranspose(), pipeline.Rotate(angle), pipeline.EnhanceText())
+
+
+class Probe(pipeline.Stage):
+    """记录收到的缓冲区，原地写入一个像素"""
+    name = "probe"
+    inplace = True
+
+    def __init__(self, accepts=(RGB,)):
+        self.accepts = accepts
+        self.seen = []
+
+    def run(self, image, space):
+        self.seen.append(image)
+        image[0, 0] = 0
+        return image
+
+
+def test_stage_is_abstract():
+    with pytest.raises(TypeError):
+        pipeline.Stage()
+
+    class NoRun(pipeline.Stage):
+        name = "no_run"
+
+    with pytest.raises(TypeError):
+        NoRun()
+
+
+@pytest.mark.parametrize("angle", [0, 90, 270])
+def test_ocr_pipeline_matches_old_steps_for_pil_input(angle):
+    """PIL输入（含EXIF方向标记）：与逐步调用逐像素一致"""
+    img = Image.open(io.BytesIO(encode(document(), "JPEG", exif_orientation=6)))
+    result = ocr_pipeline(angle).run(img)
+    assert result.space == GRAY
+    assert binary_diff(result.to_pil(), old_ocr_steps(img, angle)) == 0
+
+
+@pytest.mark.parametrize("image_format, exif_orientation", [("PNG", None), ("JPEG", None), ("JPEG", 8)])
+def test_ocr_pipeline_matches_old_steps_for_bytes(image_format, exif_orientation):
+    """
+    文件字节直接解码为灰度，与先解码为RGB再转灰度的取整略有不同，二值化结果只允许极少数像素（0.1%）不同
+    """
+    data = encode(document(seed=1), image_format, exif_orientation)
+    result = ocr_pipeline(90).run(data)
+    assert binary_diff(result.to_pil(), old_ocr_steps(Image.open(io.BytesIO(data)), 90)) <= 0.001
+
+
+def test_orientation_stage_matches_orientation():
+    pytest.importorskip("rapid_orientation")
+    page = cv2.cvtColor(document(seed=2, height=600, width=420), cv2.COLOR_RGB2BGR)
+    rotated = np.ascontiguousarray(np.rot90(page))
+    result = pipeline.ImagePipeline(pipeline.Orientation()).run(rotated, BGR)
+    assert np.array_equal(result.image, ocr_module.orientation(rotated))
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "P"])
+def test_paddle_preprocess_matches_old_steps(mode, capsys):
+    """相邻的颜色内核合并为一个阶段，与逐个调用boost_red、replace_black_with_white逐像素一致"""
+    service = PaddleOcrService()
+    img = Image.fromarray(document(seed=3)).convert(mode)
+    result = service.preprocess(img, BoostSaturation(1.5), ReplaceBlack(50))
+    expected = service.replace_black_with_white(service.boost_red(img), 50)
+    assert result.mode == expected.mode
+    assert np.array_equal(np.asarray(result), np.asarray(expected))
+    assert capsys.readouterr().out.count("kernels[BoostSaturation,ReplaceBlack]") == 1
+
+
+def test_plan_picks_fewest_conversions():
+    enhance = pipeline.ImagePipeline(pipeline.Orientation(), pipeline.EnhanceText())
+    start, steps = enhance.plan((BGR, GRAY))
+    assert start == GRAY and [target for target, _ in steps] == [None, None]
+    # 数组输入只有一种表示：RGB转为灰度一次，方向分类也在灰度上进行
+    start, steps = enhance.plan((RGB,))
+    assert start == RGB and [target for target, _ in steps] == [GRAY, None]
+    colour = pipeline.ImagePipeline(pipeline.Rotate(90), pipeline.Kernels(ReplaceBlack(50)), pipeline.EnhanceText())
+    start, steps = colour.plan((BGR, GRAY))
+    # 转换次数相同时取阶段偏好靠前的表示：Rotate偏好RGB，提前转换后颜色内核不再转换
+    assert start == BGR and [target for target, _ in steps] == [RGB, None, GRAY]
+    # 颜色内核链输出RGB，需要透明通道时才在RGBA上处理
+    assert pipeline.ImagePipeline(pipeline.Kernels(ReplaceBlack(50))).plan((RGBA,))[1][0][0] == RGB
+    transparent = pipeline.ImagePipeline(pipeline.Kernels(BoostSaturation(1.5), BlackToTransparent(30)))
+    assert transparent.plan((RGB,))[1][0][0] == RGBA
+
+
+def test_exif_transpose_must_be_first():
+    with pytest.raises(ValueError):
+        pipeline.ImagePipeline(pipeline.Rotate(90), pipeline.ExifTranspose())
+
+
+def test_caller_array_copied_once_for_inplace_stages():
+    image = document()
+    original = image.copy()
+    first, second = Probe(), Probe()
+    result = pipeline.ImagePipeline(first, pipeline.Rotate(0), second).run(image, RGB)
+    assert np.array_equal(image, original)
+    assert first.seen[0] is not image
+    # 缓冲区已归流水线所有，后续原地阶段不再复制
+    assert second.seen[0] is first.seen[0] is result.image
+
+
+def test_pil_input_copied_only_when_written():
+    img = Image.fromarray(document())
+    probe = Probe()
+    pipeline.ImagePipeline(probe).run(img)
+    assert probe.seen[0].flags.writeable
+    assert np.array_equal(np.asarray(img), document())
+    # 非原地阶段直接使用PIL的缓冲区
+    result = pipeline.ImagePipeline(pipeline.Rotate(0)).run(img)
+    assert not result.image.flags.writeable
+
+
+def test_decoded_buffer_not_copied():
+    probe = Probe(accepts=(BGR,))
+    result = pipeline.ImagePipeline(probe).run(encode(document(), "PNG"))
+    assert result.image is probe.seen[0]
+    assert [timing.name for timing in result.timings] == ["decode", "probe"]
+
+
+@pytest.mark.parametrize("image_format", ["PNG", "JPEG"])
+def test_bytes_decoded_straight_to_gray(image_format, monkeypatch):
+    flags = []
+    imdecode = cv2.imdecode
+    monkeypatch.setattr(pipeline.cv2, "imdecode", lambda data, flag: flags.append(flag) or imdecode(data, flag))
+    result = pipeline.ImagePipeline(pipeline.EnhanceText()).run(encode(document(), image_format))
+    assert flags == [cv2.IMREAD_GRAYSCALE | cv2.IMREAD_IGNORE_ORIENTATION]
+    assert result.space == GRAY and result.image.ndim == 2
+    assert [timing.name for timing in result.timings] == ["decode", "enhance_text"]
@@ -0,0 +1,77 @@
+"""JpegPdfWriter / pic_to_pdf：JPEG以DCTDecode原样嵌入，页面尺寸与改动前逐页转换的结果一致"""
+import io
+
+import fitz
+import numpy as np
+import pytest
+from PIL import Image
+
+from service.PdfService import JpegPdfWriter, pic_to_pdf
+
+
+def reference_pic_to_pdf(images):
+    """改动前的实现：每张图片经fitz转换为单页PDF后插入"""
+    doc = fitz.open()
+    for img in images:
+        img_doc = fitz.open("jpg", img)
+        doc.insert_pdf(fitz.open("pdf", img_doc.convert_to_pdf()))
+    return doc.write()
+
+
+def jpeg(mode, size=(320, 240), **save_args):
+    rng = np.random.default_rng(len(mode) + size[0])
+    pixels = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    image = Image.fromarray(pixels).convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=60, **save_args)
+    return buffer.getvalue()
+
+
+JPEGS = {
+    "rgb": jpeg("RGB"),
+    "rgb-300dpi": jpeg("RGB", (620, 877), dpi=(300, 300)),
+    "progressive": jpeg("RGB", (400, 300), progressive=True),
+    "gray": jpeg("L", (300, 420), dpi=(150, 150)),
+    "cmyk": jpeg("CMYK", (200, 200)),
+}
+
+
+def image_streams(doc):
+    # 每页引用的图片对象：(过滤器, 原始流)
+    streams = []
+    for page in doc:
+        (xref, *_), = page.get_images()
+        streams.append((doc.xref_get_key(xref, "Filter")[1], doc.xref_stream_raw(xref)))
+    return streams
+
+
+def test_embeds_jpeg_streams_unchanged():
+    images = list(JPEGS.values())
+    with fitz.open("pdf", pic_to_pdf(images)) as doc:
+        assert not doc.is_repaired
+        assert doc.page_count == len(images)
+        assert image_streams(doc) == [("/DCTDecode", data) for data in images]
+
+
+@pytest.mark.parametrize("name", JPEGS)
+def test_matches_reference(name):
+    data = JPEGS[name]
+    with fitz.open("pdf", pic_to_pdf([data])) as doc, fitz.open("pdf", reference_pic_to_pdf([data])) as ref:
+        assert doc[0].rect == ref[0].rect
+        assert doc[0].get_pixmap().samples == ref[0].get_pixmap().samples
+
+
+def test_streams_to_file(tmp_path):
+    path = tmp_path / "out.pdf"
+    with open(path, "wb") as f, JpegPdfWriter(f) as writer:
+        for data in JPEGS.values():
+            writer.add_page(data)
+            # 每页添加后即写出，文件随页数增长
+            assert f.tell() >= len(data)
+    with fitz.open(path) as doc:
+        assert doc.page_count == len(JPEGS)
+
+
+def test_rejects_non_jpeg():
+    with pytest.raises(ValueError):
+        pic_to_pdf([b"\x89PNG\r\n\x1a\n"])
@@ -0,0 +1,67 @@
+"""OcrService.iter_pdf_ocr / detect_from_pdf_path：单页识别失败时默认抛出，raise_on_error=False时保留其余页面"""
+import io
+
+import fitz
+import pytest
+from PIL import Image
+
+from service.OcrService import OcrService
+
+PAGES = 4
+FAILING_PAGE = 2
+
+
+@pytest.fixture
+def scanned_pdf():
+    """每页只有一张图片、没有文字层的PDF"""
+    doc = fitz.open()
+    for i in range(PAGES):
+        buffer = io.BytesIO()
+        Image.new("RGB", (200, 280), (255, 255 - i * 40, 255)).save(buffer, format="PNG")
+        page = doc.new_page(width=200, height=280)
+        page.insert_image(page.rect, stream=buffer.getvalue())
+    pdf = doc.tobytes()
+    doc.close()
+    return pdf
+
+
+@pytest.fixture
+def ocr(monkeypatch):
+    """OCR接口按页面颜色返回页码，第FAILING_PAGE页返回错误"""
+    monkeypatch.setenv("IPS_OCR_PREPROCESS", "http://ocr.test/ocr")
+    service = OcrService()
+
+    def detect_from_image(image):
+        page = round((255 - image.convert("RGB").getpixel((100, 140))[1]) / 40)
+        if page == FAILING_PAGE:
+            raise Exception("OCR API调用失败，状态码: 500")
+        return [f"page {page}"]
+
+    service.detect_from_image = detect_from_image
+    return service
+
+
+def test_iter_pdf_ocr_raises_by_default(ocr, scanned_pdf):
+    returned = []
+    with pytest.raises(Exception, match="状态码: 500"):
+        for page in ocr.iter_pdf_ocr(scanned_pdf, concurrency=2):
+            returned.append(page.page)
+    assert returned == list(range(FAILING_PAGE))
+
+
+def test_iter_pdf_ocr_reports_failed_pages(ocr, scanned_pdf):
+    pages = list(ocr.iter_pdf_ocr(scanned_pdf, concurrency=2, raise_on_error=False))
+    assert [page.page for page in pages] == list(range(PAGES))
+    assert [page.error is not None for page in pages] == [i == FAILING_PAGE for i in range(PAGES)]
+    assert [page.lines for page in pages if page.error is None] == [
+        [f"page {i}"] for i in range(PAGES) if i != FAILING_PAGE]
+
+
+def test_detect_from_pdf_path(ocr, scanned_pdf):
+    with pytest.raises(Exception, match="状态码: 500"):
+        ocr.detect_from_pdf_path(scanned_pdf)
+
+    result = ocr.detect_from_pdf_path(scanned_pdf, raise_on_error=False)
+    assert list(result) == list(range(PAGES))
+    assert list(result.errors) == [FAILING_PAGE]
+    assert result[FAILING_PAGE][1] == []
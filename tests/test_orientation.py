@@ -0,0 +1,47 @@
+"""classify_orientations：宽高比不限制方向（竖长小票正放为0），只在模型前两名接近时参考"""
+import importlib
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("rapid_orientation")
+ocr_module = importlib.import_module("service.OcrService")
+
+# np.rot90逆时针旋转k次后需逆时针旋转回正的角度
+ANGLES = [0, 270, 180, 90]
+
+
+def receipt(height=1400, width=420):
+    """竖长的小票，文字横排"""
+    image = np.full((height, width, 3), 255, np.uint8)
+    for y in range(50, height - 20, 40):
+        cv2.putText(image, f"Item {y}  12.50", (20, y), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 0), 2)
+    return image
+
+
+def text_strip(height=420, width=1400):
+    """横长的文字条"""
+    image = np.full((height, width, 3), 255, np.uint8)
+    for y in range(60, height - 20, 50):
+        cv2.putText(image, "The parties agree to the terms", (30, y), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    return image
+
+
+@pytest.mark.parametrize("make_image", [receipt, text_strip])
+def test_all_rotations_of_elongated_images(make_image):
+    image = make_image()
+    rotations = [np.ascontiguousarray(np.rot90(image, k)) for k in range(4)]
+    assert ocr_module.classify_orientations(rotations) == ANGLES
+
+
+def test_tie_break_only_within_margin():
+    labels = ["0", "90", "180", "270"]
+    tall = np.zeros((1400, 420), np.uint8)
+    # 前两名接近：取与纵向文字条相符的第二名
+    assert ocr_module._pick_orientation(labels, np.array([0.18, 0.31, 0.40, 0.11]), tall) == 90
+    # 前两名相差较大：宽高比不起作用
+    assert ocr_module._pick_orientation(labels, np.array([0.6, 0.3, 0.05, 0.05]), tall) == 0
+    # 接近但都不相符或都相符时取概率最高的
+    square = np.zeros((800, 800), np.uint8)
+    assert ocr_module._pick_orientation(labels, np.array([0.18, 0.31, 0.40, 0.11]), square) == 180
@@ -0,0 +1,56 @@
+"""PaddleOcrService._ocr_pdf_pages：文字层可用的页面直出，其余页面只用OCR结果，OCR返回页数不符时报错"""
+import io
+
+import fitz
+import pytest
+from PIL import Image
+
+from service.PaddleOcrService import PaddleOcrService
+
+CLAUSES = [f"Contract clause {i}: the parties agree to the terms below." for i in range(30)]
+
+
+@pytest.fixture
+def mixed_pdf():
+    """第0页为正文文字层，第1页为扫描件加少量文字（文字层不可用），第2页只有扫描件"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 400), (230, 230, 230)).save(buffer, format="PNG")
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    for i, clause in enumerate(CLAUSES):
+        page.insert_text((50, 60 + i * 25), clause, fontsize=11)
+    for stamp in ("Scanned copy", None):
+        page = doc.new_page(width=595, height=842)
+        page.insert_image(page.rect, stream=buffer.getvalue())
+        if stamp:
+            page.insert_text((50, 60), stamp, fontsize=11)
+    pdf = doc.tobytes()
+    doc.close()
+    return pdf
+
+
+def paddle(results):
+    """OCR接口固定返回results（每页的rec_texts），记录发送的页数"""
+    service = PaddleOcrService()
+    service.sent_pages = []
+
+    def request_pages(api_url, pdf, file_type):
+        with fitz.open("pdf", pdf) as doc:
+            service.sent_pages.append(doc.page_count)
+        return results
+
+    service._request_pages = request_pages
+    return service
+
+
+def test_unusable_text_layer_is_replaced_by_ocr(mixed_pdf):
+    service = paddle([["扫描件第2页"], []])
+    page_texts = service._ocr_pdf_pages("http://paddle.test/ocr", mixed_pdf)
+    assert service.sent_pages == [2]
+    # 第1页不可用的文字层不混入结果，OCR没有识别出文字的页面为空
+    assert page_texts == [CLAUSES, ["扫描件第2页"], []]
+
+
+def test_page_count_mismatch_raises(mixed_pdf):
+    with pytest.raises(Exception, match="返回 1 页结果，与发送的 2 页不一致"):
+        paddle([["扫描件第2页"]])._ocr_pdf_pages("http://paddle.test/ocr", mixed_pdf)
@@ -0,0 +1,97 @@
+"""compress_pdf：结果不超过目标大小、页面尺寸不变，质量二分不低于min_quality，空PDF原样返回"""
+import importlib
+import io
+
+import fitz
+import numpy as np
+import pytest
+from PIL import Image
+
+pdf_module = importlib.import_module("service.PdfService")
+
+PAGES = 6
+# 没有页面的PDF（fitz不能保存0页文档，手写最小结构）
+EMPTY_PDF = (b"%PDF-1.4\n1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n"
+             b"2 0 obj\n<< /Type /Pages /Kids [] /Count 0 >>\nendobj\ntrailer\n<< /Root 1 0 R >>\n%%EOF\n")
+
+
+@pytest.fixture(scope="module")
+def scanned_pdf():
+    """每页一张带噪点的PNG扫描件（原图很大），页面尺寸各不相同"""
+    rng = np.random.default_rng(0)
+    doc = fitz.open()
+    for i in range(PAGES):
+        pixels = np.clip(rng.normal(200, 30, (800, 600, 3)), 0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="PNG")
+        page = doc.new_page(width=595 - i * 10, height=842)
+        page.insert_image(page.rect, stream=buffer.getvalue())
+    pdf = doc.tobytes()
+    doc.close()
+    return pdf
+
+
+@pytest.fixture
+def assembled(monkeypatch):
+    """记录每次组装PDF时的(页面图像宽度, JPEG质量)"""
+    calls = []
+    assemble = pdf_module._assemble_pdf
+
+    def record(src, images, raw_sizes, quality):
+        calls.append((images[0].shape[1], quality))
+        return assemble(src, images, raw_sizes, quality)
+
+    monkeypatch.setattr(pdf_module, "_assemble_pdf", record)
+    return calls
+
+
+def page_rects(pdf):
+    with fitz.open("pdf", pdf) as doc:
+        return [tuple(page.rect) for page in doc]
+
+
+@pytest.mark.parametrize("ratio", [0.5, 0.2])
+def test_fits_target_and_keeps_pages(scanned_pdf, ratio):
+    target = int(len(scanned_pdf) * ratio)
+    result = pdf_module.compress_pdf(scanned_pdf, target, workers=1)
+    assert len(result) <= target
+    assert page_rects(result) == page_rects(scanned_pdf)
+
+
+def test_unreachable_target_stops_at_min_quality(scanned_pdf, assembled):
+    min_quality, min_scale = 30, 0.5
+    result = pdf_module.compress_pdf(scanned_pdf, 1000, min_quality=min_quality, min_scale=min_scale, workers=1)
+    # 返回能得到的最小结果：最低质量、最小分辨率
+    assert len(result) > 1000
+    assert all(quality >= min_quality for _, quality in assembled)
+    # 最后一次组装为最低质量、最小分辨率
+    with fitz.open("pdf", scanned_pdf) as doc:
+        full_width = doc[0].get_pixmap(matrix=fitz.Matrix(pdf_module.PDF_ZOOM, pdf_module.PDF_ZOOM)).width
+    assert assembled[-1] == (int(full_width * min_scale), min_quality)
+    assert page_rects(result) == page_rects(scanned_pdf)
+
+
+def test_search_quality_picks_highest_fitting(monkeypatch):
+    # 估算大小随质量单调增加时，二分结果等于逐个检查得到的最高质量，最低质量也超出时为None
+    monkeypatch.setattr(pdf_module, "_estimate_size", lambda images, raw_sizes, sample, quality: quality * 1000)
+    for target in (10000, 10999, 45500, 80000, 200000):
+        expected = max(q for q in range(10, 81) if q * 1000 <= target)
+        assert pdf_module._search_quality(None, None, None, target, 10, 80) == expected
+    assert pdf_module._search_quality(None, None, None, 9999, 10, 80) is None
+
+
+def test_small_vector_page_kept(scanned_pdf):
+    # 本来就比JPEG更小的文字页原样保留（仍有文字层）
+    with fitz.open("pdf", scanned_pdf) as doc:
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((50, 60), "Vector text page", fontsize=11)
+        pdf = doc.tobytes()
+    result = pdf_module.compress_pdf(pdf, len(pdf) // 2, workers=1)
+    with fitz.open("pdf", result) as doc:
+        assert doc.page_count == PAGES + 1
+        assert "Vector text page" in doc[PAGES].get_text()
+        assert doc[0].get_text() == ""
+
+
+def test_empty_pdf_returned_unchanged():
+    assert pdf_module.compress_pdf(EMPTY_PDF, 100) is EMPTY_PDF
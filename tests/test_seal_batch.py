@@ -0,0 +1,85 @@
+"""批量印章提取：交给共享进程池的结果与当前进程逐项处理一致，页码与顺序不变"""
+import importlib
+
+import cv2
+import fitz
+import numpy as np
+import pytest
+
+seal_module = importlib.import_module("service.ExtractSealService")
+pool_module = importlib.import_module("service.WorkerPool")
+
+COUNT = 6
+
+
+def seal_page(seed):
+    """白底黑字页面上随机位置的红色圆章"""
+    rng = np.random.default_rng(seed)
+    image = np.full((700, 500, 3), 255, np.uint8)
+    for y in range(40, 680, 30):
+        cv2.putText(image, f"Clause {y}", (30, y), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (20, 20, 20), 2)
+    cx, cy = int(rng.integers(120, 380)), int(rng.integers(120, 580))
+    cv2.circle(image, (cx, cy), 80, (40, 40, 210), 5)
+    return image
+
+
+@pytest.fixture(scope="module")
+def images():
+    return [cv2.imencode(".png", seal_page(seed))[1].tobytes() for seed in range(COUNT)]
+
+
+@pytest.fixture(scope="module")
+def pdf(images):
+    doc = fitz.open()
+    for data in images:
+        page = doc.new_page(width=500, height=700)
+        page.insert_image(page.rect, stream=data)
+    pdf = doc.tobytes()
+    doc.close()
+    return pdf
+
+
+@pytest.fixture
+def always_parallel(monkeypatch):
+    """第一项之后即交给进程池，记录进程池处理的任务"""
+    tasks = []
+
+    def imap_ordered(func, args_list, workers, kind):
+        args_list = list(args_list)
+        tasks.extend(args[1] if func is seal_module._extract_pdf_page_task else args[3] for args in args_list)
+        return pool_module.imap_ordered(func, args_list, workers, kind)
+
+    monkeypatch.setattr(seal_module, "parallel_worthwhile", lambda *args: True)
+    monkeypatch.setattr(seal_module, "PARALLEL_MIN_PAGES", 1)
+    monkeypatch.setattr(seal_module, "imap_ordered", imap_ordered)
+    return tasks
+
+
+def flatten(results):
+    return [(r.page, [(tuple(round(v, 6) for v in s.bbox), s.image.tobytes()) for s in r.seals],
+             r.overlay.tobytes()) for r in results]
+
+
+def test_images_in_pool_match_serial(images, always_parallel):
+    serial = list(seal_module.iter_extract_seals(images, with_overlay=True, workers=1))
+    assert always_parallel == []
+    pooled = list(seal_module.iter_extract_seals(images, with_overlay=True, workers=2))
+    assert always_parallel == list(range(1, COUNT))
+    assert [r.page for r in serial] == list(range(COUNT))
+    assert all(r.seals for r in serial)
+    assert flatten(pooled) == flatten(serial)
+
+
+def test_pdf_pages_in_pool_match_serial(pdf, always_parallel):
+    pages = [4, 0, 5, 2]
+    serial = list(seal_module.iter_pdf_seals(pdf, pages, with_overlay=True, workers=1))
+    pooled = list(seal_module.iter_pdf_seals(pdf, pages, with_overlay=True, workers=2))
+    assert always_parallel == pages[1:]
+    assert [r.page for r in serial] == pages
+    assert flatten(pooled) == flatten(serial)
+
+
+def test_small_batch_stays_in_process(images, monkeypatch):
+    # 单张耗时远小于子进程启动开销，不使用进程池
+    monkeypatch.setattr(seal_module, "imap_ordered", None)
+    assert len(list(seal_module.iter_extract_seals(images, workers=4))) == COUNT
@@ -0,0 +1,106 @@
+"""close_seal_mask：由粗到精的闭运算在各缩小倍数下与整幅MORPH_CLOSE逐像素一致"""
+import importlib
+
+import cv2
+import numpy as np
+import pytest
+
+seal_module = importlib.import_module("service.ExtractSealService")
+
+SCALES = [1, 2, 3, 4, 8]
+
+
+def full_close(mask):
+    return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, seal_module.CLOSE_KERNEL)
+
+
+def random_mask(seed):
+    """随机尺寸的掩码：圆环与断开的弧（印章轮廓）、贴边的色块、零散噪点，间距随机，部分相邻区域会归为一组"""
+    rng = np.random.default_rng(seed)
+    height, width = int(rng.integers(60, 900)), int(rng.integers(60, 700))
+    mask = np.zeros((height, width), np.uint8)
+    for _ in range(int(rng.integers(0, 5))):
+        center = (int(rng.integers(-50, width + 50)), int(rng.integers(-50, height + 50)))
+        radius = int(rng.integers(10, 150))
+        start = int(rng.integers(0, 360))
+        cv2.ellipse(mask, center, (radius, radius), 0, start, start + int(rng.integers(90, 360)), 255,
+                    int(rng.integers(1, 8)))
+    for _ in range(int(rng.integers(0, 3))):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        mask[y:y + int(rng.integers(1, 40)), x:x + int(rng.integers(1, 40))] = 255
+    noise = int(rng.integers(0, 60))
+    mask[rng.integers(0, height, noise), rng.integers(0, width, noise)] = 255
+    return mask
+
+
+def pair_mask(gap):
+    """相距gap像素的两个小方块：间距小于核直径时闭运算把两者连起来，必须在同一组内计算"""
+    mask = np.zeros((300, 500), np.uint8)
+    mask[130:160, 100:130] = 255
+    mask[140:170, 130 + gap:160 + gap] = 255
+    return mask
+
+
+def page_mask(seed, seals):
+    """合同页面（白底黑字、随机位置的红色圆章）在_locate_seals中实际做闭运算的掩码"""
+    rng = np.random.default_rng(seed)
+    image = np.full((1754, 1240, 3), 255, np.uint8)
+    for y in range(80, 1674, 40):
+        cv2.putText(image, f"Contract clause {y} lorem ipsum", (60, y), cv2.FONT_HERSHEY_SIMPLEX, 0.9,
+                    (20, 20, 20), 2)
+    for _ in range(seals):
+        cx, cy = int(rng.integers(200, 1040)), int(rng.integers(200, 1554))
+        cv2.circle(image, (cx, cy), int(rng.integers(70, 130)), (40, 40, 210), 6)
+        cv2.putText(image, "SEAL", (cx - 50, cy + 10), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (40, 40, 210), 3)
+    masks = []
+    close = seal_module.close_seal_mask
+    seal_module.close_seal_mask = lambda mask: masks.append(mask) or close(mask)
+    try:
+        seal_module._locate_seals(image, seal_module.MAX_SEALS)
+    finally:
+        seal_module.close_seal_mask = close
+    return masks[0]
+
+
+@pytest.fixture(scope="module")
+def random_cases():
+    # 整幅闭运算的参考结果只计算一次，供各缩小倍数比较
+    return [(seed, mask, full_close(mask)) for seed, mask in ((seed, random_mask(seed)) for seed in range(12))]
+
+
+@pytest.fixture(scope="module", params=[0, 1, 3, 9], ids=lambda seals: f"{seals}-seals")
+def page_case(request):
+    mask = page_mask(request.param, request.param)
+    return mask, full_close(mask)
+
+
+@pytest.fixture(params=[None, 1.0], ids=["default-area", "never-fall-back"])
+def max_area(request, monkeypatch):
+    # 1.0时候选区域再大也不退回整幅计算，覆盖分组拼接的路径
+    if request.param is not None:
+        monkeypatch.setattr(seal_module, "SEAL_COARSE_MAX_AREA", request.param)
+
+
+@pytest.mark.parametrize("scale", SCALES)
+def test_random_masks(random_cases, max_area, scale):
+    for seed, mask, expected in random_cases:
+        assert np.array_equal(seal_module.close_seal_mask(mask, scale), expected), seed
+
+
+@pytest.mark.parametrize("scale", SCALES)
+def test_nearby_regions(max_area, scale):
+    for gap in (20, 50, 70, 90, 98, 100, 102, 130):
+        mask = pair_mask(gap)
+        assert np.array_equal(seal_module.close_seal_mask(mask, scale), full_close(mask)), gap
+
+
+@pytest.mark.parametrize("scale", SCALES)
+def test_seal_page_masks(page_case, max_area, scale):
+    mask, expected = page_case
+    assert np.array_equal(seal_module.close_seal_mask(mask, scale), expected)
+
+
+def test_default_scale(page_case, monkeypatch):
+    monkeypatch.setattr(seal_module, "SEAL_COARSE_SCALE", 8)
+    mask, expected = page_case
+    assert np.array_equal(seal_module.close_seal_mask(mask), expected)
@@ -0,0 +1,78 @@
+"""TextEnhancer.enhance_text：融合执行与分块并行的结果与逐步整幅处理（改动前的enhance_gray）逐像素一致"""
+import importlib
+
+import cv2
+import numpy as np
+import pytest
+
+enhancer = importlib.import_module("service.TextEnhancer")
+
+# 分块测试用的块行数，远小于高斯核与锐化核的重叠行数之和的两倍，块边界附近都需要重叠行
+TILE_ROWS = 16
+
+SIZES = [(5, 7), (19, 40), (64, 64), (257, 300), (333, 123), (TILE_ROWS * 9 + 3, 211), (1000, 77)]
+OPTIONS = [
+    {},
+    {"use_unsharp_mask": False},
+    {"use_contrast": False},
+    {"sharpen_strength": 1.0},
+    {"sharpen_strength": 2.5, "contrast_factor": 2.5},
+    {"sharpen_strength": 1.0, "use_unsharp_mask": False, "use_contrast": False},
+]
+
+
+def reference(gray, sharpen_strength=1.8, contrast_factor=1.5, use_unsharp_mask=True, use_contrast=True):
+    """逐步整幅处理，每一步生成新数组"""
+    enhanced = gray
+    if use_unsharp_mask:
+        blurred = cv2.GaussianBlur(gray, (0, 0), 3.0)
+        enhanced = cv2.addWeighted(gray, 1.5, blurred, -0.5, 0)
+    if use_contrast:
+        enhanced = cv2.convertScaleAbs(enhanced, alpha=contrast_factor, beta=0)
+    if sharpen_strength > 1.0:
+        kernel = np.array([[0, -1, 0],
+                           [-1, 5 * sharpen_strength, -1],
+                           [0, -1, 0]])
+        enhanced = cv2.filter2D(enhanced, -1, kernel)
+    _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return binary
+
+
+def document(height, width, seed=0):
+    """浅色噪声背景上的深色文字，灰度有渐变，Otsu阈值不落在0或255"""
+    rng = np.random.default_rng(seed)
+    image = np.clip(rng.normal(200, 20, (height, width)) - np.linspace(0, 40, height)[:, None], 0, 255)
+    image = image.astype(np.uint8)
+    for y in range(12, height, 18):
+        cv2.putText(image, "Text 123", (2, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, 30, 1)
+    return image
+
+
+@pytest.fixture
+def small_tiles(monkeypatch):
+    monkeypatch.setattr(enhancer, "ENHANCE_TILE_ROWS", TILE_ROWS)
+
+
+@pytest.mark.parametrize("options", OPTIONS)
+@pytest.mark.parametrize("tiled", [False, True])
+def test_matches_reference(small_tiles, tiled, options):
+    # 同一线程依次处理不同尺寸，临时缓冲区在宽度相同、行数足够时复用
+    for seed, (height, width) in enumerate(SIZES):
+        gray = document(height, width, seed)
+        expected = reference(gray, **options)
+        assert np.array_equal(enhancer.enhance_text(gray, tiled=tiled, **options), expected), (height, width)
+
+
+def test_writes_into_out(small_tiles):
+    gray = document(TILE_ROWS * 5 + 7, 90)
+    out = np.full(gray.shape, 7, np.uint8)
+    assert enhancer.enhance_text(gray, tiled=True, out=out) is out
+    assert np.array_equal(out, reference(gray))
+
+
+def test_default_tiling_on_large_image():
+    # 像素数达到ENHANCE_TILE_MIN_PIXELS时默认分块（块行数为默认值）
+    height = enhancer.ENHANCE_TILE_ROWS * 8 + 5
+    width = enhancer.ENHANCE_TILE_MIN_PIXELS // height + 1
+    gray = document(height, width)
+    assert np.array_equal(enhancer.enhance_text(gray), reference(gray))
@@ -0,0 +1,4 @@
+"""
+进程池子进程的入口模块。这里的模块只依赖cv2、fitz、numpy等第三方库，不导入service包，
+spawn出的子进程加载任务函数时不会执行service/__init__（其中导入openai等耗时超过1秒）
+"""
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+
+import cv2
+import fitz
+import numpy as np
+
+# 子进程内缓存已打开的PDF（按临时文件路径），超出时关闭最早打开的
+DOC_CACHE_SIZE = 4
+
+_docs = OrderedDict()
+
+
+def init_worker():
+    # 并行度由进程数决定，每个进程单线程运行OpenCV，避免与OpenCV线程池叠加超额占用CPU
+    cv2.setNumThreads(1)
+
+
+def render_page(doc, pg, zoom, max_width, jpeg_quality):
+    """
+    渲染PDF的一页
+    :param doc: 已打开的fitz文档
+    :param max_width: 页面宽度上限，超出时等比缩小；None表示不缩放
+    :param jpeg_quality: 指定时返回JPEG字节，否则返回RGB格式的numpy数组
+    """
+    mat = fitz.Matrix(zoom, zoom)
+    pm = doc[pg].get_pixmap(matrix=mat, dpi=None, colorspace='rgb', alpha=False)
+    # 直接使用像素数据，不经过PNG编码/解码
+    image = np.frombuffer(pm.samples, np.uint8).reshape(pm.height, pm.width, pm.n)
+    if max_width is not None:
+        resize_w = max_width if image.shape[1] > max_width else image.shape[1]
+        dsize = (resize_w, int(resize_w * image.shape[0] / image.shape[1]))
+        image = cv2.resize(image, dsize=dsize, interpolation=cv2.INTER_LINEAR)
+    if jpeg_quality is None:
+        return image
+    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])[1].tobytes()
+
+
+def open_document(path):
+    """按路径打开（并缓存）父进程写出的PDF临时文件；文件内容一次读入内存，不占用文件句柄"""
+    doc = _docs.get(path)
+    if doc is not None:
+        _docs.move_to_end(path)
+        return doc
+    with open(path, "rb") as f:
+        doc = fitz.open("pdf", f.read())
+    _docs[path] = doc
+    while len(_docs) > DOC_CACHE_SIZE:
+        _docs.popitem(last=False)[1].close()
+    return doc
+
+
+def render_page_task(path, pg, zoom, max_width, jpeg_quality):
+    return render_page(open_document(path), pg, zoom, max_width, jpeg_quality)